@@ -0,0 +1,152 @@
+import asyncio
+import logging
+from typing import Dict, Optional, Tuple, Union
+
+import aiohttp
+from nba_api.stats.library.http import NBAStatsHTTP, NBAStatsResponse
+
+# Native asyncio alternative to the requests calls nba_api makes. Endpoint objects are still built by nba_api (so the
+# parameters and the normalized dict are exactly the same), only the HTTP round trip is done here, through a pooled
+# keep-alive session per route (direct, or one for each proxy url)
+
+CONNECTIONS_PER_ROUTE = 4
+KEEPALIVE_TIMEOUT = 30
+DEFAULT_TIMEOUT = 30
+
+# Errors that mean the route (usually a proxy) failed, as opposed to a problem with the request itself
+TRANSPORT_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
+# Raised when a response stops arriving (a sock_read timeout), as opposed to the connection never being made. Older
+# aiohttp versions raise the same error for both, so nothing is treated as a read timeout there
+READ_TIMEOUT_ERRORS = tuple(filter(None, [getattr(aiohttp, 'SocketTimeoutError', None)]))
+
+# Sessions indexed by event loop, then by proxy url (None is the direct route). A session only works on the loop it was
+# opened on, so every loop gets its own
+SESSIONS: Dict[asyncio.AbstractEventLoop, Dict[Optional[str], aiohttp.ClientSession]] = {}
+
+LOGGER = logging.getLogger(__name__)
+
+
+def get_request_headers(headers: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    '''
+    Gets the headers nba_api would send. aiohttp only decodes brotli if it's installed, so it's left to set
+    Accept-Encoding itself
+    :param headers: optional headers to use instead of nba_api's
+    :return:
+    '''
+    request_headers = dict(NBAStatsHTTP.headers if headers is None else headers)
+    request_headers.pop('Accept-Encoding', None)
+
+    return request_headers
+
+
+def get_proxy_url(proxy: Optional[str]) -> Optional[str]:
+    # Proxies are stored as host:port, which requests accepts but aiohttp doesn't
+    if not proxy:
+        return None
+    elif '://' in proxy:
+        return proxy
+    else:
+        return f"http://{proxy}"
+
+
+def get_loop_sessions() -> Dict[Optional[str], aiohttp.ClientSession]:
+    # Sessions of a closed loop can't be closed anymore, since closing them has to run on that loop, so they're dropped
+    for closed_loop in [loop for loop in SESSIONS if loop.is_closed()]:
+        del SESSIONS[closed_loop]
+
+    return SESSIONS.setdefault(asyncio.get_event_loop(), {})
+
+
+def get_session(proxy: Optional[str] = None) -> aiohttp.ClientSession:
+    '''
+    Gets the current event loop's keep-alive session for a route, creating it if needed
+    :param proxy: proxy url for the route, or None for a direct connection
+    :return:
+    '''
+    sessions = get_loop_sessions()
+    session = sessions.get(proxy)
+
+    if session is None or session.closed:
+        LOGGER.debug(f"Opening connection pool for {proxy if proxy is not None else 'direct'} route")
+        connector = aiohttp.TCPConnector(limit=CONNECTIONS_PER_ROUTE, keepalive_timeout=KEEPALIVE_TIMEOUT)
+        session = aiohttp.ClientSession(connector=connector)
+        sessions[proxy] = session
+
+    return session
+
+
+def get_request_parameters(parameters: dict) -> Tuple[Tuple[str, str], ...]:
+    # Same as requests: sorted by key (nba_api says this matters for some requests), and None values left out
+    return tuple((key, str(value)) for key, value in sorted(parameters.items(), key=lambda kv: kv[0])
+                 if value is not None)
+
+
+def get_client_timeout(timeout: Union[float, aiohttp.ClientTimeout, None]) -> aiohttp.ClientTimeout:
+    return timeout if isinstance(timeout, aiohttp.ClientTimeout) else aiohttp.ClientTimeout(total=timeout)
+
+
+def load_endpoint_response(endpoint, contents: str, status_code: Optional[int] = None, url: Optional[str] = None):
+    '''
+    Loads a raw stats.nba.com response into an endpoint built with get_request=False
+    :param endpoint: the nba_api endpoint object
+    :param contents: the response body
+    :param status_code:
+    :param url:
+    :return: the endpoint, now usable like one that made its own request
+    '''
+    contents = NBAStatsHTTP().clean_contents(contents)
+    endpoint.nba_response = NBAStatsResponse(response=contents, status_code=status_code, url=url)
+    endpoint.load_response()
+
+    return endpoint
+
+
+async def fetch_endpoint(endpoint_class, proxy: Optional[str] = None, headers: Optional[Dict[str, str]] = None,
+                         timeout: Union[float, aiohttp.ClientTimeout, None] = DEFAULT_TIMEOUT, **kwargs):
+    '''
+    Async drop-in for endpoint_class(**kwargs)
+    :param endpoint_class: nba_api endpoint class
+    :param proxy: proxy to send the request through
+    :param headers: optional headers to use instead of nba_api's
+    :param timeout: total time allowed for the request in seconds, or an aiohttp.ClientTimeout for finer control
+    :param kwargs: arguments for the endpoint
+    :return: the endpoint object with its response loaded
+    '''
+    # Let nba_api turn the arguments into request parameters without making a request
+    endpoint = endpoint_class(get_request=False, **kwargs)
+
+    url = NBAStatsHTTP.base_url.format(endpoint=endpoint.endpoint)
+    session = get_session(proxy)
+
+    async with session.get(url, params=get_request_parameters(endpoint.parameters),
+                           headers=get_request_headers(headers), proxy=get_proxy_url(proxy),
+                           timeout=get_client_timeout(timeout)) as response:
+        # Error pages (e.g. a proxy's own 403 or 502) count as the route failing, same as a connection error
+        response.raise_for_status()
+        contents = await response.text()
+        status_code = response.status
+        response_url = str(response.url)
+
+    return load_endpoint_response(endpoint, contents, status_code, response_url)
+
+
+def discard_session(proxy: Optional[str]):
+    '''
+    Closes a route's session in the background, e.g. once a proxy turns out to be dead
+    :param proxy: proxy url for the route
+    :return:
+    '''
+    session = get_loop_sessions().pop(proxy, None)
+
+    if session is not None and not session.closed:
+        asyncio.ensure_future(session.close())
+
+
+async def close_sessions():
+    # Closes the current event loop's sessions
+    sessions = get_loop_sessions()
+
+    for session in sessions.values():
+        await session.close()
+
+    sessions.clear()
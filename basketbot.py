@@ -12,9 +12,20 @@ from definitions import TOKEN_FILE
 
 TOKEN = None
 
+# The "Multiple Players" embeds list this many players, and "... and more" if there are any others
+MAX_LISTED_PLAYERS = 12
+
 LOGGER = logging.getLogger(__name__)
 
-bot = commands.Bot(command_prefix='%')
+
+class Basketbot(commands.Bot):
+    async def close(self):
+        # Save the proxy state before the event loop goes away
+        await proxied_endpoint.shutdown()
+        await super().close()
+
+
+bot = Basketbot(command_prefix='%')
 
 
 @bot.command()
@@ -27,7 +38,7 @@ async def playercareerstats(ctx, *args):
 
     embed = discord.Embed(title="Player Not Found",
                           description="Double check that the player name is spelled correctly.", color=0x595959)
-    players = nba.getPlayerIdsByName(name.strip(), False, True)
+    players = nba.getPlayerIdsByName(name.strip(), False, True, max_results=MAX_LISTED_PLAYERS + 1)
     if players is not None:  # If the list of players is not empty
         playerIds = list(players.keys())
         playerNames = list(players.values())
@@ -35,8 +46,8 @@ async def playercareerstats(ctx, *args):
             embed = discord.Embed(title="Multiple Players",
                                   description="There are multiple players with the name \"" + name.strip() + "\":",
                                   color=0x595959)
-            if len(playerIds) > 12:  # If there are more than 12 players with the name specified
-                for i in range(0, 12):
+            if len(playerIds) > MAX_LISTED_PLAYERS:  # If there are more than 12 players with the name specified
+                for i in range(0, MAX_LISTED_PLAYERS):
                     embed.add_field(name="\u200b", value=playerNames[i], inline=True)
                 embed.add_field(name="\u200b", value="... and more", inline=True)
             else:
@@ -67,7 +78,7 @@ async def player(ctx, *args):
     embed = discord.Embed(title="Player Not Found",
                           description="Double check that the player name is spelled correctly, or try using %playercareerstats [player].",
                           color=0x595959)
-    players = nba.getPlayerIdsByName(name.strip(), True, True)
+    players = nba.getPlayerIdsByName(name.strip(), True, True, max_results=MAX_LISTED_PLAYERS + 1)
     if players is not None:  # If the list of players is not empty
         playerIds = list(players.keys())
         playerNames = list(players.values())
@@ -75,8 +86,8 @@ async def player(ctx, *args):
             embed = discord.Embed(title="Multiple Players",
                                   description="There are multiple players with the name \"" + name.strip() + "\":",
                                   color=0x595959)
-            if len(playerIds) > 12:  # If there are more than 12 players with the name specified
-                for i in range(0, 12):
+            if len(playerIds) > MAX_LISTED_PLAYERS:  # If there are more than 12 players with the name specified
+                for i in range(0, MAX_LISTED_PLAYERS):
                     embed.add_field(name="\u200b", value=playerNames[i], inline=True)
                 embed.add_field(name="\u200b", value="... and more", inline=True)
             else:
@@ -171,6 +182,10 @@ async def on_ready():
     print(bot.user.id)
     print("------")
 
+    # Keep the proxies healthy, and check whether the direct connection works, in the background instead of finding out
+    # through user commands
+    proxied_endpoint.start_proxy_supervisor()
+
 
 def setup():
     # Enable logging
@@ -179,10 +194,11 @@ def setup():
     # Uncomment the following line for proxy debug messages
     # logging.getLogger(proxied_endpoint.__name__).setLevel(logging.DEBUG)
 
-    # If we can't connect to NBA servers, no reason to start the bot until we're sure we can
+    # If we can't connect to NBA servers, start with the proxies that worked last time. The proxy supervisor
+    # finds more once the bot is ready
     if not proxied_endpoint.is_direct_connect_allowed():
-        LOGGER.info("Direct connection to NBA blocked, looking for available proxies")
-        proxied_endpoint.populate_good_proxies(min_good_proxies=1, load_from_file=True)
+        LOGGER.info("Direct connection to NBA blocked, loading saved proxies")
+        proxied_endpoint.load_saved_proxies()
 
 
 """Credit to https://stackoverflow.com/users/857390/florian-brucker for this function"""
@@ -0,0 +1,332 @@
+import logging
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Sequence, Type
+
+import numpy as np
+import textdistance as tdist
+
+try:
+    from rapidfuzz import process as rapidfuzz_process
+    from rapidfuzz.distance import Indel as RapidFuzzIndel, JaroWinkler as RapidFuzzJaroWinkler
+except ImportError:
+    rapidfuzz_process = None
+
+# Scores one query against a whole column of names in a single call, instead of calling a textdistance algorithm once
+# per name in a Python loop. Every scorer returns exactly the same normalized distances textdistance would.
+#
+# Scorers are built once per column of names (so the names can be preprocessed), then called with a query and
+# optionally the positions of the names to score. Distances above max_distance may be returned as a lower bound
+# instead of the actual distance, since those names aren't matches either way.
+#
+# There are NumPy implementations and C implementations built on rapidfuzz, which is used
+# automatically if it's installed (pip3 install rapidfuzz). rapidfuzz is also what textdistance uses for
+# JaroWinkler when it's installed, so the results are the same.
+
+LOGGER = logging.getLogger(__name__)
+
+
+class BatchScorer:
+    """
+    Base scorer, calls the textdistance algorithm once per name. Works with any textdistance algorithm
+    """
+
+    # Whether get_lower_bounds returns the actual distances
+    EXACT_BOUNDS = True
+
+    def __init__(self, names: Sequence[str], algorithm=None):
+        self.names = list(names)
+        self.algorithm = algorithm
+
+    def __len__(self):
+        return len(self.names)
+
+    def get_names(self, positions: Optional[Sequence[int]]) -> List[str]:
+        if positions is None:
+            return self.names
+        return [self.names[position] for position in positions]
+
+    def score(self, query: str, positions: Optional[Sequence[int]] = None,
+              max_distance: Optional[float] = None) -> List[float]:
+        '''
+        Gets the normalized distance between the query and each name
+        :param query:
+        :param positions: positions of the names to score, defaults to all of them
+        :param max_distance: distances above this may be returned as a lower bound instead
+        :return: list of distances, in the same order as positions
+        '''
+        return self.score_array(query, positions, max_distance).tolist()
+
+    def score_array(self, query: str, positions: Optional[Sequence[int]] = None,
+                    max_distance: Optional[float] = None) -> np.ndarray:
+        '''
+        Same as score, but returns a NumPy array so big columns don't need a Python float per name
+        '''
+        names = self.get_names(positions)
+
+        return np.fromiter((self.algorithm.normalized_distance(query, name) for name in names), dtype=np.float64,
+                           count=len(names))
+
+    def get_lower_bounds(self, query: str, positions: Optional[Sequence[int]] = None) -> np.ndarray:
+        '''
+        Gets a cheap lower bound on the distance to each name, for deciding which names are worth scoring with
+        score_one. Scorers without a cheaper bound return the actual distances, and set EXACT_BOUNDS
+        :param query:
+        :param positions: positions of the names, defaults to all of them
+        :return: array of bounds, in the same order as positions
+        '''
+        return self.score_array(query, positions)
+
+    def score_one(self, query: str, position: int) -> float:
+        return self.algorithm.normalized_distance(query, self.names[position])
+
+
+def encode_names(names: Sequence[str]):
+    '''
+    Turns a list of names into a padded matrix of code points (padding is -1) and an array of lengths
+    :param names:
+    :return:
+    '''
+    lengths = np.fromiter((len(name) for name in names), dtype=np.int64, count=len(names))
+    codes = np.full((len(names), max(int(lengths.max(initial=0)), 1)), -1, dtype=np.int32)
+
+    for row, name in enumerate(names):
+        codes[row, :len(name)] = [ord(character) for character in name]
+
+    return codes, lengths
+
+
+class NumpyJaroWinklerScorer(BatchScorer):
+    """
+    Jaro-Winkler computed for every name at once. Same steps (and the same float operations) as textdistance's
+    JaroWinkler with its default settings, each loop over the query's characters just runs on every name together
+    """
+
+    PREFIX_WEIGHT = 0.1
+
+    def __init__(self, names: Sequence[str], algorithm=None):
+        super().__init__(names, algorithm)
+        self.codes, self.lengths = encode_names(self.names)
+
+    def score_array(self, query: str, positions: Optional[Sequence[int]] = None,
+                    max_distance: Optional[float] = None) -> np.ndarray:
+        if positions is None:
+            codes, lengths = self.codes, self.lengths
+        else:
+            positions = np.asarray(positions, dtype=np.int64)
+            codes, lengths = self.codes[positions], self.lengths[positions]
+
+        return 1.0 - self.get_similarities(query, codes, lengths)
+
+    def get_similarities(self, query: str, codes: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+        num_names, name_width = codes.shape
+        query_length = len(query)
+        similarities = np.zeros(num_names, dtype=np.float64)
+
+        if num_names == 0 or query_length == 0:
+            return similarities
+
+        query_codes = np.fromiter((ord(character) for character in query), dtype=np.int32, count=query_length)
+        rows = np.arange(num_names)
+        columns = np.arange(name_width)
+
+        search_range = np.maximum(np.maximum(lengths, query_length) // 2 - 1, 0)
+
+        query_flags = np.zeros((num_names, query_length), dtype=bool)
+        name_flags = np.zeros((num_names, name_width), dtype=bool)
+
+        # Flag the first unmatched character in the search range that matches each query character
+        for i in range(query_length):
+            low = np.maximum(0, i - search_range)
+            high = np.minimum(i + search_range, lengths - 1)
+            in_range = (columns >= low[:, None]) & (columns <= high[:, None])
+            candidates = in_range & ~name_flags & (codes == query_codes[i])
+
+            found = candidates.any(axis=1)
+            first = candidates.argmax(axis=1)
+
+            name_flags[rows[found], first[found]] = True
+            query_flags[found, i] = True
+
+        common = query_flags.sum(axis=1)
+
+        # Pair up the matched characters in order and count the ones that differ
+        query_order = np.argsort(~query_flags, axis=1, kind='stable')
+        name_order = np.argsort(~name_flags, axis=1, kind='stable')
+        compared = min(query_length, name_width)
+        matched_query = query_codes[query_order[:, :compared]]
+        matched_names = np.take_along_axis(codes, name_order[:, :compared], axis=1)
+        paired = np.arange(compared) < common[:, None]
+        transpositions = ((matched_query != matched_names) & paired).sum(axis=1) // 2
+
+        has_common = (common > 0) & (lengths > 0)
+        common_float = common[has_common].astype(np.float64)
+
+        weight = common_float / query_length + common_float / lengths[has_common]
+        weight += (common_float - transpositions[has_common]) / common_float
+        weight /= 3
+
+        # Winkler boost for up to the first 4 characters in common
+        prefix_codes = codes[has_common, :4]
+        prefix_length = np.minimum(np.minimum(lengths[has_common], query_length), 4)
+        same_prefix = np.ones(len(weight), dtype=np.int64)
+        prefix = np.zeros(len(weight), dtype=np.int64)
+        for i in range(min(4, query_length, name_width)):
+            same_prefix &= (prefix_codes[:, i] == query_codes[i]) & (i < prefix_length)
+            prefix += same_prefix
+
+        boost = (weight > 0.7) & (prefix > 0)
+        weight[boost] += prefix[boost] * self.PREFIX_WEIGHT * (1.0 - weight[boost])
+
+        similarities[has_common] = weight
+
+        # Identical strings are answered before the algorithm runs
+        if query_length <= name_width:
+            identical = (lengths == query_length) & (codes[:, :query_length] == query_codes).all(axis=1)
+            similarities[identical] = 1.0
+
+        return similarities
+
+
+class RapidFuzzJaroWinklerScorer(BatchScorer):
+    """
+    Jaro-Winkler for every name in one rapidfuzz call (C++)
+    """
+
+    def score_array(self, query: str, positions: Optional[Sequence[int]] = None,
+                    max_distance: Optional[float] = None) -> np.ndarray:
+        names = self.get_names(positions)
+
+        if len(names) == 0:
+            return np.zeros(0, dtype=np.float64)
+
+        similarities = rapidfuzz_process.cdist([query], names, scorer=RapidFuzzJaroWinkler.similarity,
+                                               dtype=np.float64)[0]
+
+        # textdistance returns 1 for identical strings and 0 if either is empty before asking rapidfuzz
+        lengths = np.fromiter((len(name) for name in names), dtype=np.int64, count=len(names))
+        similarities[lengths == 0] = 0.0
+        similarities[np.fromiter((name == query for name in names), dtype=bool, count=len(names))] = 1.0
+
+        return 1.0 - similarities
+
+
+class BoundedRatcliffObershelpScorer(BatchScorer, ABC):
+    """
+    RatcliffObershelp has no shortcut, so each name is still scored with textdistance, but only after a vectorized
+    lower bound rules out every name that can't be within max_distance.
+    The distance is 1 - 2M / (len_a + len_b), and M (the characters in the matched blocks) can never be more than the
+    characters the two names have in common, so that count gives a lower bound on the distance
+    """
+
+    EXACT_BOUNDS = False
+
+    def __init__(self, names: Sequence[str], algorithm=None):
+        super().__init__(names, tdist.RatcliffObershelp() if algorithm is None else algorithm)
+
+        self.lengths = np.fromiter((len(name) for name in self.names), dtype=np.int64, count=len(self.names))
+
+    def score_array(self, query: str, positions: Optional[Sequence[int]] = None,
+                    max_distance: Optional[float] = None) -> np.ndarray:
+        names = self.get_names(positions)
+
+        if max_distance is None or len(names) == 0:
+            return super().score_array(query, positions)
+
+        distances = self.get_bounds(query, positions, names)
+
+        # Replace the bounds with the real distance wherever the bound doesn't rule the name out
+        for i in np.flatnonzero(distances <= max_distance).tolist():
+            distances[i] = self.algorithm.normalized_distance(query, names[i])
+
+        return distances
+
+    def get_lower_bounds(self, query: str, positions: Optional[Sequence[int]] = None) -> np.ndarray:
+        return self.get_bounds(query, positions, self.get_names(positions))
+
+    def get_bounds(self, query: str, positions: Optional[Sequence[int]], names: List[str]) -> np.ndarray:
+        if len(names) == 0:
+            return np.zeros(0, dtype=np.float64)
+
+        positions = np.arange(len(self.names)) if positions is None else np.asarray(positions, dtype=np.int64)
+        total_lengths = self.lengths[positions] + len(query)
+        max_matches = self.get_max_matches(query, positions, names)
+
+        # Same operations textdistance uses, so the bound can't come out above the real distance through rounding
+        bounds = 1 - (2 * max_matches) / np.maximum(total_lengths, 1)
+        bounds[self.lengths[positions] == 0] = 1
+
+        return bounds
+
+    @abstractmethod
+    def get_max_matches(self, query: str, positions: np.ndarray, names: List[str]) -> np.ndarray:
+        '''
+        Gets an upper bound on the matched characters between the query and each name
+        :param query:
+        :param positions: positions of the names in the column
+        :param names: the names at those positions
+        :return:
+        '''
+
+
+class NumpyRatcliffObershelpScorer(BoundedRatcliffObershelpScorer):
+    """
+    Bounds the matched characters by the characters in common, using a character count matrix
+    """
+
+    def __init__(self, names: Sequence[str], algorithm=None):
+        super().__init__(names, algorithm)
+
+        self.alphabet: Dict[str, int] = {}
+        for name in self.names:
+            for character in name:
+                self.alphabet.setdefault(character, len(self.alphabet))
+
+        self.character_counts = np.zeros((len(self.names), max(len(self.alphabet), 1)), dtype=np.int16)
+        for row, name in enumerate(self.names):
+            for character in name:
+                self.character_counts[row, self.alphabet[character]] += 1
+
+    def get_max_matches(self, query: str, positions: np.ndarray, names: List[str]) -> np.ndarray:
+        query_counts = np.zeros(self.character_counts.shape[1], dtype=np.int16)
+
+        # Characters that aren't in any name can't match anything
+        for character in query:
+            if character in self.alphabet:
+                query_counts[self.alphabet[character]] += 1
+
+        return np.minimum(self.character_counts[positions], query_counts).sum(axis=1)
+
+
+class RapidFuzzRatcliffObershelpScorer(BoundedRatcliffObershelpScorer):
+    """
+    Bounds the matched characters by the longest common subsequence (computed by rapidfuzz), which is tighter than
+    the characters in common
+    """
+
+    def get_max_matches(self, query: str, positions: np.ndarray, names: List[str]) -> np.ndarray:
+        indel_distances = rapidfuzz_process.cdist([query], names, scorer=RapidFuzzIndel.distance, dtype=np.int64)[0]
+
+        # Indel distance = len_a + len_b - 2 * longest common subsequence
+        return (self.lengths[positions] + len(query) - indel_distances) // 2
+
+
+# Scorer to use for each textdistance algorithm, the C versions if rapidfuzz is installed
+SCORER_CLASSES: Dict[Type, Type[BatchScorer]] = {
+    tdist.JaroWinkler: NumpyJaroWinklerScorer if rapidfuzz_process is None else RapidFuzzJaroWinklerScorer,
+    tdist.RatcliffObershelp: NumpyRatcliffObershelpScorer if rapidfuzz_process is None
+    else RapidFuzzRatcliffObershelpScorer,
+}
+
+
+def register_scorer(algorithm_class: Type, scorer_class: Type[BatchScorer]):
+    '''
+    Sets the scorer used for a textdistance algorithm
+    :param algorithm_class: the textdistance algorithm class
+    :param scorer_class: BatchScorer subclass that gives the same results as the algorithm
+    :return:
+    '''
+    SCORER_CLASSES[algorithm_class] = scorer_class
+
+
+def get_scorer_class(algorithm_class: Type) -> Type[BatchScorer]:
+    return SCORER_CLASSES.get(algorithm_class, BatchScorer)
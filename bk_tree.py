@@ -0,0 +1,110 @@
+from typing import Callable, Iterable, List, Tuple
+
+try:
+    from rapidfuzz.distance import Indel as RapidFuzzIndel
+except ImportError:
+    RapidFuzzIndel = None
+
+# BK-tree (Burkhard-Keller tree) for finding every word within a number of edits of a query without comparing against
+# all of them. Each child is stored under its distance to its parent, and by the triangle inequality a subtree under
+# distance k can only hold matches for a query at distance d from the parent if |d - k| <= the search radius, so most
+# subtrees are skipped.
+#
+# The default metric is the indel distance (insertions and deletions only, len_a + len_b - 2 * longest common
+# subsequence). It's computed by rapidfuzz when it's installed, the pure Python version is far too slow for the tree to
+# beat a batch scan, so check HAS_FAST_DISTANCE before relying on it for speed.
+
+HAS_FAST_DISTANCE = RapidFuzzIndel is not None
+
+# Nodes are [word, {distance: child node}]
+Node = list
+
+
+def python_indel_distance(a: str, b: str) -> int:
+    '''
+    Number of insertions and deletions needed to turn one string into the other
+    :param a:
+    :param b:
+    :return:
+    '''
+    if len(a) < len(b):
+        a, b = b, a
+
+    # Longest common subsequence, one row at a time
+    previous = [0] * (len(b) + 1)
+    for character_a in a:
+        current = [0]
+        for j, character_b in enumerate(b):
+            current.append(previous[j] + 1 if character_a == character_b else max(previous[j + 1], current[j]))
+        previous = current
+
+    return len(a) + len(b) - 2 * previous[-1]
+
+
+indel_distance: Callable[[str, str], int] = python_indel_distance if RapidFuzzIndel is None \
+    else RapidFuzzIndel.distance
+
+
+class BKTree:
+    """
+    BK-tree over a set of words. The distance function has to be a metric (edit distances are)
+    """
+
+    def __init__(self, words: Iterable[str] = (), distance: Callable[[str, str], int] = None):
+        self.distance = indel_distance if distance is None else distance
+        self.root: Node = None
+        self.size = 0
+
+        for word in words:
+            self.add(word)
+
+    def __len__(self):
+        return self.size
+
+    def add(self, word: str):
+        if self.root is None:
+            self.root = [word, {}]
+            self.size = 1
+            return
+
+        node = self.root
+        while True:
+            distance = self.distance(word, node[0])
+
+            # Already in the tree
+            if distance == 0:
+                return
+
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = [word, {}]
+                self.size += 1
+                return
+
+            node = child
+
+    def search(self, query: str, radius: int) -> List[Tuple[str, int]]:
+        '''
+        Finds every word within radius of the query
+        :param query:
+        :param radius:
+        :return: list of (word, distance), in no particular order
+        '''
+        matches = []
+
+        if self.root is None:
+            return matches
+
+        nodes = [self.root]
+        while nodes:
+            word, children = nodes.pop()
+            distance = self.distance(query, word)
+
+            if distance <= radius:
+                matches.append((word, distance))
+
+            for child_distance, child in children.items():
+                if distance - radius <= child_distance <= distance + radius:
+                    nodes.append(child)
+
+        return matches
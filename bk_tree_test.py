@@ -0,0 +1,14 @@
+import logging
+
+import bk_tree as src
+
+LOGGER = logging.getLogger(__name__)
+
+
+def test_BKTree_search():
+    tree = src.BKTree(["curry", "cury", "carry", "durant", "curry"])
+
+    assert len(tree) == 4
+    assert sorted(tree.search("curyy", 2)) == [("curry", 2), ("cury", 1)]
+    assert sorted(tree.search("curyy", 4)) == [("carry", 4), ("curry", 2), ("cury", 1)]
+    assert src.python_indel_distance("curyy", "carry") == src.indel_distance("curyy", "carry")
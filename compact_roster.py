@@ -0,0 +1,115 @@
+import logging
+import sys
+from array import array
+from typing import Dict, List, Sequence
+
+import nba_api.stats.library.data as nba_data
+
+import static_registry
+
+# Column oriented copy of the static roster for fuzzy matching, built once at startup and again whenever the roster is
+# reloaded. Every name column is lowercased and accent-folded up front, and every name is interned, so the thousands of
+# players named John all share a single string and matching never has to go back to nba_api's rows or lowercase
+# anything.
+
+PLAYER_NAME_INDEXES = (nba_data.player_index_first_name, nba_data.player_index_last_name,
+                       nba_data.player_index_full_name)
+TEAM_NAME_INDEXES = (nba_data.team_index_city, nba_data.team_index_nickname, nba_data.team_index_abbreviation,
+                     nba_data.team_index_full_name)
+
+# Original name -> folded, interned name
+FOLDED_NAMES: Dict[str, str] = {}
+
+LOGGER = logging.getLogger(__name__)
+
+
+def fold_name(name: str) -> str:
+    '''
+    Lowercases a roster name and removes its accents. Memoized, so every copy of a name is the same string and folding
+    a name twice doesn't allocate anything. Use fold_query for user input, which shouldn't be kept around
+    :param name:
+    :return:
+    '''
+    folded = FOLDED_NAMES.get(name)
+
+    if folded is None:
+        folded = sys.intern(fold_query(name))
+        FOLDED_NAMES[name] = folded
+
+    return folded
+
+
+def fold_query(name: str) -> str:
+    return static_registry.fold_accents(name).lower()
+
+
+class Roster:
+    """
+    Parallel arrays of ids, display names and folded name columns, all in the same order as the rows they were built
+    from, so a position means the same thing in every one of them
+    """
+
+    def __init__(self, rows: Sequence[list], id_index: int, full_name_index: int, name_indexes: Sequence[int]):
+        self.ids = array('q', (row[id_index] for row in rows))
+        # Original names, for showing to users
+        self.full_names: List[str] = [sys.intern(row[full_name_index]) for row in rows]
+        # nba_data index -> folded name column
+        self.columns: Dict[int, List[str]] = {name_index: [fold_name(row[name_index]) for row in rows]
+                                              for name_index in name_indexes}
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class PlayerRoster(Roster):
+
+    def __init__(self, rows: Sequence[list]):
+        super().__init__(rows, nba_data.player_index_id, nba_data.player_index_full_name, PLAYER_NAME_INDEXES)
+
+        # One bit per player
+        self.is_active = bytearray((len(rows) + 7) // 8)
+        for position, row in enumerate(rows):
+            if row[nba_data.player_index_is_active]:
+                self.is_active[position >> 3] |= 1 << (position & 7)
+
+    def get_is_active(self, position: int) -> bool:
+        return bool(self.is_active[position >> 3] >> (position & 7) & 1)
+
+
+class TeamRoster(Roster):
+
+    def __init__(self, rows: Sequence[list]):
+        super().__init__(rows, nba_data.team_index_id, nba_data.team_index_full_name, TEAM_NAME_INDEXES)
+
+
+PLAYER_ROSTER = PlayerRoster([])
+ACTIVE_PLAYER_ROSTER = PlayerRoster([])
+TEAM_ROSTER = TeamRoster([])
+
+
+def build_rosters():
+    '''
+    (Re)builds the compact rosters from static_registry
+    :return:
+    '''
+    global PLAYER_ROSTER, ACTIVE_PLAYER_ROSTER, TEAM_ROSTER
+
+    FOLDED_NAMES.clear()
+
+    PLAYER_ROSTER = PlayerRoster(static_registry.PLAYERS)
+    ACTIVE_PLAYER_ROSTER = PlayerRoster(static_registry.ACTIVE_PLAYERS)
+    TEAM_ROSTER = TeamRoster(static_registry.TEAMS)
+
+    LOGGER.debug(f"Built compact rosters with {len(FOLDED_NAMES)} distinct names")
+
+
+def get_player_roster(only_active: bool = False) -> PlayerRoster:
+    return ACTIVE_PLAYER_ROSTER if only_active else PLAYER_ROSTER
+
+
+def get_team_roster() -> TeamRoster:
+    return TEAM_ROSTER
+
+
+build_rosters()
+static_registry.add_reload_listener(build_rosters)
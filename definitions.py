@@ -11,6 +11,10 @@ TOKEN_FILE = join(CONF_PATH, "token.txt")
 GOOD_PROXIES_FILE = join(CONF_PATH, 'good_proxies.txt')
 BAD_PROXIES_FILE = join(CONF_PATH, 'bad_proxies.txt')
 BLOCKED_PROXIES_FILE = join(CONF_PATH, 'blocked_proxies.txt')
+PROXY_STATE_FILE = join(CONF_PATH, 'proxy_state.json')
+ENDPOINT_CACHE_FILE = join(CONF_PATH, 'endpoint_cache.sqlite')
+PLAYER_ALIASES_FILE = join(CONF_PATH, 'player_aliases.csv')
+TEAM_ALIASES_FILE = join(CONF_PATH, 'team_aliases.csv')
 
 # Ensure the conf and log folders exist
 if not exists(CONF_PATH):
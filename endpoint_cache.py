@@ -0,0 +1,149 @@
+import logging
+from collections import OrderedDict
+from time import monotonic
+from typing import Optional, Dict, Tuple, Any
+
+# In-memory cache for nba_api endpoint responses, bounded by both the number of entries and the (approximate) size of
+# the cached responses. The least recently used entries are evicted first.
+
+# How long a response stays fresh in seconds, indexed by endpoint class name. Anything that changes during a game
+# gets a short TTL, while biographical info barely changes
+DEFAULT_TTL = 15 * 60
+ENDPOINT_TTLS = {
+    'CommonPlayerInfo': 6 * 60 * 60,
+    'PlayerCareerStats': 10 * 60,
+    'TeamInfoCommon': 10 * 60,
+    'TeamYearByYearStats': 60 * 60,
+}
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Arguments that change how a request is sent, not what it returns
+TRANSPORT_KWARGS = ('proxy', 'headers', 'timeout', 'use_proxy', 'get_request')
+
+LOGGER = logging.getLogger(__name__)
+
+CacheKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def get_response_size(endpoint) -> int:
+    '''
+    Approximate memory used by an endpoint's response (the size of the raw response body)
+    :param endpoint: nba_api endpoint object
+    :return:
+    '''
+    nba_response = getattr(endpoint, 'nba_response', None)
+
+    if nba_response is None:
+        return 0
+
+    return len(nba_response.get_response())
+
+
+def get_cache_key(endpoint_class, kwargs: Dict[str, Any]) -> CacheKey:
+    '''
+    Builds a key from an endpoint class and its arguments. The arguments are normalized by letting nba_api build
+    the request parameters (without making a request), so default values and equivalent types share a key
+    :param endpoint_class: nba_api endpoint class
+    :param kwargs: arguments that would be passed to the endpoint
+    :return:
+    '''
+    request_kwargs = {key: value for key, value in kwargs.items() if key not in TRANSPORT_KWARGS}
+
+    try:
+        parameters = endpoint_class(get_request=False, **request_kwargs).parameters
+    except TypeError:
+        # Endpoint doesn't support deferred requests, fall back to the raw arguments
+        parameters = request_kwargs
+
+    normalized = tuple(sorted((str(key), '' if value is None else str(value).strip().lower())
+                              for key, value in parameters.items()))
+
+    return endpoint_class.__name__, normalized
+
+
+class EndpointCache:
+    """
+    TTL + LRU cache of endpoint responses
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES,
+                 default_ttl: float = DEFAULT_TTL, ttls: Optional[Dict[str, float]] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.ttls = dict(ENDPOINT_TTLS if ttls is None else ttls)
+
+        # key -> (expiry time, size in bytes, endpoint), oldest use first
+        self._entries = OrderedDict()
+        self.current_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_ttl(self, endpoint_name: str) -> float:
+        return self.ttls.get(endpoint_name, self.default_ttl)
+
+    def get(self, key: CacheKey):
+        entry = self._entries.get(key)
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires, size, endpoint = entry
+
+        if expires <= monotonic():
+            LOGGER.debug(f"Cached {key[0]} response expired")
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+
+        return endpoint
+
+    def put(self, key: CacheKey, endpoint, ttl: Optional[float] = None):
+        if ttl is None:
+            ttl = self.get_ttl(key[0])
+
+        size = get_response_size(endpoint)
+
+        # Don't let one huge response flush the whole cache
+        if ttl <= 0 or size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+
+        self._entries[key] = (monotonic() + ttl, size, endpoint)
+        self.current_bytes += size
+
+        while len(self._entries) > self.max_entries or self.current_bytes > self.max_bytes:
+            oldest_key = next(iter(self._entries))
+            LOGGER.debug(f"Evicting cached {oldest_key[0]} response")
+            self._remove(oldest_key)
+            self.evictions += 1
+
+    def invalidate(self, key: CacheKey):
+        if key in self._entries:
+            self._remove(key)
+
+    def clear(self):
+        self._entries.clear()
+        self.current_bytes = 0
+
+    def get_stats(self) -> Dict[str, int]:
+        return {'entries': len(self._entries), 'bytes': self.current_bytes, 'hits': self.hits,
+                'misses': self.misses, 'evictions': self.evictions, 'expirations': self.expirations}
+
+    def _remove(self, key: CacheKey):
+        _, size, _ = self._entries.pop(key)
+        self.current_bytes -= size
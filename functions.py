@@ -1,11 +1,14 @@
-import asyncio
-from typing import Optional, Dict, Any
+from functools import lru_cache
+from itertools import islice
+from typing import Optional, Dict, Any, List
 
-from nba_api.stats.static import players, teams
 from nba_api.stats.endpoints import PlayerCareerStats, TeamInfoCommon, CommonPlayerInfo, TeamYearByYearStats
 from nba_api.stats.library.parameters import Season
-from proxied_endpoint import ProxiedEndpoint
+from proxied_endpoint import ProxiedEndpoint, gather_endpoints
 import fuzzyids
+import name_aliases
+import prefix_index
+import static_registry
 
 teamClrs = {
     1610612737: 0xE03A3E, #Atlanta Hawks
@@ -40,15 +43,21 @@ teamClrs = {
     1610612766: 0x00788C  #Charlotte Hornets
 }
 
+# Memoize name lookups (including the ones that find nothing), keyed by the normalized name, the lookup's options and
+# the fuzzy matching settings. Cleared whenever the static roster is reloaded
+USE_NAME_MEMO = True
+NAME_MEMO_MAX_ENTRIES = 4096
+
 async def getPlayerSeasonStatsByID(player_id: int, season_id: str = Season.current_season, use_proxy = None) -> Optional[dict]:
-    static_info = players.find_player_by_id(player_id)
+    static_info = static_registry.find_player_by_id(player_id)
 
     if static_info is None or len(static_info) < 1:
         return None
 
-    all_seasons_response = await ProxiedEndpoint(PlayerCareerStats, player_id=static_info.get('id'), use_proxy=use_proxy)
-
-    await asyncio.sleep(0)
+    # Both requests are independent, so make them at the same time
+    all_seasons_response, common_info_response = await gather_endpoints(
+        ProxiedEndpoint(PlayerCareerStats, player_id=static_info.get('id'), use_proxy=use_proxy),
+        ProxiedEndpoint(CommonPlayerInfo, player_id=static_info.get('id'), use_proxy=use_proxy))
 
     all_seasons = all_seasons_response.get_normalized_dict().get('SeasonTotalsRegularSeason')
 
@@ -64,8 +73,6 @@ async def getPlayerSeasonStatsByID(player_id: int, season_id: str = Season.curre
 
     else:
 
-        common_info_response = await ProxiedEndpoint(CommonPlayerInfo, player_id=static_info.get('id'), use_proxy=use_proxy)
-
         common_info = common_info_response.get_normalized_dict().get('CommonPlayerInfo')[0]
 
         stats_dict = {}
@@ -100,18 +107,17 @@ async def getPlayerSeasonStatsByID(player_id: int, season_id: str = Season.curre
         return stats_dict
 
 async def getPlayerCareerStatsByID(player_id: int, use_proxy: Optional[bool] = None) -> Optional[dict]:
-    static_info = players.find_player_by_id(player_id)
+    static_info = static_registry.find_player_by_id(player_id)
 
     if static_info is None or len(static_info) < 1:
         return None
 
     stats_dict = {}
 
-    common_info_response = await ProxiedEndpoint(CommonPlayerInfo, player_id=static_info.get('id'), use_proxy=use_proxy)
-
-    await asyncio.sleep(0)
-
-    career_stats_response = await ProxiedEndpoint(PlayerCareerStats, player_id=static_info.get('id'), use_proxy=use_proxy)
+    # Both requests are independent, so make them at the same time
+    common_info_response, career_stats_response = await gather_endpoints(
+        ProxiedEndpoint(CommonPlayerInfo, player_id=static_info.get('id'), use_proxy=use_proxy),
+        ProxiedEndpoint(PlayerCareerStats, player_id=static_info.get('id'), use_proxy=use_proxy))
 
     common_info = common_info_response.get_normalized_dict().get('CommonPlayerInfo')[0]
     career_stats = career_stats_response.get_normalized_dict().get('CareerTotalsRegularSeason')[0]
@@ -139,7 +145,7 @@ async def getPlayerCareerStatsByID(player_id: int, use_proxy: Optional[bool] = N
     return stats_dict
 
 async def getPlayerCareerString(player_id: int) -> Optional[str]:
-    static_info = players.find_player_by_id(player_id)
+    static_info = static_registry.find_player_by_id(player_id)
 
     #If that id doesn't return a player, return None
     if static_info is None or len(static_info) < 1:
@@ -178,28 +184,67 @@ async def getPlayerCareerString(player_id: int) -> Optional[str]:
     return ret_str
 
 def getPlayerIdsByName(player_name: str, #Only required argument
-                       only_active: bool = False, fuzzy_match: bool = False) \
+                       only_active: bool = False, fuzzy_match: bool = False, max_results: Optional[int] = None) \
                         -> Optional[Dict[int, str]]:
     """
     Function that takes a player name and returns a dictionary of matching names indexed by id
     NOTE: any optional parameters set to True WILL make the function slower
-    :param player_name: str to search for
+    :param player_name: str to search for, case, accents and punctuation are ignored
     :param only_active: optional param to only return active players
     :param fuzzy_match: optional param to use fuzzy matching if more or less than one result is returned
+    :param max_results: optional param to only return up to this many players. Fuzzy matches come best first, and
+                        the fuzzy search can stop early
     :return:
     """
 
-    stripped_name = player_name.strip()
+    normalized_name = static_registry.normalize_name(player_name)
 
-    if stripped_name == "":
+    if normalized_name == "":
         return None
 
-    all_matches = players.find_players_by_full_name(stripped_name)
+    if USE_NAME_MEMO:
+        ret_dict = getMemoizedPlayerIds(normalized_name, only_active, fuzzy_match, max_results,
+                                        fuzzyids.getFuzzySettings())
+    else:
+        ret_dict = findPlayerIdsByName(normalized_name, only_active, fuzzy_match, max_results)
+
+    # Copy so callers can't change what's memoized
+    return None if ret_dict is None else dict(ret_dict)
+
+def isExactNameMatch(normalized_name: str, matches: List[dict]) -> bool:
+    # The prefix index only returns exact full name matches on their own, so checking the first one is enough
+    return len(matches) > 0 and static_registry.normalize_name(matches[0].get('full_name')) == normalized_name
+
+def mergeNameMatches(prefix_matches: List[dict], substring_matches: List[dict]) -> List[dict]:
+    '''
+    Adds the substring matches the prefix matches don't already have, after them
+    :param prefix_matches:
+    :param substring_matches:
+    :return:
+    '''
+    prefix_ids = {match.get('id') for match in prefix_matches}
+
+    return prefix_matches + [match for match in substring_matches if match.get('id') not in prefix_ids]
+
+def findPlayerIdsByName(normalized_name: str, only_active: bool, fuzzy_match: bool,
+                        max_results: Optional[int] = None) -> Optional[Dict[int, str]]:
+    all_matches = name_aliases.find_players_by_alias(normalized_name, only_active)
+
+    # Aliases are exactly who the user meant, so there's nothing to fuzzy match
+    if len(all_matches) > 0:
+        return {match.get('id'): match.get('full_name') for match in all_matches[:max_results]}
+
+    all_matches = prefix_index.find_players_by_prefix(normalized_name, only_active)
     ret_dict = {}
 
+    # An exact full name stands on its own. Otherwise names that only show up in the middle of a word, like "smith" in
+    # "Highsmith" or "ron" in "LeBron", come after the ones starting with the query
+    if not isExactNameMatch(normalized_name, all_matches):
+        all_matches = mergeNameMatches(all_matches, static_registry.find_players_by_name(normalized_name))
+
     if all_matches is None or len(all_matches) < 1:
         if fuzzy_match:
-            return fuzzyids.getFuzzyPlayerIdsByName(stripped_name, only_active=only_active)
+            return fuzzyids.getFuzzyPlayerIdsByName(normalized_name, only_active=only_active, max_results=max_results)
         else:
             return None
 
@@ -213,10 +258,18 @@ def getPlayerIdsByName(player_name: str, #Only required argument
             ret_dict[match.get('id')] = match.get('full_name')
 
     if fuzzy_match and len(ret_dict) > 1:
-        return fuzzyids.getFuzzyPlayerIdsByName(stripped_name, only_active=only_active)
+        return fuzzyids.getFuzzyPlayerIdsByName(normalized_name, only_active=only_active, max_results=max_results)
+    elif max_results is not None:
+        return dict(islice(ret_dict.items(), max_results))
     else:
         return ret_dict
 
+@lru_cache(maxsize=NAME_MEMO_MAX_ENTRIES)
+def getMemoizedPlayerIds(normalized_name: str, only_active: bool, fuzzy_match: bool, max_results: Optional[int],
+                         fuzzy_settings: tuple) -> Optional[Dict[int, str]]:
+    # fuzzy_settings is only here to be part of the memo key
+    return findPlayerIdsByName(normalized_name, only_active, fuzzy_match, max_results)
+
 def getActivePlayerIdsByName(player_name: str, fuzzy_match = False) -> Optional[Dict[int, str]]:
     """
     Takes a string and returns all the active names and IDs matching the string
@@ -227,7 +280,7 @@ def getActivePlayerIdsByName(player_name: str, fuzzy_match = False) -> Optional[
     return getPlayerIdsByName(player_name, only_active=True, fuzzy_match=fuzzy_match)
 
 def getPlayerHeadshotURL(player_id: int) -> Optional[str]:
-    static_info = players.find_player_by_id(player_id)
+    static_info = static_registry.find_player_by_id(player_id)
 
     if static_info is None or len(static_info) < 1:
         return None
@@ -235,18 +288,18 @@ def getPlayerHeadshotURL(player_id: int) -> Optional[str]:
     return f"https://ak-static.cms.nba.com/wp-content/uploads/headshots/nba/latest/260x190/{str(player_id)}.png"
 
 def getTeamLogoURL(team_id: int) -> Optional[str]:
-    static_info = teams.find_team_name_by_id(team_id)
+    static_info = static_registry.find_team_by_id(team_id)
 
     if static_info is None or len(static_info) < 1:
         return None
 
-    teamThreeLetter = (TeamInfoCommon(team_id = team_id, season_nullable=Season.current_season).get_normalized_dict().get('TeamInfoCommon')[0]).get("TEAM_ABBREVIATION").lower()
+    teamThreeLetter = static_info.get('abbreviation').lower()
     return f"https://a.espncdn.com/i/teamlogos/nba/500/{teamThreeLetter}.png"
     #Discord does not support .svg file extensions
     #return f"https://www.nba.com/assets/logos/teams/primary/web/{teamThreeLetter}.svg"
 
 async def getTeamCareerStatsByID(team_id: int, use_proxy: Optional[bool] = None) -> Optional[Dict[str, Any]]:
-    static_info = teams.find_team_name_by_id(team_id)
+    static_info = static_registry.find_team_by_id(team_id)
 
     if static_info is None or len(static_info) < 1:
         return None
@@ -286,7 +339,7 @@ async def getTeamCareerStatsByID(team_id: int, use_proxy: Optional[bool] = None)
     return stats_dict
 
 async def getTeamSeasonStatsByID(team_id: int, season_id: str = Season.current_season, use_proxy: Optional[bool] = None) -> Optional[Dict[str, Any]]:
-    static_info = teams.find_team_name_by_id(team_id)
+    static_info = static_registry.find_team_by_id(team_id)
 
     if static_info is None or len(static_info) < 1:
         return None
@@ -323,21 +376,38 @@ async def getTeamSeasonStatsByID(team_id: int, season_id: str = Season.current_s
 def getTeamIdsByName(team_name: str, fuzzy_match: bool = False) -> Optional[Dict[int, str]]:
     """
     Takes a string name and returns a list of all the teams and ids that match that string
-    :param team_name:
+    :param team_name: case, accents and punctuation are ignored
     :return:
     """
 
-    stripped_name = team_name.strip()
+    normalized_name = static_registry.normalize_name(team_name)
 
-    if stripped_name == "":
+    if normalized_name == "":
         return None
 
-    all_matches = teams.find_teams_by_full_name(stripped_name)
+    if USE_NAME_MEMO:
+        ret_dict = getMemoizedTeamIds(normalized_name, fuzzy_match, fuzzyids.getFuzzySettings())
+    else:
+        ret_dict = findTeamIdsByName(normalized_name, fuzzy_match)
+
+    # Copy so callers can't change what's memoized
+    return None if ret_dict is None else dict(ret_dict)
+
+def findTeamIdsByName(normalized_name: str, fuzzy_match: bool) -> Optional[Dict[int, str]]:
+    all_matches = name_aliases.find_teams_by_alias(normalized_name)
+
+    if len(all_matches) > 0:
+        return {match.get('id'): match.get('full_name') for match in all_matches}
+
+    all_matches = prefix_index.find_teams_by_prefix(normalized_name)
     ret_dict = {}
 
+    if not isExactNameMatch(normalized_name, all_matches):
+        all_matches = mergeNameMatches(all_matches, static_registry.find_teams_by_name(normalized_name))
+
     if all_matches is None or len(all_matches) < 1:
         if fuzzy_match:
-            return fuzzyids.getFuzzyTeamIdsByName(stripped_name)
+            return fuzzyids.getFuzzyTeamIdsByName(normalized_name)
         else:
             return None
 
@@ -346,10 +416,23 @@ def getTeamIdsByName(team_name: str, fuzzy_match: bool = False) -> Optional[Dict
             ret_dict[match.get('id')] = match.get('full_name')
 
     if fuzzy_match and len(ret_dict) > 1:
-        return fuzzyids.getFuzzyTeamIdsByName(stripped_name)
+        return fuzzyids.getFuzzyTeamIdsByName(normalized_name)
     else:
         return ret_dict
 
+@lru_cache(maxsize=NAME_MEMO_MAX_ENTRIES)
+def getMemoizedTeamIds(normalized_name: str, fuzzy_match: bool, fuzzy_settings: tuple) -> Optional[Dict[int, str]]:
+    # fuzzy_settings is only here to be part of the memo key
+    return findTeamIdsByName(normalized_name, fuzzy_match)
+
+def clearNameMemo():
+    getMemoizedPlayerIds.cache_clear()
+    getMemoizedTeamIds.cache_clear()
+
+static_registry.add_reload_listener(clearNameMemo)
+# Alias files can also be reloaded on their own
+name_aliases.add_rebuild_listener(clearNameMemo)
+
 def getTeamColor(team_code: int) -> int:
     if team_code in teamClrs:
         return teamClrs[team_code]
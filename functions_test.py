@@ -310,3 +310,70 @@ def test_getTeamColor():
     team_color = src.getTeamColor(TEST_TEAM_ID)
 
     assert True
+
+
+def test_getPlayerIdsByName_memo():
+    src.clearNameMemo()
+
+    player_id = src.getPlayerIdsByName("lebron jame", fuzzy_match=True)
+
+    # Case, whitespace, accents and punctuation all normalize to the same memo entry
+    assert src.getPlayerIdsByName("  LeBrón  JAME. ", fuzzy_match=True) == player_id
+    assert src.getMemoizedPlayerIds.cache_info().hits == 1
+
+    # Lookups that find nothing are memoized too
+    assert src.getPlayerIdsByName("qqqqqq") is None
+    assert src.getPlayerIdsByName("QQQQQQ") is None
+    assert src.getMemoizedPlayerIds.cache_info().hits == 2
+
+    src.static_registry.reload_registry()
+
+    assert src.getMemoizedPlayerIds.cache_info().currsize == 0
+
+    # Rebuilding just the aliases clears it too
+    src.getPlayerIdsByName("qqqqqq")
+    src.name_aliases.build_aliases()
+
+    assert src.getMemoizedPlayerIds.cache_info().currsize == 0
+
+
+def test_getTeamIdsByName_memo():
+    src.clearNameMemo()
+
+    team_id = src.getTeamIdsByName("lakrs", fuzzy_match=True)
+    team_id[0] = "changed"
+
+    assert src.getTeamIdsByName("Lakrs!", fuzzy_match=True) == {TEST_TEAM_ID: TEST_TEAM_FULLNAME}
+    assert src.getMemoizedTeamIds.cache_info().hits == 1
+
+    # Changing a fuzzy setting doesn't reuse results from before the change
+    use_phonetic_index = src.fuzzyids.USE_PHONETIC_INDEX
+    src.fuzzyids.USE_PHONETIC_INDEX = not use_phonetic_index
+    try:
+        src.getTeamIdsByName("lakrs", fuzzy_match=True)
+        assert src.getMemoizedTeamIds.cache_info().hits == 1
+    finally:
+        src.fuzzyids.USE_PHONETIC_INDEX = use_phonetic_index
+
+
+def test_getPlayerIdsByName_exact_and_prefix():
+    # An exact full name doesn't also return the longer names starting with it
+    assert src.getPlayerIdsByName("Nikola Jokic") == {203999: "Nikola Jokić"}
+
+    # Names only found in the middle of a word still fall back to the substring search
+    assert 1629312 in src.getPlayerIdsByName("ighsmith")
+
+    # ...and are added after the prefix matches when there are some
+    ron_names = list(src.getPlayerIdsByName("ron").values())
+    assert "LeBron James" in ron_names
+    assert ron_names[0].startswith("Ron ")
+    assert src.getTeamIdsByName("ce") == {1610612738: "Boston Celtics", 1610612754: "Indiana Pacers"}
+
+
+def test_getIdsByName_alias():
+    assert src.getPlayerIdsByName("LBJ", fuzzy_match=True) == {TEST_PLAYER_ID: "LeBron James"}
+    assert src.getPlayerIdsByName("Greek Freak!") == {203507: "Giannis Antetokounmpo"}
+    assert src.getTeamIdsByName("Sixers", fuzzy_match=True) == {1610612755: "Philadelphia 76ers"}
+
+    # Nicknames that start real names don't hide those players
+    assert {406, 1627885} <= set(src.getPlayerIdsByName("shaq"))
@@ -1,11 +1,25 @@
+import heapq
 import logging
-from typing import Optional, Dict, List, Tuple, Type
-
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from math import ceil, floor
+from typing import Optional, Dict, List, Tuple, Type, NamedTuple, Callable, Sequence
+
+import numpy as np
 import textdistance
 import nba_api.stats.library.data as nba_data
 import textdistance as tdist
 import csv
 
+import static_registry
+from compact_roster import fold_name, fold_query, get_player_roster, get_team_roster, PlayerRoster
+from ngram_index import NGramIndex, get_min_shared_ngrams
+from batch_scoring import BatchScorer, get_scorer_class
+from bk_tree import BKTree, HAS_FAST_DISTANCE
+from phonetic_index import PhoneticIndex
+
 # All the functions that don't use the player id searching the nba api, but use the data.py arrays directly
 # Most of these functions should not be called directly, as cutting down the number of names to fuzzy match will greatly
 # decrease runtime
@@ -35,6 +49,46 @@ player_fullname_distance_algorithm = tdist.RatcliffObershelp
 team_singlename_distance_algorithm = tdist.JaroWinkler
 team_fullname_distance_algorithm = tdist.JaroWinkler
 
+# Only fuzzy match names the n-gram index says could be within the max distance. Only works for RatcliffObershelp,
+# anything else scans the whole roster
+USE_NGRAM_INDEX = True
+# Player name n-gram indexes, built on first use, indexed by (only_active, nba_data player index)
+PLAYER_NGRAM_INDEXES: Dict[Tuple[bool, int], NGramIndex] = {}
+
+# Look the query's phonetic key up before fuzzy matching. If one of the players or teams that sound the same is a good
+# match (below the min distance), they're the answer, and the other methods only run when none is
+USE_PHONETIC_INDEX = True
+# Phonetic indexes indexed by (only_active, nba_data player index) for players and nba_data team index for teams
+PLAYER_PHONETIC_INDEXES: Dict[Tuple[bool, int], PhoneticIndex] = {}
+TEAM_PHONETIC_INDEXES: Dict[int, PhoneticIndex] = {}
+# Abbreviations are too short to have a useful phonetic key
+TEAM_PHONETIC_NAME_INDEXES = (nba_data.team_index_city, nba_data.team_index_nickname, nba_data.team_index_full_name)
+
+# Look single name queries up in a BK-tree of the distinct first and last names instead of scanning the roster. Only
+# works for RatcliffObershelp with its default settings, and is only faster than a scan if rapidfuzz is installed
+USE_NAME_TREE = HAS_FAST_DISTANCE
+# BK-trees indexed by only_active, and the roster positions of each name indexed by (only_active, nba_data index)
+PLAYER_NAME_TREES: Dict[bool, BKTree] = {}
+PLAYER_NAME_POSITIONS: Dict[Tuple[bool, int], Dict[str, List[int]]] = {}
+
+# Score each query against a whole column of names at once with the batch_scoring scorer for the mode's algorithm
+# (NumPy, or C if rapidfuzz is installed). Otherwise the textdistance algorithm is called once per name
+USE_BATCH_SCORING = True
+# Scorers for the compact roster's name columns, built on first use
+NAME_SCORERS: Dict[tuple, BatchScorer] = {}
+# Shared instances of the default algorithms
+DEFAULT_ALGORITHMS = {}
+
+# Process pool mode, off by default. Workers are forked, so they start with the roster, name columns and scorers already
+# in memory and only the queries and roster positions are sent to them
+USE_PROCESS_POOL = False
+PROCESS_POOL_SIZE = os.cpu_count() or 1
+# A single query is only split between the workers if it has at least this many candidates to score
+PROCESS_POOL_MIN_CANDIDATES = 2000
+PROCESS_POOL: Optional[ProcessPoolExecutor] = None
+# True in the pool's workers, so they never try to use a pool themselves
+IS_POOL_WORKER = False
+
 LOGGER = logging.getLogger(__name__)
 
 
@@ -52,16 +106,17 @@ def getNameDistSingle(name, nba_player_info, only_active: bool = False, max_dist
     """
 
     if dist_algorithm is None:
-        dist_algorithm = player_singlename_distance_algorithm()
+        dist_algorithm = getDefaultAlgorithm(player_singlename_distance_algorithm)
 
     if max_distance is None:
         max_distance = PLAYER_SINGLENAME_MAX_DISTANCE
 
     if not only_active or (only_active and nba_player_info[nba_data.player_index_is_active]):
-        first_distance = dist_algorithm.normalized_distance(name, nba_player_info[nba_data.player_index_first_name]
-                                                            .lower())
-        last_distance = dist_algorithm.normalized_distance(name, nba_player_info[nba_data.player_index_last_name]
-                                                           .lower())
+        first_distance = dist_algorithm.normalized_distance(name,
+                                                            fold_name(nba_player_info[
+                                                                          nba_data.player_index_first_name]))
+        last_distance = dist_algorithm.normalized_distance(name,
+                                                           fold_name(nba_player_info[nba_data.player_index_last_name]))
         lesser_distance = min(first_distance, last_distance)
 
         if lesser_distance <= max_distance:
@@ -84,7 +139,7 @@ def getNameDistFirstLast(first_name, last_name, nba_player_info, only_active: bo
     :return:
     """
     if dist_algorithm is None:
-        dist_algorithm = player_firstlast_distance_algorithm()
+        dist_algorithm = getDefaultAlgorithm(player_firstlast_distance_algorithm)
 
     if max_distance is None:
         max_distance = PLAYER_FIRSTLAST_MAX_DISTANCE
@@ -92,11 +147,10 @@ def getNameDistFirstLast(first_name, last_name, nba_player_info, only_active: bo
     if not only_active or (only_active and nba_player_info[nba_data.player_index_is_active]):
         # Get the string distance for the first and last names, and record the better one
         first_distance = dist_algorithm.normalized_distance(first_name,
-                                                            nba_player_info[nba_data.player_index_first_name]
-                                                            .lower())
+                                                            fold_name(nba_player_info[
+                                                                          nba_data.player_index_first_name]))
         last_distance = dist_algorithm.normalized_distance(last_name,
-                                                           nba_player_info[nba_data.player_index_last_name]
-                                                           .lower())
+                                                           fold_name(nba_player_info[nba_data.player_index_last_name]))
         weighted_distance = (first_distance + last_distance * 2) / 3
 
         if weighted_distance <= max_distance:
@@ -118,13 +172,14 @@ def getNameDistFull(name: str, nba_player_info, only_active: bool = False, max_d
     :return:
     """
     if dist_algorithm is None:
-        dist_algorithm = player_fullname_distance_algorithm()
+        dist_algorithm = getDefaultAlgorithm(player_fullname_distance_algorithm)
 
     if max_distance is None:
         max_distance = PLAYER_FULLNAME_MAX_DISTANCE
 
     if not only_active or (only_active and nba_player_info[nba_data.player_index_is_active]):
-        distance = dist_algorithm.normalized_distance(name, nba_player_info[nba_data.player_index_full_name].lower())
+        distance = dist_algorithm.normalized_distance(name,
+                                                      fold_name(nba_player_info[nba_data.player_index_full_name]))
 
         if distance <= max_distance:
             return nba_player_info, distance
@@ -143,20 +198,18 @@ def getTeamDistSingle(name: str, nba_team_info, max_distance: Optional[float] =
     :return:
     """
     if dist_algorithm is None:
-        dist_algorithm = team_singlename_distance_algorithm()
+        dist_algorithm = getDefaultAlgorithm(team_singlename_distance_algorithm)
 
     if max_distance is None:
         max_distance = TEAM_SINGLENAME_MAX_DISTANCE
 
     # Get the string distance for the city, nick, and abbrev, and record the better one
     city_distance = dist_algorithm.normalized_distance(name,
-                                                       nba_team_info[nba_data.team_index_city]
-                                                       .lower())
+                                                       fold_name(nba_team_info[nba_data.team_index_city]))
     nick_distance = dist_algorithm.normalized_distance(name,
-                                                       nba_team_info[nba_data.team_index_nickname]
-                                                       .lower())
-    abbrev_distance = dist_algorithm.normalized_distance(name, nba_team_info[nba_data.team_index_abbreviation]
-                                                         .lower())
+                                                       fold_name(nba_team_info[nba_data.team_index_nickname]))
+    abbrev_distance = dist_algorithm.normalized_distance(name,
+                                                         fold_name(nba_team_info[nba_data.team_index_abbreviation]))
 
     best_dist = min(city_distance, nick_distance, abbrev_distance)
 
@@ -178,13 +231,13 @@ def getTeamDistFull(name: str, nba_team_info, max_distance: Optional[float] = No
     :return:
     """
     if dist_algorithm is None:
-        dist_algorithm = team_singlename_distance_algorithm()
+        dist_algorithm = getDefaultAlgorithm(team_singlename_distance_algorithm)
 
     if max_distance is None:
         max_distance = TEAM_FULLNAME_MAX_DISTANCE
 
     # Get the string distance for the full team name
-    distance = dist_algorithm.normalized_distance(name, nba_team_info[nba_data.team_index_full_name].lower())
+    distance = dist_algorithm.normalized_distance(name, fold_name(nba_team_info[nba_data.team_index_full_name]))
 
     # Check if either string is remotely close
     if distance <= max_distance:
@@ -193,11 +246,630 @@ def getTeamDistFull(name: str, nba_team_info, max_distance: Optional[float] = No
         return None
 
 
+def getFuzzySettings() -> tuple:
+    """
+    Gets every module setting that changes what a fuzzy search returns, e.g. to key a cache of results with
+    :return:
+    """
+    return (PLAYER_SINGLENAME_MAX_DISTANCE, PLAYER_FIRSTLAST_MAX_DISTANCE, PLAYER_FULLNAME_MAX_DISTANCE,
+            TEAM_SINGLENAME_MAX_DISTANCE, TEAM_FULLNAME_MAX_DISTANCE,
+            PLAYER_SINGLENAME_MIN_DISTANCE, PLAYER_FIRSTLAST_MIN_DISTANCE, PLAYER_FULLNAME_MIN_DISTANCE,
+            TEAM_SINGLENAME_MIN_DISTANCE, TEAM_FULLNAME_MIN_DISTANCE,
+            player_singlename_distance_algorithm, player_firstlast_distance_algorithm,
+            player_fullname_distance_algorithm, team_singlename_distance_algorithm, team_fullname_distance_algorithm,
+            USE_PHONETIC_INDEX,
+            # The indexes and scorers are meant to give the same results as a plain scan, but a cache shouldn't
+            # depend on that
+            USE_NGRAM_INDEX, USE_NAME_TREE, USE_BATCH_SCORING)
+
+
+def getPlayerRoster(only_active: bool = False) -> PlayerRoster:
+    return get_player_roster(only_active)
+
+
+def getDefaultAlgorithm(algorithm_class):
+    """
+    Gets a shared instance of a textdistance algorithm, so the defaults aren't created again for every name
+    :param algorithm_class:
+    :return:
+    """
+    if algorithm_class not in DEFAULT_ALGORITHMS:
+        DEFAULT_ALGORITHMS[algorithm_class] = algorithm_class()
+
+    return DEFAULT_ALGORITHMS[algorithm_class]
+
+
+def getPlayerNames(only_active: bool, name_index: int) -> List[str]:
+    """
+    Gets one of the player name fields for the whole roster, lowercased and accent-folded
+    :param only_active: whether or not to only include active players
+    :param name_index: the nba_data index of the name field (first, last, or full name)
+    :return: list of names in roster order
+    """
+    return getPlayerRoster(only_active).columns[name_index]
+
+
+def getTeamNames(name_index: int) -> List[str]:
+    return get_team_roster().columns[name_index]
+
+
+def getNameScorer(names_key: tuple, names: List[str], dist_algorithm, default_algorithm) -> BatchScorer:
+    """
+    Gets a scorer for a column of names
+    :param names_key: key identifying the column of names
+    :param names: the column of names
+    :param dist_algorithm: textdistance algorithm passed in by the caller, or None to use the default
+    :param default_algorithm: the default textdistance algorithm class for this mode
+    :return:
+    """
+    # Scorers only reproduce the algorithms with their default settings, so anything passed in is used as is
+    if dist_algorithm is not None:
+        return BatchScorer(names, dist_algorithm)
+
+    if not USE_BATCH_SCORING:
+        return BatchScorer(names, getDefaultAlgorithm(default_algorithm))
+
+    scorer_class = get_scorer_class(default_algorithm)
+    key = (names_key, scorer_class)
+
+    if key not in NAME_SCORERS:
+        LOGGER.debug(f"Building {scorer_class.__name__} for {names_key}")
+        NAME_SCORERS[key] = scorer_class(names, getDefaultAlgorithm(default_algorithm))
+
+    return NAME_SCORERS[key]
+
+
+def getPlayerNameScorer(only_active: bool, name_index: int, dist_algorithm, default_algorithm) -> BatchScorer:
+    return getNameScorer(('players', only_active, name_index), getPlayerNames(only_active, name_index),
+                         dist_algorithm, default_algorithm)
+
+
+def getTeamNameScorer(name_index: int, dist_algorithm, default_algorithm) -> BatchScorer:
+    return getNameScorer(('teams', name_index), getTeamNames(name_index), dist_algorithm, default_algorithm)
+
+
+def getPlayerNGramIndex(only_active: bool, name_index: int) -> NGramIndex:
+    """
+    Gets the n-gram index for one of the player name fields, building it if it hasn't been yet
+    :param only_active: whether the index is over the active players or all of them
+    :param name_index: the nba_data index of the name field (first, last, or full name)
+    :return:
+    """
+    key = (only_active, name_index)
+
+    if key not in PLAYER_NGRAM_INDEXES:
+        LOGGER.debug(f"Building n-gram index for player field {name_index} (only_active={only_active})")
+        PLAYER_NGRAM_INDEXES[key] = NGramIndex(getPlayerNames(only_active, name_index))
+
+    return PLAYER_NGRAM_INDEXES[key]
+
+
+def getPlayerNameTree(only_active: bool) -> BKTree:
+    """
+    Gets the BK-tree of every distinct first and last name, building it if it hasn't been yet
+    :param only_active: whether the tree is over the active players or all of them
+    :return:
+    """
+    if only_active not in PLAYER_NAME_TREES:
+        LOGGER.debug(f"Building name BK-tree (only_active={only_active})")
+        names = set(getPlayerNames(only_active, nba_data.player_index_first_name))
+        names.update(getPlayerNames(only_active, nba_data.player_index_last_name))
+
+        # Sorted so the tree is the same every time it's built
+        PLAYER_NAME_TREES[only_active] = BKTree(sorted(names))
+
+    return PLAYER_NAME_TREES[only_active]
+
+
+def getPlayerNamePositions(only_active: bool, name_index: int) -> Dict[str, List[int]]:
+    key = (only_active, name_index)
+
+    if key not in PLAYER_NAME_POSITIONS:
+        name_positions = {}
+        for position, name in enumerate(getPlayerNames(only_active, name_index)):
+            name_positions.setdefault(name, []).append(position)
+
+        PLAYER_NAME_POSITIONS[key] = name_positions
+
+    return PLAYER_NAME_POSITIONS[key]
+
+
+def getPlayerPhoneticIndex(only_active: bool, name_index: int) -> PhoneticIndex:
+    key = (only_active, name_index)
+
+    if key not in PLAYER_PHONETIC_INDEXES:
+        PLAYER_PHONETIC_INDEXES[key] = PhoneticIndex(getPlayerNames(only_active, name_index))
+
+    return PLAYER_PHONETIC_INDEXES[key]
+
+
+def getTeamPhoneticIndex(name_index: int) -> PhoneticIndex:
+    if name_index not in TEAM_PHONETIC_INDEXES:
+        TEAM_PHONETIC_INDEXES[name_index] = PhoneticIndex(getTeamNames(name_index))
+
+    return TEAM_PHONETIC_INDEXES[name_index]
+
+
+def clearNameIndexes():
+    PLAYER_NGRAM_INDEXES.clear()
+    PLAYER_PHONETIC_INDEXES.clear()
+    TEAM_PHONETIC_INDEXES.clear()
+    PLAYER_NAME_TREES.clear()
+    PLAYER_NAME_POSITIONS.clear()
+    NAME_SCORERS.clear()
+
+
+static_registry.add_reload_listener(clearNameIndexes)
+
+
+def canForkProcessPool() -> bool:
+    return 'fork' in multiprocessing.get_all_start_methods()
+
+
+def configureProcessPool(pool_size: Optional[int] = None, enabled: bool = True):
+    """
+    Turns process pool mode on or off. The workers are forked the first time the pool is used
+    :param pool_size: number of worker processes, defaults to the number of cores
+    :param enabled: whether or not to use the process pool
+    :return:
+    """
+    global USE_PROCESS_POOL, PROCESS_POOL_SIZE
+
+    closeProcessPool()
+
+    USE_PROCESS_POOL = enabled
+    if pool_size is not None:
+        PROCESS_POOL_SIZE = pool_size
+
+    if enabled and not canForkProcessPool():
+        LOGGER.warning("Process pool mode needs the fork start method, matching names in this process instead")
+
+
+def markPoolWorker():
+    global IS_POOL_WORKER
+    IS_POOL_WORKER = True
+
+
+def buildPlayerScorers():
+    """
+    Builds the default scorers for every player name mode, so forked workers inherit them instead of each building
+    their own
+    :return:
+    """
+    for only_active in (False, True):
+        for name_index in (nba_data.player_index_first_name, nba_data.player_index_last_name):
+            getPlayerNameScorer(only_active, name_index, None, player_singlename_distance_algorithm)
+            getPlayerNameScorer(only_active, name_index, None, player_firstlast_distance_algorithm)
+
+        getPlayerNameScorer(only_active, nba_data.player_index_full_name, None, player_fullname_distance_algorithm)
+
+
+def getProcessPool() -> ProcessPoolExecutor:
+    global PROCESS_POOL
+
+    if PROCESS_POOL is None:
+        buildPlayerScorers()
+
+        LOGGER.debug(f"Starting fuzzy matching process pool with {PROCESS_POOL_SIZE} workers")
+        PROCESS_POOL = ProcessPoolExecutor(max_workers=PROCESS_POOL_SIZE,
+                                           mp_context=multiprocessing.get_context('fork'),
+                                           initializer=markPoolWorker)
+
+    return PROCESS_POOL
+
+
+def closeProcessPool():
+    """
+    Shuts down the worker processes. They hold a copy of the roster from when they were forked, so this also runs
+    whenever the roster is reloaded and the next query forks new ones
+    :return:
+    """
+    global PROCESS_POOL
+
+    if PROCESS_POOL is not None:
+        PROCESS_POOL.shutdown(wait=True)
+        PROCESS_POOL = None
+
+
+static_registry.add_reload_listener(closeProcessPool)
+
+
+def useProcessPool(num_candidates: int) -> bool:
+    return USE_PROCESS_POOL and not IS_POOL_WORKER and canForkProcessPool() and \
+        num_candidates >= PROCESS_POOL_MIN_CANDIDATES
+
+
+def isRatcliffObershelp(dist_algorithm) -> bool:
+    return isinstance(dist_algorithm, tdist.RatcliffObershelp) or dist_algorithm is tdist.RatcliffObershelp
+
+
+def getRatcliffObershelpMinShared(query_length: int, max_distance: float):
+    """
+    Gets the n-gram bound for names within max_distance of a query under RatcliffObershelp. The distance is
+    1 - 2M / (len_a + len_b), where M is never more than the longest common subsequence, so a distance of at most d
+    means the names are at most d * (len_a + len_b) edits apart
+    :param query_length:
+    :param max_distance:
+    :return: function for NGramIndex.search
+    """
+    def getMinShared(candidate_length: int) -> Optional[int]:
+        total_length = query_length + candidate_length
+
+        # Even if the shorter name matched completely the distance would be too big
+        if abs(query_length - candidate_length) > max_distance * total_length + 1e-9:
+            return None
+
+        max_edits = floor(max_distance * total_length + 1e-9)
+
+        return get_min_shared_ngrams(query_length, candidate_length, max_edits)
+
+    return getMinShared
+
+
+def getPlayerCandidatePositions(names: List[str], name_indexes: List[int], only_active: bool, max_distance: float,
+                                dist_algorithm) -> Sequence[int]:
+    """
+    Gets the roster positions of the players that could be within max_distance of a query, in roster order
+    :param names: the strings being compared against each name field
+    :param name_indexes: the nba_data index of the name field each string is compared against
+    :param only_active: whether or not to only return active players
+    :param max_distance: the maximum distance for a match
+    :param dist_algorithm: the algorithm the distance will be calculated with
+    :return: list of positions in the roster returned by getPlayerRoster
+    """
+    roster_size = len(getPlayerRoster(only_active))
+
+    if not USE_NGRAM_INDEX or not isRatcliffObershelp(dist_algorithm):
+        return range(roster_size)
+
+    candidate_positions = set()
+
+    for name, name_index in zip(names, name_indexes):
+        candidate_positions |= getPlayerNGramIndex(only_active, name_index)\
+            .search(name, getRatcliffObershelpMinShared(len(name), max_distance))
+
+    LOGGER.debug(f"n-gram index narrowed {roster_size} players down to {len(candidate_positions)} for {names}")
+
+    return sorted(candidate_positions)
+
+
+class PlayerQuery(NamedTuple):
+    # The query as it's compared, lowercased and accent-folded
+    name: str
+    # The strings compared against each name field, and the nba_data index of that field
+    names: List[str]
+    name_indexes: List[int]
+    # First/last name queries weight the two distances, single name queries take the better one
+    is_first_last: bool
+    default_algorithm: Type
+    max_distance: float
+    min_distance: float
+
+
+def getPlayerQuery(player_name: str, max_distance: Optional[float] = None,
+                   min_distance: Optional[float] = None) -> Optional[PlayerQuery]:
+    """
+    Works out which name fields a player query is compared against and its cutoffs, based on how many names it has
+    :param player_name:
+    :param max_distance: overrides the mode's default maximum cutoff for matches
+    :param min_distance: overrides the mode's default maximum cutoff for close matches
+    :return: None if the query has no names
+    """
+    player_names = player_name.split()
+
+    if len(player_names) < 1:
+        return None
+
+    elif len(player_names) == 1:
+        # Only one name specified, check against first and last names
+        name = fold_query(player_names[0])
+
+        return PlayerQuery(name, [name, name], [nba_data.player_index_first_name, nba_data.player_index_last_name],
+                           False, player_singlename_distance_algorithm,
+                           PLAYER_SINGLENAME_MAX_DISTANCE if max_distance is None else max_distance,
+                           PLAYER_SINGLENAME_MIN_DISTANCE if min_distance is None else min_distance)
+
+    elif len(player_names) > 2:
+        # More than two names specified, check against full names
+        name = fold_query(player_name.strip())
+
+        return PlayerQuery(name, [name], [nba_data.player_index_full_name], False, player_fullname_distance_algorithm,
+                           PLAYER_FULLNAME_MAX_DISTANCE if max_distance is None else max_distance,
+                           PLAYER_FULLNAME_MIN_DISTANCE if min_distance is None else min_distance)
+
+    else:
+        # Exactly two names specified, check against last name then first name
+        first_name = fold_query(player_names[0])
+        last_name = fold_query(player_names[1])
+
+        return PlayerQuery(f"{first_name} {last_name}", [first_name, last_name],
+                           [nba_data.player_index_first_name, nba_data.player_index_last_name],
+                           True, player_firstlast_distance_algorithm,
+                           PLAYER_FIRSTLAST_MAX_DISTANCE if max_distance is None else max_distance,
+                           PLAYER_FIRSTLAST_MIN_DISTANCE if min_distance is None else min_distance)
+
+
+def getPlayerDistances(query: PlayerQuery, only_active: bool, dist_algorithm, positions: Sequence[int]) \
+        -> List[Tuple[int, float]]:
+    """
+    Scores a query against the players at the given roster positions. Also what the process pool's workers run
+    :param query:
+    :param only_active: whether the positions are in the active roster or the full one
+    :param dist_algorithm: textdistance algorithm passed in by the caller, or None to use the query's default
+    :param positions: roster positions to score, in roster order
+    :return: list of (position, distance) for the players within the query's max distance, in roster order
+    """
+    max_distance = query.max_distance
+    field_max_distances = getPlayerFieldMaxDistances(query)
+
+    # A full scan scores the whole column, so the scorers don't have to pick the names out
+    scored_positions = None if len(positions) == len(getPlayerRoster(only_active)) else positions
+
+    # Score every candidate against each name field in one call per field
+    field_distances = [getPlayerNameScorer(only_active, name_index, dist_algorithm, query.default_algorithm)
+                       .score_array(field_name, scored_positions, field_max_distance)
+                       for field_name, name_index, field_max_distance in zip(query.names, query.name_indexes,
+                                                                             field_max_distances)]
+
+    distances = combinePlayerFieldDistances(query, field_distances)
+
+    return [(positions[i], distances[i].item()) for i in np.flatnonzero(distances <= max_distance).tolist()]
+
+
+def getPlayerFieldMaxDistances(query: PlayerQuery) -> List[float]:
+    if query.is_first_last:
+        # The weighted distance can only be under max_distance if the first name is within 3 * max_distance and the
+        # last name within 1.5 * max_distance, anything further out can be left as a lower bound
+        return [query.max_distance * 3, query.max_distance * 1.5]
+    else:
+        return [query.max_distance] * len(query.names)
+
+
+def combinePlayerFieldDistances(query: PlayerQuery, field_distances):
+    """
+    Combines the distances to each of a query's name fields into the player's distance. Works on single distances and
+    on arrays of them
+    :param query:
+    :param field_distances: one distance, or array of distances, per name field
+    :return:
+    """
+    if query.is_first_last:
+        # Theoretically the last name is more important than the first name, so give that one more weight
+        return (field_distances[0] + field_distances[1] * 2) / 3
+    else:
+        # Record the better of the first and last name distances
+        return np.minimum.reduce(field_distances)
+
+
+def getPlayerTopDistances(query: PlayerQuery, only_active: bool, dist_algorithm, positions: Sequence[int],
+                          max_results: int) -> List[Tuple[int, float]]:
+    """
+    Finds the max_results players closest to a query without scoring every candidate. Each candidate gets a cheap lower
+    bound on its distance first, then candidates are scored best bound first until the next bound can't beat the
+    max_results-th best distance found so far, or max_results perfect matches have been found
+    :param query:
+    :param only_active:
+    :param dist_algorithm: textdistance algorithm passed in by the caller, or None to use the query's default
+    :param positions: roster positions to consider, in roster order
+    :param max_results:
+    :return: list of (position, distance) for up to max_results players within the query's max distance, best first,
+             ties in roster order
+    """
+    max_distance = query.max_distance
+    scored_positions = None if len(positions) == len(getPlayerRoster(only_active)) else positions
+
+    field_max_distances = getPlayerFieldMaxDistances(query)
+    scorers = [getPlayerNameScorer(only_active, name_index, dist_algorithm, query.default_algorithm)
+               for name_index in query.name_indexes]
+    field_bounds = [scorer.get_lower_bounds(field_name, scored_positions)
+                    for scorer, field_name in zip(scorers, query.names)]
+    bounds = combinePlayerFieldDistances(query, field_bounds)
+
+    # The worst of the best matches so far is on top, stored as (-distance, -position) since heapq is a min heap
+    best: List[Tuple[float, int]] = []
+    scored = 0
+
+    for i in np.argsort(bounds, kind='stable').tolist():
+        bound = bounds[i].item()
+
+        if bound > max_distance:
+            break
+
+        if len(best) == max_results:
+            worst_distance = -best[0][0]
+
+            # Nothing left can do better than what's already been found
+            if bound > worst_distance or worst_distance == 0:
+                break
+
+        position = positions[i] if scored_positions is not None else i
+        distance = float(combinePlayerFieldDistances(
+            query, [field_bound[i].item() if scorer.EXACT_BOUNDS or field_bound[i] > field_max_distance
+                    else scorer.score_one(field_name, position)
+                    for scorer, field_name, field_bound, field_max_distance
+                    in zip(scorers, query.names, field_bounds, field_max_distances)]))
+        scored += 1
+
+        if distance > max_distance:
+            continue
+
+        match = (-distance, -position)
+        if len(best) < max_results:
+            heapq.heappush(best, match)
+        elif match > best[0]:
+            heapq.heapreplace(best, match)
+
+    LOGGER.debug(f"Scored {scored} of {len(positions)} candidates for the top {max_results} matches of {query.name}")
+
+    return sorted(((-position, -distance) for distance, position in best), key=lambda match: (match[1], match[0]))
+
+
+def getPlayerPhoneticPositions(query: PlayerQuery, only_active: bool) -> List[int]:
+    """
+    Gets the roster positions of the players whose first and last names both sound like a first/last name query's
+    :param query:
+    :param only_active:
+    :return: list of positions, in roster order
+    """
+    field_positions = [set(getPlayerPhoneticIndex(only_active, name_index).search(field_name))
+                       for field_name, name_index in zip(query.names, query.name_indexes)]
+
+    return sorted(set.intersection(*field_positions))
+
+
+def getPlayerDistancesFromPhoneticIndex(query: PlayerQuery, only_active: bool, dist_algorithm) \
+        -> List[Tuple[int, float]]:
+    """
+    Scores only the players whose names sound like the query
+    :param query:
+    :param only_active:
+    :param dist_algorithm:
+    :return: same as getPlayerDistances
+    """
+    if query.is_first_last:
+        positions = getPlayerPhoneticPositions(query, only_active)
+
+        if len(positions) < 1:
+            return []
+
+        return getPlayerDistances(query, only_active, dist_algorithm, positions)
+
+    # A single name is only scored against the fields that sound like it, otherwise e.g. "johnnzy" would be a good
+    # match for every Johnny because it sounds like Johnny Jones' last name
+    player_distances: Dict[int, float] = {}
+
+    for field_name, name_index in zip(query.names, query.name_indexes):
+        positions = getPlayerPhoneticIndex(only_active, name_index).search(field_name)
+
+        if len(positions) < 1:
+            continue
+
+        field_query = query._replace(names=[field_name], name_indexes=[name_index])
+        for position, distance in getPlayerDistances(field_query, only_active, dist_algorithm, sorted(positions)):
+            if position not in player_distances or distance < player_distances[position]:
+                player_distances[position] = distance
+
+    return sorted(player_distances.items())
+
+
+def useNameTree(query: PlayerQuery, dist_algorithm) -> bool:
+    # Single name queries are the ones comparing the same string against two fields
+    return USE_NAME_TREE and dist_algorithm is None and not query.is_first_last and len(query.names) == 2 and \
+        isRatcliffObershelp(query.default_algorithm) and query.max_distance < 1
+
+
+def getSingleNameMaxEdits(query_length: int, max_distance: float) -> int:
+    """
+    Gets the BK-tree search radius for a single name under RatcliffObershelp. A distance of at most d means the names
+    are at most d * (len_a + len_b) insertions and deletions apart (see getRatcliffObershelpMinShared), and the names'
+    lengths can't differ by more than that, so no match can be more than 2d * len_query / (1 - d) edits away
+    :param query_length:
+    :param max_distance:
+    :return:
+    """
+    return floor(2 * max_distance * query_length / (1 - max_distance) + 1e-9)
+
+
+def getPlayerDistancesFromTree(query: PlayerQuery, only_active: bool) -> List[Tuple[int, float]]:
+    """
+    Scores a single name query by looking up the names within its edit budget in the BK-tree, instead of scoring every
+    player
+    :param query:
+    :param only_active:
+    :return: same as getPlayerDistances
+    """
+    algorithm = getDefaultAlgorithm(query.default_algorithm)
+    max_edits = getSingleNameMaxEdits(len(query.name), query.max_distance)
+
+    name_distances = {}
+    for name, edits in getPlayerNameTree(only_active).search(query.name, max_edits):
+        distance = algorithm.normalized_distance(query.name, name)
+
+        if distance <= query.max_distance:
+            name_distances[name] = distance
+
+    # Record the better of the first and last name distances
+    player_distances = {}
+    for name_index in query.name_indexes:
+        name_positions = getPlayerNamePositions(only_active, name_index)
+
+        for name, distance in name_distances.items():
+            for position in name_positions.get(name, ()):
+                if position not in player_distances or distance < player_distances[position]:
+                    player_distances[position] = distance
+
+    LOGGER.debug(f"BK-tree found {len(name_distances)} names within {max_edits} edits of {query.name}")
+
+    return sorted(player_distances.items())
+
+
+def getPlayerMatchDistances(query: PlayerQuery, only_active: bool, dist_algorithm,
+                            max_results: Optional[int] = None) -> List[Tuple[int, float]]:
+    """
+    Scores a query with the fastest method that works for it: the phonetic index if it finds a good match, otherwise the
+    BK-tree or a scan of the n-gram index's candidates (split between the process pool's workers if it's on)
+    :param query:
+    :param only_active:
+    :param dist_algorithm: textdistance algorithm passed in by the caller, or None to use the query's default
+    :param max_results: if set, the scan stops once it has the max_results best matches (see getPlayerTopDistances).
+                        The other methods can still return more
+    :return: same as getPlayerDistances
+    """
+    if USE_PHONETIC_INDEX:
+        phonetic_distances = getPlayerDistancesFromPhoneticIndex(query, only_active, dist_algorithm)
+
+        # Players that sound like the query answer it without scoring anyone else, as long as one of them is a good
+        # match. Otherwise a name that only sounds close ("Bryan" and "Brown") could hide the right one ("Bryant")
+        if any(distance < query.min_distance for position, distance in phonetic_distances):
+            return phonetic_distances
+
+    if useNameTree(query, dist_algorithm):
+        player_distances = getPlayerDistancesFromTree(query, only_active)
+
+    else:
+        algorithm = query.default_algorithm if dist_algorithm is None else dist_algorithm
+        positions = getPlayerCandidatePositions(query.names, query.name_indexes, only_active, query.max_distance,
+                                                algorithm)
+
+        if max_results is not None:
+            player_distances = getPlayerTopDistances(query, only_active, dist_algorithm, positions, max_results)
+        elif useProcessPool(len(positions)):
+            player_distances = getPlayerDistancesInPool(query, only_active, dist_algorithm, positions)
+        else:
+            player_distances = getPlayerDistances(query, only_active, dist_algorithm, positions)
+
+    return player_distances
+
+
+def getPlayerDistancesInPool(query: PlayerQuery, only_active: bool, dist_algorithm, positions: Sequence[int]) \
+        -> List[Tuple[int, float]]:
+    """
+    Splits the positions to score into one shard per worker and scores them in the process pool
+    :param query:
+    :param only_active:
+    :param dist_algorithm:
+    :param positions:
+    :return: same as getPlayerDistances
+    """
+    shard_size = ceil(len(positions) / PROCESS_POOL_SIZE)
+    pool = getProcessPool()
+
+    futures = [pool.submit(getPlayerDistances, query, only_active, dist_algorithm, positions[i:i + shard_size])
+               for i in range(0, len(positions), shard_size)]
+
+    player_distances = []
+    for future in futures:
+        player_distances.extend(future.result())
+
+    return player_distances
+
+
 def getFuzzyPlayerIdsByName(player_name: str,
                             only_active: bool = False,
                             max_distance: float = None, min_distance: float = None,
                             dist_algorithm: textdistance.algorithms = None,
-                            log_file: str = None, return_ratio: bool = False, only_return_best: bool = False) \
+                            log_file: str = None, return_ratio: bool = False, only_return_best: bool = False,
+                            max_results: Optional[int] = None) \
         -> Optional[Dict[int, str]]:
     """
     Finds ids that closely match a given string
@@ -211,6 +883,8 @@ def getFuzzyPlayerIdsByName(player_name: str,
                          works if only_return_best is True
     :param only_return_best: Optional param to return the single best match instead of a list of matches below the
                              cutoff
+    :param max_results: Optional param to only return the max_results best matches, best first. Lets the search stop
+                        early instead of scoring every player
     :return:
     """
 
@@ -223,7 +897,10 @@ def getFuzzyPlayerIdsByName(player_name: str,
 
         logger.writerow(['algorithm', 'target', 'player', 'string distance'])
 
-    player_names = player_name.split()
+    query = getPlayerQuery(player_name, max_distance, min_distance)
+
+    if query is None:
+        return None
 
     # dictionary indexed by player id with value player name
     matches = {}
@@ -232,129 +909,43 @@ def getFuzzyPlayerIdsByName(player_name: str,
     best_id: Optional[int] = None
     best_distance = None
 
-    if len(player_names) < 1:
-        return None
-
-    elif len(player_names) == 1:
-        # Only one name specified, check against first and last names
-        name = player_names[0].lower()
-
-        if min_distance is None:
-            min_distance = PLAYER_SINGLENAME_MIN_DISTANCE
-
-        for nba_player in nba_data.players:
-
-            if not only_active or (only_active and nba_player[nba_data.player_index_is_active]):
-                # Get the string distance for the first and last names, and record the better one
-                distance_result = getNameDistSingle(name, nba_player, only_active=only_active,
-                                                    max_distance=max_distance,
-                                                    dist_algorithm=dist_algorithm)
-
-                if distance_result is not None:
-                    nba_player, distance = distance_result
-                    LOGGER.debug(
-                        f"Single name distance ({name}|{nba_player[nba_data.player_index_full_name]}) = {distance}")
-
-                    # Add the id to the list of matches found
-                    matches[nba_player[nba_data.player_index_id]] = nba_player[nba_data.player_index_full_name]
+    algorithm = query.default_algorithm if dist_algorithm is None else dist_algorithm
+    roster = getPlayerRoster(only_active)
 
-                    # Check if this match is closer than the close match threshold threshold
-                    if distance < min_distance:
-                        good_matches[nba_player[nba_data.player_index_id]] = nba_player[nba_data.player_index_full_name]
-
-                        if distance == 0:
-                            perfect_matches[nba_player[nba_data.player_index_id]] = nba_player[
-                                nba_data.player_index_full_name]
-
-                    # Check if this match is  the best match so far
-                    if best_distance is None or distance < best_distance:
-                        best_distance = distance
-                        best_id = nba_player[nba_data.player_index_id]
-
-                    # Log to CSV if enabled
-                    if logger is not None:
-                        logger.writerow([dist_algorithm.__class__.__name__, player_name,
-                                         nba_player[nba_data.player_index_full_name], distance])
-
-    elif len(player_names) > 2:
-        # More than two names specified, check against full names
-
-        name = player_name.strip().lower()
-
-        if min_distance is None:
-            min_distance = PLAYER_FULLNAME_MIN_DISTANCE
-
-        for nba_player in nba_data.players:
-
-            # Get the string distance for the first and last names, and record the better one
-            distance_result = getNameDistFull(name, nba_player, only_active=only_active, max_distance=max_distance,
-                                              dist_algorithm=dist_algorithm)
-
-            if distance_result is not None:
-                nba_player, distance = distance_result
-                LOGGER.debug(f"Full name distance ({name}|{nba_player[nba_data.player_index_full_name]}) = {distance}")
-
-                # Add the id to the list of matches found
-                matches[nba_player[nba_data.player_index_id]] = nba_player[nba_data.player_index_full_name]
-
-                # Check if this match is closer than the close match threshold threshold
-                if distance < min_distance:
-                    good_matches[nba_player[nba_data.player_index_id]] = nba_player[nba_data.player_index_full_name]
-
-                    if distance == 0:
-                        perfect_matches[nba_player[nba_data.player_index_id]] = nba_player[
-                            nba_data.player_index_full_name]
-
-                # Check if this match is  the best match so far
-                if best_distance is None or distance < best_distance:
-                    best_distance = distance
-                    best_id = nba_player[nba_data.player_index_id]
-
-                # Log to CSV if enabled
-                if logger is not None:
-                    logger.writerow(
-                        [dist_algorithm.__class__.__name__, player_name, nba_player[nba_data.player_index_full_name],
-                         distance])
+    # Only the best match matters, so there's no need to score everyone. Logging wants every distance
+    if only_return_best and logger is None:
+        max_results = 1
 
+    if max_results is not None:
+        player_distances = sorted(getPlayerMatchDistances(query, only_active, dist_algorithm, max_results),
+                                  key=lambda match: (match[1], match[0]))[:max_results]
     else:
-        # Exactly two names specified, check against last name then first name
-        first_name = player_names[0].lower()
-        last_name = player_names[1].lower()
-
-        if min_distance is None:
-            min_distance = PLAYER_FIRSTLAST_MIN_DISTANCE
+        player_distances = getPlayerMatchDistances(query, only_active, dist_algorithm)
 
-        for nba_player in nba_data.players:
+    for position, distance in player_distances:
+        player_id = roster.ids[position]
+        player_full_name = roster.full_names[position]
+        LOGGER.debug(f"Player name distance ({query.name}|{player_full_name}) = {distance}")
 
-            # Theoretically the last name is more important than the first name, so give that one more weight
-            distance_result = getNameDistFirstLast(first_name, last_name, nba_player, only_active, max_distance,
-                                                   dist_algorithm)
+        # Add the id to the list of matches found
+        matches[player_id] = player_full_name
 
-            if distance_result is not None:
-                nba_player, distance = distance_result
-                LOGGER.debug(
-                    f"First/last distance ({first_name} {last_name}|{nba_player[nba_data.player_index_full_name]}) = {distance}")
+        # Check if this match is closer than the close match threshold threshold
+        if distance < query.min_distance:
+            good_matches[player_id] = player_full_name
 
-                # Add the id to the list of matches found
-                matches[nba_player[nba_data.player_index_id]] = nba_player[nba_data.player_index_full_name]
+            if distance == 0:
+                perfect_matches[player_id] = player_full_name
 
-                # Check if this match is closer than the close match threshold threshold
-                if distance < min_distance:
-                    good_matches[nba_player[nba_data.player_index_id]] = nba_player[nba_data.player_index_full_name]
+        # Check if this match is  the best match so far
+        if best_distance is None or distance < best_distance:
+            best_distance = distance
+            best_id = player_id
 
-                    if distance == 0:
-                        perfect_matches[nba_player[nba_data.player_index_id]] = nba_player[
-                            nba_data.player_index_full_name]
-
-                # Check if this match is  the best match so far
-                if best_distance is None or distance < best_distance:
-                    best_distance = distance
-                    best_id = nba_player[nba_data.player_index_id]
-
-                # Log to CSV if enabled
-                if logger is not None:
-                    logger.writerow([dist_algorithm.__class__.__name__, player_name,
-                                     nba_player[nba_data.player_index_full_name], distance])
+        # Log to CSV if enabled
+        if logger is not None:
+            logger.writerow([getattr(algorithm, '__name__', algorithm.__class__.__name__), player_name,
+                             player_full_name, distance])
 
     # If we're logging, close the file
     if not f is None:
@@ -380,6 +971,46 @@ def getFuzzyPlayerIdsByName(player_name: str,
             return None
 
 
+def getTeamDistances(name: str, name_indexes: List[int], dist_algorithm, max_distance: float,
+                     positions: Optional[Sequence[int]] = None) -> List[Tuple[int, float]]:
+    """
+    Scores a team query against the teams at the given positions, taking the best of the given name fields
+    :param name: the query, lowercased and accent-folded
+    :param name_indexes: the nba_data indexes of the name fields to compare against
+    :param dist_algorithm: textdistance algorithm passed in by the caller, or None to use the default
+    :param max_distance:
+    :param positions: positions in the team roster to score, defaults to every team
+    :return: list of (position, distance) for the teams within max_distance, in roster order
+    """
+    # Both modes have always used the single name algorithm (see getTeamDistFull)
+    field_distances = [getTeamNameScorer(name_index, dist_algorithm, team_singlename_distance_algorithm)
+                       .score_array(name, positions, max_distance)
+                       for name_index in name_indexes]
+    distances = np.minimum.reduce(field_distances)
+
+    if positions is None:
+        positions = range(len(distances))
+
+    return [(positions[i], distances[i].item()) for i in np.flatnonzero(distances <= max_distance).tolist()]
+
+
+def getTeamDistancesFromPhoneticIndex(name: str, name_indexes: List[int], dist_algorithm,
+                                      max_distance: float) -> List[Tuple[int, float]]:
+    """
+    Scores only the teams with a name that sounds like the query
+    :return: same as getTeamDistances
+    """
+    positions = set()
+    for name_index in name_indexes:
+        if name_index in TEAM_PHONETIC_NAME_INDEXES:
+            positions.update(getTeamPhoneticIndex(name_index).search(name))
+
+    if len(positions) < 1:
+        return []
+
+    return getTeamDistances(name, name_indexes, dist_algorithm, max_distance, sorted(positions))
+
+
 def getFuzzyTeamIdsByName(team_name: str,
                           max_distance: Optional[float] = None, min_distance: Optional[float] = None,
                           dist_algorithm: textdistance.algorithms = None,
@@ -420,75 +1051,63 @@ def getFuzzyTeamIdsByName(team_name: str,
 
     if len(team_names) == 1:
         # Only one name specified, check against city, nickname, and abbreviation
-        name = team_names[0].lower()
+        name = fold_query(team_names[0])
+        name_indexes = [nba_data.team_index_city, nba_data.team_index_nickname, nba_data.team_index_abbreviation]
+
+        if max_distance is None:
+            max_distance = TEAM_SINGLENAME_MAX_DISTANCE
 
         if min_distance is None:
             min_distance = TEAM_SINGLENAME_MIN_DISTANCE
 
-        for nba_team in nba_data.teams:
-
-            distance_result = getTeamDistSingle(name, nba_team, max_distance, dist_algorithm)
-
-            # Check if either string is remotely close
-            if distance_result is not None:
-                nba_team, distance = distance_result
-
-                # Add the id to the list of matches found
-                matches[nba_team[nba_data.team_index_id]] = nba_team[nba_data.team_index_full_name]
-
-                # Check if this match is closer than the close match threshold threshold
-                if distance < min_distance:
-                    good_matches[nba_team[nba_data.team_index_id]] = nba_team[nba_data.team_index_full_name]
-
-                    if distance == 0:
-                        perfect_matches[nba_team[nba_data.team_index_id]] = nba_team[nba_data.team_index_full_name]
-
-                # Check if this match is the best match so far
-                if best_distance is None or distance < best_distance:
-                    best_distance = distance
-                    best_id = nba_team[nba_data.team_index_id]
-
-                # Log to CSV if enabled
-                if logger is not None:
-                    logger.writerow(
-                        [dist_algorithm.__class__.__name__, team_name, nba_team[nba_data.team_index_full_name],
-                         distance])
-
     else:
         # More than one name specified, check against full names
+        name = fold_query(team_name.strip())
+        name_indexes = [nba_data.team_index_full_name]
 
-        name = team_name.strip().lower()
+        if max_distance is None:
+            max_distance = TEAM_FULLNAME_MAX_DISTANCE
 
         if min_distance is None:
             min_distance = TEAM_FULLNAME_MIN_DISTANCE
 
-        for nba_team in nba_data.teams:
-            # Get the string distance for the first and last names, and record the better one
-            distance_result = getTeamDistFull(name, nba_team, max_distance, dist_algorithm)
+    # For logging, both modes use the single name algorithm by default
+    algorithm = team_singlename_distance_algorithm if dist_algorithm is None else dist_algorithm
+    team_distances = []
+
+    if USE_PHONETIC_INDEX:
+        team_distances = getTeamDistancesFromPhoneticIndex(name, name_indexes, dist_algorithm, max_distance)
+
+    # Good matches that sound like the query answer it on their own, everything is scored only when there are none
+    if not any(distance < min_distance for position, distance in team_distances):
+        team_distances = getTeamDistances(name, name_indexes, dist_algorithm, max_distance)
 
-            if distance_result is not None:
-                nba_team, distance = distance_result
+    roster = get_team_roster()
 
-                # Add the id to the list of matches found
-                matches[nba_team[nba_data.team_index_id]] = nba_team[nba_data.team_index_full_name]
+    for position, distance in team_distances:
+        team_id = roster.ids[position]
+        team_full_name = roster.full_names[position]
 
-                # Check if this match is closer than the close match threshold threshold
-                if distance < min_distance:
-                    good_matches[nba_team[nba_data.team_index_id]] = nba_team[nba_data.team_index_full_name]
+        # Add the id to the list of matches found
+        matches[team_id] = team_full_name
 
-                    if distance == 0:
-                        perfect_matches[nba_team[nba_data.team_index_id]] = nba_team[nba_data.team_index_full_name]
+        # Check if this match is closer than the close match threshold threshold
+        if distance < min_distance:
+            good_matches[team_id] = team_full_name
 
-                # Check if this match is  the best match so far
-                if best_distance is None or distance < best_distance:
-                    best_distance = distance
-                    best_id = nba_team[nba_data.team_index_id]
+            if distance == 0:
+                perfect_matches[team_id] = team_full_name
 
-                # Log to CSV if enabled
-                if logger is not None:
-                    logger.writerow(
-                        [dist_algorithm.__class__.__name__, team_name, nba_team[nba_data.team_index_full_name],
-                         distance])
+        # Check if this match is the best match so far
+        if best_distance is None or distance < best_distance:
+            best_distance = distance
+            best_id = team_id
+
+        # Log to CSV if enabled
+        if logger is not None:
+            logger.writerow(
+                [getattr(algorithm, '__name__', algorithm.__class__.__name__), team_name, team_full_name,
+                 distance])
 
     # If we're logging, close the file
     if not f is None:
@@ -513,3 +1132,44 @@ def getFuzzyTeamIdsByName(team_name: str,
             return matches
         else:
             return None
+
+
+def getFuzzyIdsByNames(find_ids: Callable, names: List[str], kwargs: dict) -> List[Optional[Dict[int, str]]]:
+    """
+    Runs a fuzzy id search for each distinct name once, split between the process pool's workers in process pool mode
+    :param find_ids: getFuzzyPlayerIdsByName or getFuzzyTeamIdsByName
+    :param names:
+    :param kwargs: passed to find_ids
+    :return: list of results, in the same order as names
+    """
+    distinct_names = list(dict.fromkeys(names))
+    find_name_ids = partial(find_ids, **kwargs)
+
+    if USE_PROCESS_POOL and not IS_POOL_WORKER and canForkProcessPool() and len(distinct_names) > 1:
+        # A few chunks per worker, so one slow chunk doesn't hold up the rest
+        chunk_size = ceil(len(distinct_names) / (PROCESS_POOL_SIZE * 4))
+        results = dict(zip(distinct_names, getProcessPool().map(find_name_ids, distinct_names, chunksize=chunk_size)))
+    else:
+        results = {name: find_name_ids(name) for name in distinct_names}
+
+    return [results[name] for name in names]
+
+
+def getFuzzyPlayerIdsByNames(player_names: List[str], **kwargs) -> List[Optional[Dict[int, str]]]:
+    """
+    Finds ids that closely match each of a list of strings, e.g. when importing names or profiling
+    :param player_names: The names to search the NBA roster for
+    :param kwargs: Optional params passed to getFuzzyPlayerIdsByName (except log_file)
+    :return: list with the result of getFuzzyPlayerIdsByName for each name
+    """
+    return getFuzzyIdsByNames(getFuzzyPlayerIdsByName, player_names, kwargs)
+
+
+def getFuzzyTeamIdsByNames(team_names: List[str], **kwargs) -> List[Optional[Dict[int, str]]]:
+    """
+    Finds ids that closely match each of a list of strings
+    :param team_names: The names to search the NBA teams for
+    :param kwargs: Optional params passed to getFuzzyTeamIdsByName (except log_file)
+    :return: list with the result of getFuzzyTeamIdsByName for each name
+    """
+    return getFuzzyIdsByNames(getFuzzyTeamIdsByName, team_names, kwargs)
@@ -0,0 +1,152 @@
+import logging
+
+import batch_scoring
+import fuzzyids as src
+
+LOGGER = logging.getLogger(__name__)
+
+# Misspellings covering each of the name modes
+TEST_PLAYER_QUERIES = ["curyy", "keerilenko", "giannis", "lebron jame", "anfony hadaway", "shaquille o neal"]
+
+
+def getFuzzyPlayerIdsByName_full_scan(player_name: str, **kwargs):
+    src.USE_NGRAM_INDEX = False
+    try:
+        return src.getFuzzyPlayerIdsByName(player_name, **kwargs)
+    finally:
+        src.USE_NGRAM_INDEX = True
+
+
+def getFuzzyPlayerIdsByName_textdistance(player_name: str, **kwargs):
+    src.USE_BATCH_SCORING = False
+    try:
+        return src.getFuzzyPlayerIdsByName(player_name, **kwargs)
+    finally:
+        src.USE_BATCH_SCORING = True
+
+
+def test_getFuzzyPlayerIdsByName_ngram_index_matches_full_scan():
+    for query in TEST_PLAYER_QUERIES:
+        for only_active in (False, True):
+            expected = getFuzzyPlayerIdsByName_full_scan(query, only_active=only_active)
+
+            assert src.getFuzzyPlayerIdsByName(query, only_active=only_active) == expected
+
+
+def test_getPlayerCandidates_ngram_index_narrows():
+    roster_size = len(src.getPlayerRoster())
+    candidates = src.getPlayerCandidatePositions(["keerilenko"], [src.nba_data.player_index_last_name], False,
+                                                 src.PLAYER_SINGLENAME_MAX_DISTANCE, src.tdist.RatcliffObershelp)
+
+    assert 0 < len(candidates) < roster_size / 10
+
+
+def test_getFuzzyPlayerIdsByName_batch_scoring_matches_textdistance():
+    for query in TEST_PLAYER_QUERIES:
+        expected = getFuzzyPlayerIdsByName_textdistance(query, only_return_best=True, return_ratio=True)
+
+        assert src.getFuzzyPlayerIdsByName(query, only_return_best=True, return_ratio=True) == expected
+
+
+def test_numpy_scorers_match_textdistance():
+    names = src.getPlayerNames(False, src.nba_data.player_index_last_name)
+
+    for scorer_class, algorithm in ((batch_scoring.NumpyJaroWinklerScorer, src.tdist.JaroWinkler()),
+                                    (batch_scoring.NumpyRatcliffObershelpScorer, src.tdist.RatcliffObershelp())):
+        scorer = scorer_class(names, algorithm)
+
+        for query in ("curyy", "keerilenko", "o'neal", ""):
+            expected = [algorithm.normalized_distance(query, name) for name in names]
+
+            assert scorer.score(query) == expected
+
+
+def test_getFuzzyPlayerIdsByNames_process_pool():
+    expected = [src.getFuzzyPlayerIdsByName(query) for query in TEST_PLAYER_QUERIES]
+    use_process_pool = src.USE_PROCESS_POOL
+    pool_size = src.PROCESS_POOL_SIZE
+    min_candidates = src.PROCESS_POOL_MIN_CANDIDATES
+
+    src.configureProcessPool(2)
+    src.PROCESS_POOL_MIN_CANDIDATES = 0
+    try:
+        # Bulk resolution, and single queries sharded between the workers
+        assert src.getFuzzyPlayerIdsByNames(TEST_PLAYER_QUERIES + TEST_PLAYER_QUERIES) == expected + expected
+        assert [src.getFuzzyPlayerIdsByName(query) for query in TEST_PLAYER_QUERIES] == expected
+    finally:
+        src.configureProcessPool(pool_size, enabled=use_process_pool)
+        src.PROCESS_POOL_MIN_CANDIDATES = min_candidates
+
+
+def test_compact_roster_folds_names():
+    roster = src.getPlayerRoster()
+    position = roster.ids.index(203999)
+
+    assert roster.full_names[position] == "Nikola Jokić"
+    assert roster.columns[src.nba_data.player_index_full_name][position] == "nikola jokic"
+    # Every copy of a name is the same string
+    first_names = roster.columns[src.nba_data.player_index_first_name]
+    assert first_names[position] is first_names[first_names.index("nikola")]
+
+    assert 203999 in src.getFuzzyPlayerIdsByName("nikola jokić")
+
+
+def test_getFuzzyPlayerIdsByName_name_tree_matches_scan():
+    use_name_tree = src.USE_NAME_TREE
+
+    for query in ["curyy", "keerilenko", "giannis", "lebrn", "jokich", "x"]:
+        for only_active in (False, True):
+            src.USE_NAME_TREE = False
+            try:
+                expected = src.getFuzzyPlayerIdsByName(query, only_active=only_active, only_return_best=True,
+                                                       return_ratio=True)
+            finally:
+                src.USE_NAME_TREE = use_name_tree
+
+            src.USE_NAME_TREE = True
+            try:
+                assert src.getFuzzyPlayerIdsByName(query, only_active=only_active, only_return_best=True,
+                                                   return_ratio=True) == expected
+            finally:
+                src.USE_NAME_TREE = use_name_tree
+
+
+def test_getFuzzyPlayerIdsByName_phonetic_index():
+    # A good match that sounds right answers the query without scoring the names that only look similar
+    assert src.getFuzzyPlayerIdsByName("Dramond Green") == {203110: "Draymond Green"}
+    assert src.getFuzzyPlayerIdsByName("nurkich") == {203994: "Jusuf Nurkić"}
+    assert src.getFuzzyTeamIdsByName("Los Angels Lakers") == {1610612747: "Los Angeles Lakers"}
+    assert src.getFuzzyTeamIdsByName("nicks") == {1610612752: "New York Knicks"}
+
+    # Sounding alike doesn't loosen the max distance
+    assert src.getFuzzyPlayerIdsByName("yannis") is None
+    # A phonetic hit that isn't a good match falls through to the scan, instead of hiding Bryant behind Kobe Brown
+    assert 977 in src.getFuzzyPlayerIdsByName("Kobe Bryan")
+
+    use_phonetic_index = src.USE_PHONETIC_INDEX
+    src.USE_PHONETIC_INDEX = False
+    try:
+        assert src.getFuzzyPlayerIdsByName("Dramond Green") == {201980: "Danny Green", 203110: "Draymond Green"}
+    finally:
+        src.USE_PHONETIC_INDEX = use_phonetic_index
+
+
+def test_getFuzzyPlayerIdsByName_max_results():
+    for query in TEST_PLAYER_QUERIES + ["john", "smith"]:
+        full = src.getFuzzyPlayerIdsByName(query)
+        top = src.getFuzzyPlayerIdsByName(query, max_results=5)
+
+        assert (top is None) == (full is None)
+        if full is not None:
+            assert len(top) == min(5, len(full))
+            assert top.items() <= full.items()
+
+        # Same top matches, ties included, as scoring everyone
+        player_query = src.getPlayerQuery(query, None, None)
+        for max_results in (1, 5):
+            expected = sorted(src.getPlayerMatchDistances(player_query, False, None),
+                              key=lambda match: (match[1], match[0]))[:max_results]
+            top = sorted(src.getPlayerMatchDistances(player_query, False, None, max_results),
+                         key=lambda match: (match[1], match[0]))[:max_results]
+
+            assert top == expected
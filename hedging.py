@@ -0,0 +1,103 @@
+import logging
+from collections import deque
+from typing import Deque, Dict, Optional
+
+# Bookkeeping for hedged requests: when a request hasn't been answered after about as long as most requests take, the
+# same request is sent a second time (through another proxy) and whichever answer comes back first is used. The delay
+# comes from a window of recent latencies, and a token bucket caps how many requests get hedged, so a slow period
+# can't double the load on stats.nba.com.
+
+# Recent latencies the hedge delay is taken from
+LATENCY_WINDOW = 200
+# Hedge requests that take longer than this percentile of recent requests
+HEDGE_PERCENTILE = 90
+# Delay used until there are enough latencies to take a percentile of
+DEFAULT_HEDGE_DELAY = 2.0
+MIN_LATENCY_SAMPLES = 20
+MIN_HEDGE_DELAY = 0.1
+# Fraction of requests that can be hedged in the long run
+HEDGE_BUDGET_RATIO = 0.1
+# Hedges that can be saved up, i.e. the size of a burst of hedges
+HEDGE_BUDGET_BURST = 5
+
+LOGGER = logging.getLogger(__name__)
+
+
+class LatencyWindow:
+    """
+    The most recent request latencies
+    """
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.latencies: Deque[float] = deque(maxlen=window)
+
+    def __len__(self):
+        return len(self.latencies)
+
+    def add(self, latency: float):
+        self.latencies.append(latency)
+
+    def get_percentile(self, percentile: float) -> Optional[float]:
+        '''
+        Gets a percentile of the latencies, by the nearest rank
+        :param percentile: between 0 and 100
+        :return: None if there are no latencies
+        '''
+        if len(self.latencies) < 1:
+            return None
+
+        ordered = sorted(self.latencies)
+
+        return ordered[min(int(len(ordered) * percentile / 100), len(ordered) - 1)]
+
+
+class HedgeBudget:
+    """
+    Token bucket limiting hedges to a fraction of requests. Every request adds ratio tokens, up to burst, and every
+    hedge spends one
+    """
+
+    def __init__(self, ratio: float = HEDGE_BUDGET_RATIO, burst: float = HEDGE_BUDGET_BURST):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = 0.0
+
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.denied = 0
+
+    def record_request(self):
+        self.requests += 1
+        self.tokens = min(self.tokens + self.ratio, self.burst)
+
+    def try_spend(self) -> bool:
+        if self.tokens < 1:
+            self.denied += 1
+            return False
+
+        self.tokens -= 1
+        self.hedges += 1
+
+        return True
+
+    def record_win(self):
+        # A hedge answered before the request it was hedging
+        self.hedge_wins += 1
+
+    def get_stats(self) -> Dict[str, float]:
+        return {'requests': self.requests, 'hedges': self.hedges, 'hedge_wins': self.hedge_wins,
+                'denied': self.denied, 'tokens': self.tokens}
+
+
+def get_hedge_delay(latencies: LatencyWindow, percentile: float = HEDGE_PERCENTILE) -> float:
+    '''
+    Gets how long to wait for a request before hedging it
+    :param latencies: recent latencies
+    :param percentile: between 0 and 100
+    :return: seconds
+    '''
+    if len(latencies) < MIN_LATENCY_SAMPLES:
+        return DEFAULT_HEDGE_DELAY
+
+    return max(latencies.get_percentile(percentile), MIN_HEDGE_DELAY)
@@ -0,0 +1,213 @@
+import csv
+import logging
+from typing import Callable, Dict, Iterable, List, Tuple
+
+import nba_api.stats.library.data as nba_data
+
+import static_registry
+from definitions import PLAYER_ALIASES_FILE, TEAM_ALIASES_FILE
+
+# Hash tables of nicknames and other informal names ("LBJ", "Greek Freak", "Sixers") that neither the name searches nor
+# fuzzy matching would ever find, checked before any of them.
+#
+# The built-in aliases below can be added to or overridden with CSV files in the conf folder, one "alias,id" per line
+# (lines starting with # are comments). Listing an alias more than once maps it to all of those ids, and any alias in
+# the file replaces the built-in one with the same name. Aliases are stored in static_registry.normalize_name's form,
+# so "T-Wolves", "twolves" and "TWOLVES" are all the same alias.
+#
+# Aliases take priority over real names, so a built-in alias that starts some other player's or team's name ("Shaq"
+# would hide Shaquille Harrison, "AD" every Adams) is skipped, and nicknames like that ("Steph", "Luka", "MJ") are left
+# out of the defaults. Aliases from the files are used as they are.
+
+DEFAULT_PLAYER_ALIASES: Dict[str, int] = {
+    "LBJ": 2544,
+    "King James": 2544,
+    "KD": 201142,
+    "Greek Freak": 203507,
+    "Chef Curry": 201939,
+    "The Brow": 203076,
+    "CP3": 101108,
+    "PG13": 202331,
+    "The Beard": 201935,
+    "Joker": 203999,
+    "Black Mamba": 977,
+    "The Mailman": 252,
+    "The Process": 203954,
+    "The Claw": 202695,
+    "D Wade": 2548,
+    "The Big Fundamental": 1495,
+    "The Answer": 947,
+    "Wemby": 1641705,
+    "Ant Man": 1630162,
+    "SGA": 1628983,
+    "Uncle Drew": 202681,
+    "The Dream": 165,
+}
+
+DEFAULT_TEAM_ALIASES: Dict[str, int] = {
+    "Sixers": 1610612755,
+    "Philly": 1610612755,
+    "Cavs": 1610612739,
+    "NOLA": 1610612740,
+    "Pels": 1610612740,
+    "Mavs": 1610612742,
+    "Wolves": 1610612750,
+    "T-Wolves": 1610612750,
+    "Dubs": 1610612744,
+    "Blazers": 1610612757,
+    "Rip City": 1610612757,
+    "Clips": 1610612746,
+    "Celts": 1610612738,
+    "Nugs": 1610612743,
+    "Grizz": 1610612763,
+    "Wiz": 1610612764,
+    "Raps": 1610612761,
+    "Sac": 1610612758,
+}
+
+# Normalized alias -> ids
+PLAYER_ALIASES: Dict[str, Tuple[int, ...]] = {}
+TEAM_ALIASES: Dict[str, Tuple[int, ...]] = {}
+
+# Called after every rebuild, e.g. to clear results looked up with the old aliases
+REBUILD_LISTENERS: List[Callable[[], None]] = []
+
+LOGGER = logging.getLogger(__name__)
+
+
+def read_alias_file(filename: str) -> List[Tuple[str, int]]:
+    '''
+    Reads an alias CSV file
+    :param filename:
+    :return: list of (alias, id), empty if the file doesn't exist
+    '''
+    aliases = []
+
+    try:
+        with open(filename, 'r', newline='', encoding='utf-8') as f:
+            for line_number, row in enumerate(csv.reader(f), 1):
+                if len(row) < 1 or row[0].strip() == "" or row[0].lstrip().startswith('#'):
+                    continue
+
+                try:
+                    aliases.append((row[0], int(row[1])))
+                except (IndexError, ValueError):
+                    LOGGER.warning(f"Skipping malformed alias on line {line_number} of {filename}: {row}")
+
+    except FileNotFoundError:
+        LOGGER.debug(f"No alias file at {filename}")
+
+    return aliases
+
+
+def compile_aliases(aliases: Iterable[Tuple[str, int]], known_ids: Dict[int, dict]) -> Dict[str, Tuple[int, ...]]:
+    '''
+    Builds an alias table, skipping ids that aren't in the registry
+    :param aliases: (alias, id) pairs
+    :param known_ids: the registry's id -> player or team dictionary
+    :return: normalized alias -> ids, in the order they were listed
+    '''
+    compiled: Dict[str, Dict[int, None]] = {}
+
+    for alias, alias_id in aliases:
+        normalized = static_registry.normalize_name(alias)
+
+        if normalized == "":
+            continue
+
+        if alias_id not in known_ids:
+            LOGGER.warning(f"Skipping alias {alias} for unknown id {alias_id}")
+            continue
+
+        # Dictionaries keep their order, so they double as ordered sets
+        compiled.setdefault(normalized, {})[alias_id] = None
+
+    return {normalized: tuple(ids) for normalized, ids in compiled.items()}
+
+
+def get_unshadowed_aliases(aliases: Dict[str, Tuple[int, ...]], normalized_names: List[str],
+                           name_ids: List[int]) -> Dict[str, Tuple[int, ...]]:
+    '''
+    Leaves out the aliases that start a word of someone else's name, since the alias would hide them from the name
+    searches
+    :param aliases: normalized alias -> ids
+    :param normalized_names: the registry's normalized full names
+    :param name_ids: the id for each name
+    :return: the aliases that don't shadow a name
+    '''
+    unshadowed = {}
+
+    for alias, alias_ids in aliases.items():
+        shadowed = [name for name, name_id in zip(normalized_names, name_ids)
+                    if name_id not in alias_ids and (name.startswith(alias) or f" {alias}" in name)]
+
+        if len(shadowed) > 0:
+            LOGGER.warning(f"Skipping built-in alias {alias}, it would hide {', '.join(shadowed[:3])}")
+        else:
+            unshadowed[alias] = alias_ids
+
+    return unshadowed
+
+
+def build_aliases(player_aliases_filename: str = PLAYER_ALIASES_FILE,
+                  team_aliases_filename: str = TEAM_ALIASES_FILE):
+    '''
+    (Re)builds the alias tables from the defaults and the alias files
+    :param player_aliases_filename:
+    :param team_aliases_filename:
+    :return:
+    '''
+    PLAYER_ALIASES.clear()
+    default_aliases = compile_aliases(DEFAULT_PLAYER_ALIASES.items(), static_registry.PLAYERS_BY_ID)
+    player_ids = [player[nba_data.player_index_id] for player in static_registry.PLAYERS]
+    PLAYER_ALIASES.update(get_unshadowed_aliases(default_aliases, static_registry.NORMALIZED_PLAYER_NAMES, player_ids))
+    PLAYER_ALIASES.update(compile_aliases(read_alias_file(player_aliases_filename), static_registry.PLAYERS_BY_ID))
+
+    TEAM_ALIASES.clear()
+    default_aliases = compile_aliases(DEFAULT_TEAM_ALIASES.items(), static_registry.TEAMS_BY_ID)
+    team_ids = [team[nba_data.team_index_id] for team in static_registry.TEAMS]
+    TEAM_ALIASES.update(get_unshadowed_aliases(default_aliases, static_registry.NORMALIZED_TEAM_NAMES, team_ids))
+    TEAM_ALIASES.update(compile_aliases(read_alias_file(team_aliases_filename), static_registry.TEAMS_BY_ID))
+
+    LOGGER.debug(f"Built {len(PLAYER_ALIASES)} player and {len(TEAM_ALIASES)} team aliases")
+
+    for listener in REBUILD_LISTENERS:
+        listener()
+
+
+def add_rebuild_listener(listener: Callable[[], None]):
+    '''
+    Registers a function to call after the alias tables are rebuilt
+    :param listener: function with no arguments
+    :return:
+    '''
+    REBUILD_LISTENERS.append(listener)
+
+
+def find_players_by_alias(normalized_name: str, only_active: bool = False) -> List[dict]:
+    '''
+    Looks a name up in the player alias table
+    :param normalized_name: in static_registry.normalize_name's form
+    :param only_active:
+    :return: list of player dictionaries, empty if the name isn't an alias
+    '''
+    players = [static_registry.PLAYERS_BY_ID[player_id] for player_id in PLAYER_ALIASES.get(normalized_name, ())]
+
+    if only_active:
+        return [player for player in players if player['is_active']]
+
+    return players
+
+
+def find_teams_by_alias(normalized_name: str) -> List[dict]:
+    '''
+    Looks a name up in the team alias table
+    :param normalized_name: in static_registry.normalize_name's form
+    :return: list of team dictionaries, empty if the name isn't an alias
+    '''
+    return [static_registry.TEAMS_BY_ID[team_id] for team_id in TEAM_ALIASES.get(normalized_name, ())]
+
+
+build_aliases()
+# Ids can disappear from the registry when it's reloaded
+static_registry.add_reload_listener(build_aliases)
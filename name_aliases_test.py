@@ -0,0 +1,32 @@
+import logging
+
+import name_aliases as src
+
+LOGGER = logging.getLogger(__name__)
+
+
+def test_build_aliases_file(tmp_path):
+    player_aliases = tmp_path / "player_aliases.csv"
+    player_aliases.write_text("# alias,id\nThe King,2544\nBron,2544\nBron,1628973\nnobody,1\nbroken\n")
+
+    try:
+        src.build_aliases(str(player_aliases), str(tmp_path / "missing.csv"))
+
+        # File aliases add to and override the defaults, unknown ids and malformed lines are skipped
+        assert src.PLAYER_ALIASES["the king"] == (2544,)
+        assert src.PLAYER_ALIASES["bron"] == (2544, 1628973)
+        assert src.PLAYER_ALIASES["lbj"] == (2544,)
+        assert "nobody" not in src.PLAYER_ALIASES
+        assert [team['id'] for team in src.find_teams_by_alias("cavs")] == [1610612739]
+    finally:
+        src.build_aliases()
+
+
+def test_get_unshadowed_aliases():
+    aliases = {"shaq": (406,), "lbj": (2544,), "the king": (2544,)}
+    names = ["shaquille o neal", "shaquille harrison", "lebron james", "bernard king"]
+
+    # Starting someone else's first or last name hides them, starting the player's own name doesn't
+    assert src.get_unshadowed_aliases(aliases, names, [406, 1627885, 2544, 77264]) == {"lbj": (2544,),
+                                                                                         "the king": (2544,)}
+    assert "shaq" not in src.PLAYER_ALIASES and "ad" not in src.PLAYER_ALIASES
@@ -0,0 +1,110 @@
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+# Character n-gram inverted index, used to cut the list of names that need to be fuzzy matched down to the few that
+# could possibly be close enough.
+#
+# Names are padded with NGRAM_SIZE - 1 characters on both sides, so a name of length L has L + NGRAM_SIZE - 1 n-grams.
+# One edit (insert, delete or substitute) can break at most NGRAM_SIZE of them, so two strings within k edits of each
+# other always share at least max(len_a, len_b) + NGRAM_SIZE - 1 - k * NGRAM_SIZE n-grams (the q-gram lemma). Any name
+# sharing fewer n-grams than that can be skipped without losing a match.
+
+NGRAM_SIZE = 3
+# Names never contain this, so padding n-grams only match other padding n-grams
+NGRAM_PADDING = '\x00'
+
+
+def get_ngrams(name: str, ngram_size: int = NGRAM_SIZE) -> Counter:
+    '''
+    Gets the padded n-grams of a string
+    :param name:
+    :param ngram_size:
+    :return: Counter of n-gram -> number of times it appears
+    '''
+    padding = NGRAM_PADDING * (ngram_size - 1)
+    padded = f"{padding}{name}{padding}"
+
+    return Counter(padded[i:i + ngram_size] for i in range(len(padded) - ngram_size + 1))
+
+
+def get_min_shared_ngrams(query_length: int, candidate_length: int, max_edits: int,
+                          ngram_size: int = NGRAM_SIZE) -> int:
+    '''
+    The fewest n-grams two strings within max_edits edits of each other can share (the q-gram lemma). A result of 0 or
+    less means the n-grams can't be used to rule anything out
+    :param query_length:
+    :param candidate_length:
+    :param max_edits:
+    :param ngram_size:
+    :return:
+    '''
+    return max(query_length, candidate_length) + ngram_size - 1 - max_edits * ngram_size
+
+
+class NGramIndex:
+    """
+    Inverted index from padded n-gram to the positions of the names containing it
+    """
+
+    def __init__(self, names: List[str], ngram_size: int = NGRAM_SIZE):
+        self.ngram_size = ngram_size
+        self.lengths: List[int] = [len(name) for name in names]
+
+        # n-gram -> list of (position, number of times the n-gram appears in that name)
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self.positions_by_length: Dict[int, List[int]] = defaultdict(list)
+
+        for position, name in enumerate(names):
+            for ngram, count in get_ngrams(name, ngram_size).items():
+                self.postings[ngram].append((position, count))
+
+            self.positions_by_length[len(name)].append(position)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def count_shared_ngrams(self, query: str) -> Dict[int, int]:
+        '''
+        Counts the n-grams each name shares with the query (names sharing none are left out)
+        :param query:
+        :return: dictionary of position -> number of shared n-grams
+        '''
+        shared = defaultdict(int)
+
+        for ngram, query_count in get_ngrams(query, self.ngram_size).items():
+            for position, count in self.postings.get(ngram, ()):
+                shared[position] += min(query_count, count)
+
+        return shared
+
+    def search(self, query: str, get_min_shared: Callable[[int], Optional[int]]) -> Set[int]:
+        '''
+        Finds every name that could be a match for the query
+        :param query:
+        :param get_min_shared: takes a name length and returns how many n-grams a name of that length must share with
+                               the query to be a possible match. Returns None if no name of that length can match, or
+                               0 or less if every name of that length could match
+        :return: set of positions of the candidate names
+        '''
+        candidates = set()
+        min_shared_by_length = {}
+
+        for length, positions in self.positions_by_length.items():
+            min_shared = get_min_shared(length)
+            min_shared_by_length[length] = min_shared
+
+            # The n-grams can't rule anything of this length out
+            if min_shared is not None and min_shared <= 0:
+                candidates.update(positions)
+
+        # Nothing left that the n-grams could rule out
+        if all(min_shared is None or min_shared <= 0 for min_shared in min_shared_by_length.values()):
+            return candidates
+
+        for position, shared in self.count_shared_ngrams(query).items():
+            min_shared = min_shared_by_length[self.lengths[position]]
+
+            if min_shared is not None and shared >= min_shared:
+                candidates.add(position)
+
+        return candidates
@@ -0,0 +1,241 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from time import time
+from typing import Dict, Optional, Tuple
+
+from nba_api.stats.library.parameters import Season
+
+from endpoint_cache import CacheKey
+
+# On-disk cache of raw stats.nba.com responses, so a restart doesn't have to fetch everything again. Responses are
+# stored zlib compressed in an SQLite database, indexed by the same keys as the in-memory cache, along with when they
+# expire. Expired responses are deleted by a compaction that runs every so often, which also deletes the oldest
+# responses if the database gets too big.
+#
+# SQLite calls block, so they all run on one background thread, which also means only one thread ever uses the
+# connection.
+
+SCHEMA_VERSION = 1
+# How long a stored response stays fresh in seconds, indexed by endpoint class name. Longer than the in-memory TTLs,
+# since the point is to not fetch everything again after a restart. Responses for a past season can't change anymore,
+# so they're kept until they're deleted to make room. Everything else can change (CommonPlayerInfo has the player's
+# current team, jersey and headline stats), so it expires
+DEFAULT_TTL = 6 * 60 * 60
+KEEP_FOREVER = float('inf')
+ENDPOINT_TTLS = {
+    'CommonPlayerInfo': 6 * 60 * 60,
+    'PlayerCareerStats': 6 * 60 * 60,
+    'TeamInfoCommon': 6 * 60 * 60,
+    'TeamYearByYearStats': 24 * 60 * 60,
+}
+# Request parameters that pick a season, in nba_api's "2019-20" form
+SEASON_PARAMETERS = ('Season', 'SeasonYear')
+COMPRESSION_LEVEL = 6
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# Seconds between compactions
+COMPACTION_INTERVAL = 60 * 60
+
+LOGGER = logging.getLogger(__name__)
+
+# (response body, status code, url, expiry time)
+PersistedResponse = Tuple[str, Optional[int], Optional[str], float]
+
+
+def get_stored_key(key: CacheKey) -> Tuple[str, str]:
+    endpoint_name, parameters = key
+
+    return endpoint_name, json.dumps(parameters)
+
+
+def log_compaction_error(compaction: asyncio.Future):
+    # Background compactions aren't awaited by anyone, so their errors are logged here
+    if not compaction.cancelled() and compaction.exception() is not None:
+        LOGGER.error("Error compacting the persistent cache", exc_info=compaction.exception())
+
+
+def is_past_season(season: str, current_season: str = Season.current_season) -> bool:
+    try:
+        return int(season[:4]) < int(current_season[:4])
+    except ValueError:
+        return False
+
+
+class PersistentEndpointCache:
+    """
+    SQLite store of compressed endpoint responses with expiry times
+    """
+
+    def __init__(self, filename: str, max_bytes: int = DEFAULT_MAX_BYTES,
+                 compaction_interval: float = COMPACTION_INTERVAL, default_ttl: float = DEFAULT_TTL,
+                 ttls: Optional[Dict[str, float]] = None):
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.compaction_interval = compaction_interval
+        self.default_ttl = default_ttl
+        self.ttls = dict(ENDPOINT_TTLS if ttls is None else ttls)
+
+        self._connection: Optional[sqlite3.Connection] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='persistent_cache')
+        self._compaction: Optional[asyncio.Future] = None
+        # The first write after starting compacts whatever expired while the bot was down
+        self.last_compaction = 0.0
+
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.writes = 0
+        self.compactions = 0
+
+    def get_ttl(self, key: CacheKey) -> float:
+        '''
+        Gets how long to keep a response
+        :param key: from endpoint_cache.get_cache_key
+        :return: seconds, KEEP_FOREVER for past seasons
+        '''
+        endpoint_name, parameters = key
+
+        if any(name in SEASON_PARAMETERS and is_past_season(value) for name, value in parameters):
+            return KEEP_FOREVER
+
+        return self.ttls.get(endpoint_name, self.default_ttl)
+
+    async def get(self, key: CacheKey) -> Optional[PersistedResponse]:
+        '''
+        Gets a stored response that hasn't expired
+        :param key: from endpoint_cache.get_cache_key
+        :return: None if there isn't one
+        '''
+        return await asyncio.get_event_loop().run_in_executor(self._executor, self.get_now, key)
+
+    async def put(self, key: CacheKey, contents: str, ttl: Optional[float] = None, status_code: Optional[int] = None,
+                  url: Optional[str] = None):
+        '''
+        Stores a response, and starts a compaction in the background if one is due
+        :param key: from endpoint_cache.get_cache_key
+        :param contents: the response body
+        :param ttl: seconds until it expires, defaults to get_ttl
+        :param status_code:
+        :param url:
+        :return:
+        '''
+        if ttl is None:
+            ttl = self.get_ttl(key)
+
+        await asyncio.get_event_loop().run_in_executor(self._executor, self.put_now, key, contents, ttl,
+                                                       status_code, url)
+
+        if time() - self.last_compaction >= self.compaction_interval and \
+                (self._compaction is None or self._compaction.done()):
+            self.last_compaction = time()
+            self._compaction = asyncio.get_event_loop().run_in_executor(self._executor, self.compact_now)
+            self._compaction.add_done_callback(log_compaction_error)
+
+    async def compact(self) -> int:
+        return await asyncio.get_event_loop().run_in_executor(self._executor, self.compact_now)
+
+    async def close(self):
+        # Runs after anything already queued on the executor, e.g. a background compaction
+        await asyncio.get_event_loop().run_in_executor(self._executor, self.close_now)
+
+    # The *_now methods block, and have to run on the executor's thread
+
+    def get_now(self, key: CacheKey) -> Optional[PersistedResponse]:
+        endpoint_name, parameters = get_stored_key(key)
+        row = self._connect().execute("SELECT contents, status_code, url, expires FROM responses "
+                                      "WHERE endpoint = ? AND parameters = ?", (endpoint_name, parameters)).fetchone()
+
+        if row is None:
+            self.misses += 1
+            return None
+
+        contents, status_code, url, expires = row
+
+        # Left for the next compaction to delete
+        if expires <= time():
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self.hits += 1
+
+        return zlib.decompress(contents).decode('utf-8'), status_code, url, expires
+
+    def put_now(self, key: CacheKey, contents: str, ttl: float, status_code: Optional[int] = None,
+                url: Optional[str] = None):
+        endpoint_name, parameters = get_stored_key(key)
+        compressed = zlib.compress(contents.encode('utf-8'), COMPRESSION_LEVEL)
+        now = time()
+
+        with self._connect() as connection:
+            connection.execute("INSERT OR REPLACE INTO responses "
+                               "(endpoint, parameters, contents, status_code, url, stored, expires) "
+                               "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                               (endpoint_name, parameters, compressed, status_code, url, now, now + ttl))
+
+        self.writes += 1
+
+    def compact_now(self) -> int:
+        '''
+        Deletes the expired responses, then the oldest ones until the database is under max_bytes, and shrinks the
+        file if anything was deleted
+        :return: the number of responses deleted
+        '''
+        connection = self._connect()
+
+        with connection:
+            deleted = connection.execute("DELETE FROM responses WHERE expires <= ?", (time(),)).rowcount
+
+            total_bytes = connection.execute("SELECT COALESCE(SUM(LENGTH(contents)), 0) FROM responses").fetchone()[0]
+            if total_bytes > self.max_bytes:
+                rows = connection.execute("SELECT rowid, LENGTH(contents) FROM responses ORDER BY stored").fetchall()
+                oldest = []
+
+                for rowid, size in rows:
+                    if total_bytes <= self.max_bytes:
+                        break
+                    oldest.append((rowid,))
+                    total_bytes -= size
+
+                connection.executemany("DELETE FROM responses WHERE rowid = ?", oldest)
+                deleted += len(oldest)
+
+        if deleted > 0:
+            connection.execute("VACUUM")
+
+        self.compactions += 1
+        LOGGER.debug(f"Compacted {self.filename}, deleted {deleted} responses")
+
+        return deleted
+
+    def close_now(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def get_stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses, 'expirations': self.expirations, 'writes': self.writes,
+                'compactions': self.compactions}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is not None:
+            return self._connection
+
+        connection = sqlite3.connect(self.filename)
+        connection.execute("PRAGMA journal_mode = WAL")
+
+        if connection.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            # Nothing in here can't be fetched again, so an old schema is just dropped
+            with connection:
+                connection.execute("DROP TABLE IF EXISTS responses")
+                connection.execute("CREATE TABLE responses (endpoint TEXT NOT NULL, parameters TEXT NOT NULL, "
+                                   "contents BLOB NOT NULL, status_code INTEGER, url TEXT, stored REAL NOT NULL, "
+                                   "expires REAL NOT NULL, PRIMARY KEY (endpoint, parameters))")
+                connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+        self._connection = connection
+
+        return connection
@@ -0,0 +1,87 @@
+import re
+from collections import defaultdict
+from typing import Dict, List, Sequence
+
+# Hash index from a Soundex style phonetic key to the positions of the names with that key, so sound-alike spellings
+# ("yannis", "jokich", "nurkich") can be found with a single lookup instead of scoring every name.
+#
+# Keys are Soundex without the 4 character limit, after a few rewrites for spellings that come up a lot in NBA names: a
+# leading "gi"/"ge" before a vowel sounds like "y" (Giannis), so does a leading "j" in Slavic names ending in "ic"
+# (Jokić, Jović), and "ph" sounds like "f". Every word of a name is keyed separately, so multi-word names get one key
+# per word, separated by spaces.
+
+SOUNDEX_CODES = {
+    **dict.fromkeys('bfpv', '1'),
+    **dict.fromkeys('cgjkqsxz', '2'),
+    **dict.fromkeys('dt', '3'),
+    'l': '4',
+    **dict.fromkeys('mn', '5'),
+    'r': '6',
+}
+
+# (pattern, replacement), applied in order to each lowercased word
+SPELLING_RULES = [
+    (re.compile(r'^(?:g[ie](?=[aeiou])|j(?=[a-z]*ich?$))'), 'y'),
+    (re.compile(r'ph'), 'f'),
+    # Soundex ignores h and w entirely, they don't even separate letters with the same code
+    (re.compile(r'[hw]'), ''),
+]
+
+NON_LETTERS = re.compile(r'[^a-z\s]')
+
+
+def get_word_key(word: str) -> str:
+    for pattern, replacement in SPELLING_RULES:
+        word = pattern.sub(replacement, word)
+
+    if word == "":
+        return ""
+
+    key = [word[0]]
+    last_code = SOUNDEX_CODES.get(word[0])
+
+    for letter in word[1:]:
+        code = SOUNDEX_CODES.get(letter)
+
+        # Vowels aren't coded, but letters with the same code on either side of one are both kept
+        if code is not None and code != last_code:
+            key.append(code)
+
+        last_code = code
+
+    return ''.join(key)
+
+
+def get_phonetic_key(name: str) -> str:
+    '''
+    Gets the phonetic key of a name, which should already be lowercased and accent-folded
+    :param name:
+    :return: the key, or an empty string if the name has no letters
+    '''
+    return ' '.join(filter(None, (get_word_key(word) for word in NON_LETTERS.sub('', name).split())))
+
+
+class PhoneticIndex:
+    """
+    Phonetic key -> positions of every name with that key
+    """
+
+    def __init__(self, names: Sequence[str]):
+        self.positions: Dict[str, List[int]] = defaultdict(list)
+
+        for position, name in enumerate(names):
+            key = get_phonetic_key(name)
+
+            if key != "":
+                self.positions[key].append(position)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def search(self, name: str) -> List[int]:
+        '''
+        Finds every name that sounds like the given name
+        :param name: lowercased and accent-folded
+        :return: list of positions, in order
+        '''
+        return self.positions.get(get_phonetic_key(name), [])
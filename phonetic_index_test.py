@@ -0,0 +1,14 @@
+import logging
+
+import phonetic_index as src
+
+LOGGER = logging.getLogger(__name__)
+
+
+def test_get_phonetic_key():
+    assert src.get_phonetic_key("giannis") == src.get_phonetic_key("yannis")
+    assert src.get_phonetic_key("jokic") == src.get_phonetic_key("jokich")
+    assert src.get_phonetic_key("jokic") == src.get_phonetic_key("yokich")
+    # Only Slavic names ending in "ic" get the "j" read as a "y"
+    assert src.get_phonetic_key("lebron james") == "l165 j52"
+    assert src.get_phonetic_key("'") == ""
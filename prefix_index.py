@@ -0,0 +1,222 @@
+import logging
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import chain
+from typing import Iterable, Iterator, List, Sequence, Set, Tuple
+
+import nba_api.stats.library.data as nba_data
+
+import static_registry
+
+# Sorted arrays of normalized names for prefix lookups (autocomplete, and the exact and prefix paths in functions).
+# Every player is indexed under their first, last and full names, and every team under its full name, city, nickname
+# and abbreviation, all in static_registry.normalize_name's form. Keys sharing a prefix sit next to each other once
+# sorted, so finding them is two binary searches, and taking the first N is a slice.
+#
+# Active and inactive players are kept in separate indexes, so active players can be listed first without ranking every
+# player that matches a short prefix.
+
+PLAYER_KEY_INDEXES = (nba_data.player_index_first_name, nba_data.player_index_last_name,
+                      nba_data.player_index_full_name)
+TEAM_KEY_INDEXES = (nba_data.team_index_full_name, nba_data.team_index_city, nba_data.team_index_nickname,
+                    nba_data.team_index_abbreviation)
+
+# Discord allows at most 25 autocomplete choices
+DEFAULT_COMPLETION_LIMIT = 25
+
+# Sorts after every character a normalized name can contain
+MAX_CHARACTER = '\U0010ffff'
+
+LOGGER = logging.getLogger(__name__)
+
+
+class PrefixIndex:
+    """
+    Sorted (key, position) pairs, so every key starting with a prefix is in one contiguous range
+    """
+
+    def __init__(self, keyed_positions: Iterable[Tuple[str, int]]):
+        entries = sorted(set(keyed_positions))
+
+        self.keys: List[str] = [key for key, position in entries]
+        self.positions = array('l', (position for key, position in entries))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def get_range(self, prefix: str) -> Tuple[int, int]:
+        return bisect_left(self.keys, prefix), bisect_left(self.keys, prefix + MAX_CHARACTER)
+
+    def search(self, prefix: str) -> Iterator[int]:
+        '''
+        Finds every position with a key starting with the prefix
+        :param prefix: normalized
+        :return: the positions, in key order, each only once
+        '''
+        seen: Set[int] = set()
+        start, end = self.get_range(prefix)
+
+        for position in self.positions[start:end]:
+            if position not in seen:
+                seen.add(position)
+                yield position
+
+    def search_exact(self, key: str) -> List[int]:
+        start = bisect_left(self.keys, key)
+        end = bisect_right(self.keys, key, start)
+
+        return sorted(set(self.positions[start:end]))
+
+
+ACTIVE_PLAYER_INDEX = PrefixIndex([])
+INACTIVE_PLAYER_INDEX = PrefixIndex([])
+# Only indexes full names, for exact matches
+PLAYER_FULL_NAME_INDEX = PrefixIndex([])
+TEAM_INDEX = PrefixIndex([])
+TEAM_FULL_NAME_INDEX = PrefixIndex([])
+
+
+def get_keyed_positions(rows: Sequence[list], positions: Iterable[int], name_indexes: Iterable[int]) \
+        -> Iterator[Tuple[str, int]]:
+    for position in positions:
+        for name_index in name_indexes:
+            key = static_registry.normalize_name(rows[position][name_index])
+
+            if key != "":
+                yield key, position
+
+
+def build_prefix_indexes():
+    '''
+    (Re)builds the prefix indexes from static_registry. Positions are positions in static_registry.PLAYERS and TEAMS
+    :return:
+    '''
+    global ACTIVE_PLAYER_INDEX, INACTIVE_PLAYER_INDEX, PLAYER_FULL_NAME_INDEX, TEAM_INDEX, TEAM_FULL_NAME_INDEX
+
+    players = static_registry.PLAYERS
+    teams = static_registry.TEAMS
+    active = [position for position, player in enumerate(players) if player[nba_data.player_index_is_active]]
+    inactive = [position for position, player in enumerate(players) if not player[nba_data.player_index_is_active]]
+
+    ACTIVE_PLAYER_INDEX = PrefixIndex(get_keyed_positions(players, active, PLAYER_KEY_INDEXES))
+    INACTIVE_PLAYER_INDEX = PrefixIndex(get_keyed_positions(players, inactive, PLAYER_KEY_INDEXES))
+    PLAYER_FULL_NAME_INDEX = PrefixIndex(enumerate_keys(static_registry.NORMALIZED_PLAYER_NAMES))
+    TEAM_INDEX = PrefixIndex(get_keyed_positions(teams, range(len(teams)), TEAM_KEY_INDEXES))
+    TEAM_FULL_NAME_INDEX = PrefixIndex(enumerate_keys(static_registry.NORMALIZED_TEAM_NAMES))
+
+    LOGGER.debug(f"Built prefix indexes with {len(ACTIVE_PLAYER_INDEX) + len(INACTIVE_PLAYER_INDEX)} player and "
+                 f"{len(TEAM_INDEX)} team keys")
+
+
+def enumerate_keys(names: Sequence[str]) -> Iterator[Tuple[str, int]]:
+    return ((name, position) for position, name in enumerate(names) if name != "")
+
+
+def complete_player_names(prefix: str, limit: int = DEFAULT_COMPLETION_LIMIT, only_active: bool = False,
+                          active_first: bool = True) -> List[Tuple[int, str]]:
+    '''
+    Autocompletes a player name
+    :param prefix: what the user has typed so far, in any case, with or without accents and punctuation
+    :param limit: the most completions to return
+    :param only_active: only complete active players' names
+    :param active_first: list every active player before any inactive one, otherwise go by the matched name alone
+    :return: list of (player id, full name)
+    '''
+    normalized = static_registry.normalize_name(prefix)
+
+    if normalized == "" or limit < 1:
+        return []
+
+    if only_active:
+        positions = ACTIVE_PLAYER_INDEX.search(normalized)
+    elif active_first:
+        positions = chain(ACTIVE_PLAYER_INDEX.search(normalized), INACTIVE_PLAYER_INDEX.search(normalized))
+    else:
+        positions = merge_searches(normalized, ACTIVE_PLAYER_INDEX, INACTIVE_PLAYER_INDEX)
+
+    completions = []
+    for position in positions:
+        player = static_registry.PLAYERS[position]
+        completions.append((player[nba_data.player_index_id], player[nba_data.player_index_full_name]))
+
+        if len(completions) == limit:
+            break
+
+    return completions
+
+
+def merge_searches(prefix: str, *indexes: PrefixIndex) -> Iterator[int]:
+    # Players matching under several names are listed at the first one
+    ranges = [index.get_range(prefix) for index in indexes]
+    entries = sorted(chain.from_iterable(zip(index.keys[start:end], index.positions[start:end])
+                                         for index, (start, end) in zip(indexes, ranges)))
+    seen: Set[int] = set()
+
+    for key, position in entries:
+        if position not in seen:
+            seen.add(position)
+            yield position
+
+
+def complete_team_names(prefix: str, limit: int = DEFAULT_COMPLETION_LIMIT) -> List[Tuple[int, str]]:
+    '''
+    Autocompletes a team name, matching the start of its full name, city, nickname or abbreviation
+    :param prefix: what the user has typed so far
+    :param limit: the most completions to return
+    :return: list of (team id, full name)
+    '''
+    normalized = static_registry.normalize_name(prefix)
+
+    if normalized == "" or limit < 1:
+        return []
+
+    completions = []
+    for position in TEAM_INDEX.search(normalized):
+        team = static_registry.TEAMS[position]
+        completions.append((team[nba_data.team_index_id], team[nba_data.team_index_full_name]))
+
+        if len(completions) == limit:
+            break
+
+    return completions
+
+
+def find_players_by_prefix(normalized_name: str, only_active: bool = False) -> List[dict]:
+    '''
+    Finds the players whose full name is the given name or, failing that, whose first, last or full name starts with it
+    :param normalized_name: in static_registry.normalize_name's form
+    :param only_active:
+    :return: list of player dictionaries, in nba_api's order
+    '''
+    positions = PLAYER_FULL_NAME_INDEX.search_exact(normalized_name)
+
+    if only_active:
+        positions = [position for position in positions
+                     if static_registry.PLAYERS[position][nba_data.player_index_is_active]]
+
+    if len(positions) < 1:
+        indexes = [ACTIVE_PLAYER_INDEX] if only_active else [ACTIVE_PLAYER_INDEX, INACTIVE_PLAYER_INDEX]
+        positions = sorted(chain.from_iterable(index.search(normalized_name) for index in indexes))
+
+    return [static_registry.PLAYERS_BY_ID[static_registry.PLAYERS[position][nba_data.player_index_id]]
+            for position in positions]
+
+
+def find_teams_by_prefix(normalized_name: str) -> List[dict]:
+    '''
+    Finds the teams whose full name is the given name or, failing that, whose full name, city, nickname or abbreviation
+    starts with it
+    :param normalized_name: in static_registry.normalize_name's form
+    :return: list of team dictionaries, in nba_api's order
+    '''
+    positions = TEAM_FULL_NAME_INDEX.search_exact(normalized_name)
+
+    if len(positions) < 1:
+        positions = sorted(TEAM_INDEX.search(normalized_name))
+
+    return [static_registry.TEAMS_BY_ID[static_registry.TEAMS[position][nba_data.team_index_id]]
+            for position in positions]
+
+
+build_prefix_indexes()
+static_registry.add_reload_listener(build_prefix_indexes)
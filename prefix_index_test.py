@@ -0,0 +1,29 @@
+import logging
+
+import prefix_index as src
+
+LOGGER = logging.getLogger(__name__)
+
+
+def test_complete_names():
+    completions = src.complete_player_names("LeBr", limit=5)
+    assert completions[0] == (2544, "LeBron James")
+    assert len(completions) <= 5
+
+    # Active players come first, and every completion starts a first, last or full name
+    completions = src.complete_player_names("jo", limit=200)
+    is_active = [src.static_registry.PLAYERS_BY_ID[player_id]['is_active'] for player_id, name in completions]
+    assert is_active == sorted(is_active, reverse=True)
+    assert len(completions) == len(set(completions)) == 200
+
+    assert src.complete_player_names("jokić") == [(203999, "Nikola Jokić")]
+    assert src.complete_team_names("lak") == [(1610612747, "Los Angeles Lakers")]
+    assert src.complete_team_names("") == []
+
+
+def test_find_by_prefix():
+    # Exact full names win over longer names starting with them
+    assert [player['id'] for player in src.find_players_by_prefix("nikola jokic")] == [203999]
+    assert len(src.find_players_by_prefix("anthony")) > 1
+    assert src.find_players_by_prefix("qqqqqq") == []
+    assert [team['abbreviation'] for team in src.find_teams_by_prefix("los angeles")] == ["LAC", "LAL"]
@@ -1,23 +1,102 @@
 import asyncio
 import json
-import random
+import sqlite3
+import threading
 from asyncio import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
 from json import JSONDecodeError
 from time import time
-from typing import Set
+from typing import Set, Optional, Dict, Iterable, Callable, Awaitable
 import logging
+
+import aiohttp
 from proxybroker import Broker
 from requests.exceptions import ReadTimeout, ProxyError, SSLError, ConnectTimeout, ConnectionError
 from nba_api.stats.endpoints.commonplayerinfo import CommonPlayerInfo
 
-from definitions import GOOD_PROXIES_FILE, BAD_PROXIES_FILE, BLOCKED_PROXIES_FILE
-
-GOOD_PROXIES = set()
+import async_transport
+import hedging
+import routing
+from endpoint_cache import EndpointCache, get_cache_key, TRANSPORT_KWARGS
+from persistent_cache import PersistentEndpointCache
+from proxy_pool import ProxyPool
+from proxy_store import ProxyStateStore
+from singleflight import SingleFlight
+from definitions import GOOD_PROXIES_FILE, BAD_PROXIES_FILE, BLOCKED_PROXIES_FILE, PROXY_STATE_FILE, \
+    ENDPOINT_CACHE_FILE
+
+# Good proxies are picked by how fast and reliable they've been, see proxy_pool
+GOOD_PROXIES = ProxyPool()
 BAD_PROXIES = set()
 BLOCKED_PROXIES = set()
-DIRECT_CONNECT_ALLOWED = None
 LOGGER = logging.getLogger(__name__)
 
+# nba_api endpoints make blocking requests calls, so by default they're run in a thread pool
+# to keep them from freezing the event loop (and the discord heartbeat)
+USE_ENDPOINT_EXECUTOR = True
+ENDPOINT_EXECUTOR_POOL_SIZE = 8
+ENDPOINT_EXECUTOR: Optional[ThreadPoolExecutor] = None
+ENDPOINT_EXECUTOR_STATS = {'queued': 0, 'in_flight': 0, 'completed': 0, 'failed': 0}
+_ENDPOINT_EXECUTOR_LOCK = threading.Lock()
+
+# Use async_transport's pooled aiohttp sessions instead of nba_api's requests calls
+USE_ASYNC_TRANSPORT = False
+
+# Responses are cached in memory so repeated lookups of the same player/team don't hit stats.nba.com
+USE_RESPONSE_CACHE = True
+RESPONSE_CACHE = EndpointCache()
+
+# Responses are also kept on disk, so they survive a restart. Checked after RESPONSE_CACHE, with longer TTLs of its own
+USE_PERSISTENT_CACHE = True
+PERSISTENT_CACHE = PersistentEndpointCache(ENDPOINT_CACHE_FILE)
+# Responses being written to PERSISTENT_CACHE in the background
+PERSIST_TASKS: Set[asyncio.Future] = set()
+
+# Identical requests made while one is already running wait on that request instead of making their own
+USE_SINGLE_FLIGHT = True
+ENDPOINT_FLIGHTS = SingleFlight()
+
+# Errors that mean a proxy should no longer be trusted
+PROXY_ERRORS = (ReadTimeout, ProxyError, ConnectTimeout, SSLError, ConnectionError, JSONDecodeError) + \
+               async_transport.TRANSPORT_ERRORS
+
+# Candidate proxies are probed concurrently, this many at a time
+PROXY_VALIDATION_CONCURRENCY = 10
+PROXY_PROBE_CONNECT_TIMEOUT = 3
+PROXY_PROBE_READ_TIMEOUT = 5
+# Limit on a whole probe, in case a response trickles in slowly enough to never trip the read timeout
+PROXY_PROBE_TIMEOUT = 10
+PROXY_PROBE_ENDPOINT = CommonPlayerInfo
+
+# Probe errors that mean stats.nba.com is probably blocking the proxy, rather than the proxy not working.
+# stats.nba.com stops responding to blocked IPs, or sometimes just sends an empty JSON response
+PROBE_BLOCKED_ERRORS = (ReadTimeout, JSONDecodeError) + async_transport.READ_TIMEOUT_ERRORS
+
+# The proxy supervisor health checks good proxies in the background, so dead proxies are found before a user request
+# goes through them, and finds more proxies before the pool runs dry
+PROXY_HEALTH_CHECK_INTERVAL = 60
+# Proxies that have had a request in this many seconds don't need a health check
+PROXY_HEALTH_CHECK_IDLE_TIME = 2 * 60
+# Start looking for more proxies once fewer than this many can be used
+PROXY_LOW_WATER_MARK = 3
+PROXY_SUPERVISOR: Optional[asyncio.Task] = None
+
+# Searches for more proxies, shared by everyone who runs out at the same time
+PROXY_FLIGHTS = SingleFlight()
+
+# Opt in to hedging requests through proxies: a request that's slower than HEDGE_PERCENTILE of recent requests is also
+# sent through a second proxy, and whichever answers first wins. HEDGE_BUDGET caps the share of requests hedged
+USE_HEDGED_REQUESTS = False
+HEDGE_PERCENTILE = hedging.HEDGE_PERCENTILE
+PROXY_LATENCIES = hedging.LatencyWindow()
+HEDGE_BUDGET = hedging.HedgeBudget()
+
+# Chooses between calling stats.nba.com directly and through a proxy, for each request
+ROUTER = routing.Router()
+
+# The proxy lists and the good proxies' stats are saved here, a few seconds after they change
+PROXY_STATE = ProxyStateStore(PROXY_STATE_FILE)
+
 
 def load_proxies_from_file(good_proxies_filename: str = None,
                            bad_proxies_filename: str = None,
@@ -94,6 +173,30 @@ async def process_grabbed_proxies(grabbed_proxies: asyncio.Queue, proxies_to_tes
                 proxies_to_test.add(proxy_url)
 
 
+def load_proxy_state() -> bool:
+    '''
+    Loads the proxy lists and the good proxies' stats from PROXY_STATE_FILE
+    :return: whether or not there was a state file to load
+    '''
+    return PROXY_STATE.load(GOOD_PROXIES, BAD_PROXIES, BLOCKED_PROXIES)
+
+
+def load_saved_proxies(good_proxies_filename: str = GOOD_PROXIES_FILE,
+                       bad_proxies_filename: str = BAD_PROXIES_FILE,
+                       blocked_proxies_filename: str = BLOCKED_PROXIES_FILE):
+    if not load_proxy_state():
+        # Fall back to the plain lists saved before there was a state file
+        try:
+            load_proxies_from_file(good_proxies_filename, bad_proxies_filename, blocked_proxies_filename)
+        except FileNotFoundError:
+            pass
+
+
+def request_proxy_state_save():
+    # Saves the proxy lists a few seconds from now, along with anything else that changes before then
+    PROXY_STATE.request_save(GOOD_PROXIES, BAD_PROXIES, BLOCKED_PROXIES)
+
+
 async def populate_good_proxies(good_proxies_filename: str = GOOD_PROXIES_FILE,
                           bad_proxies_filename: str = BAD_PROXIES_FILE,
                           blocked_proxies_filename: str = BLOCKED_PROXIES_FILE,
@@ -104,10 +207,7 @@ async def populate_good_proxies(good_proxies_filename: str = GOOD_PROXIES_FILE,
                           proxy_test_batch_size: int = 10,
                           player_id_to_test=2544):
     if load_from_file:
-        try:
-            load_proxies_from_file(good_proxies_filename, bad_proxies_filename, blocked_proxies_filename)
-        except FileNotFoundError:
-            pass
+        load_saved_proxies(good_proxies_filename, bad_proxies_filename, blocked_proxies_filename)
 
     proxies_to_test = set()
     grabbed_proxies = asyncio.Queue()
@@ -115,7 +215,7 @@ async def populate_good_proxies(good_proxies_filename: str = GOOD_PROXIES_FILE,
 
     broker_task = asyncio.create_task(broker.find(types=['HTTPS']))
 
-    while len(GOOD_PROXIES) < min_good_proxies:
+    while GOOD_PROXIES.count_available() < min_good_proxies:
         proxy_processor = process_grabbed_proxies(grabbed_proxies, proxies_to_test,
                                                        min_proxies=proxy_test_batch_size)
 
@@ -144,59 +244,333 @@ async def populate_good_proxies(good_proxies_filename: str = GOOD_PROXIES_FILE,
         else:
             LOGGER.debug(f"testing {len(proxies_to_test)} proxies")
 
-            #Lock the set so we can access it safely
-            for proxy_url in list(proxies_to_test):
+            await validate_proxies(proxies_to_test, min_good_proxies, player_id_to_test=player_id_to_test)
+            proxies_to_test.clear()
 
-                try:
-                    start = time()
-                    CommonPlayerInfo(player_id=player_id_to_test, proxy=proxy_url, timeout=5).get_normalized_dict()
-                    end = time()
+            if save_to_file:
+                request_proxy_state_save()
 
-                    LOGGER.debug(f"proxy connection from {proxy_url} succeeded in {round(end - start, 4)} seconds")
-                    GOOD_PROXIES.add(proxy_url)
+    broker_task.cancel()
 
-                except ReadTimeout:
-                    # We don't know 100% that the proxy is actually blocked,
-                    # but this is pretty much the only indication we have
-                    LOGGER.debug("stats.nba.com timed out (Probably blocked)")
-                    BLOCKED_PROXIES.add(proxy_url)
+    LOGGER.debug(f"Now have {len(GOOD_PROXIES)} good proxies")
 
-                except (ProxyError, ConnectTimeout, SSLError, ConnectionError) as e:
-                    LOGGER.debug(f"proxy connection from {proxy_url} failed with error {e}")
-                    BAD_PROXIES.add(proxy_url)
+    return
 
-                except JSONDecodeError as e:
-                    # The NBA sometimes responds if the IP is blocked, but just
-                    # sends an empty JSON response. If that happens, add it to
-                    # the blocked list
-                    LOGGER.debug(f"stats.nba.com returned an empty JSON response (blocked)")
-                    BLOCKED_PROXIES.add(proxy_url)
 
-                # Give control back to the main event loop so we can still hit the heartbeat
-                LOGGER.debug("Giving control back to main loop")
-                await asyncio.sleep(0)
+async def probe_proxy(proxy_url: str, player_id_to_test: int = 2544):
+    '''
+    Makes one request to stats.nba.com through a proxy, on the event loop instead of a thread. Raises if the request
+    fails
+    :param proxy_url:
+    :param player_id_to_test:
+    :return:
+    '''
+    timeout = aiohttp.ClientTimeout(sock_connect=PROXY_PROBE_CONNECT_TIMEOUT, sock_read=PROXY_PROBE_READ_TIMEOUT)
 
-                if save_to_file:
-                    LOGGER.debug("Saving to file")
-                    save_proxies_to_file(good_proxies_filename, bad_proxies_filename, blocked_proxies_filename)
+    try:
+        await async_transport.fetch_endpoint(PROXY_PROBE_ENDPOINT, proxy=proxy_url, timeout=timeout,
+                                             player_id=player_id_to_test)
+    except BaseException:
+        # Don't keep a connection pool open for a proxy that isn't going to be used
+        async_transport.discard_session(proxy_url)
+        raise
 
-    broker_task.cancel()
 
-    LOGGER.debug(f"Now have {len(GOOD_PROXIES)} good proxies")
+async def validate_proxies(proxy_urls: Iterable[str], min_good_proxies: int,
+                           concurrency: int = None, probe_timeout: float = None, player_id_to_test: int = 2544,
+                           probe: Callable[[str, int], Awaitable] = None) -> int:
+    '''
+    Probes candidate proxies concurrently, sorting them into GOOD_PROXIES, BAD_PROXIES and BLOCKED_PROXIES. Returns as
+    soon as there are min_good_proxies good proxies, and cancels the probes that are still running
+    :param proxy_urls: candidates to probe
+    :param min_good_proxies: stop once GOOD_PROXIES has this many proxies
+    :param concurrency: the most probes to run at the same time, defaults to PROXY_VALIDATION_CONCURRENCY
+    :param probe_timeout: seconds allowed for each probe, defaults to PROXY_PROBE_TIMEOUT
+    :param player_id_to_test:
+    :param probe: coroutine function making the probe request, defaults to probe_proxy
+    :return: the number of candidates that were probed to completion
+    '''
+    semaphore = asyncio.Semaphore(PROXY_VALIDATION_CONCURRENCY if concurrency is None else concurrency)
+    probe_timeout = PROXY_PROBE_TIMEOUT if probe_timeout is None else probe_timeout
+    probe = probe_proxy if probe is None else probe
 
-    return
+    async def probe_candidate(proxy_url: str):
+        async with semaphore:
+            # Another probe may have already found enough good proxies while this one was waiting its turn
+            if GOOD_PROXIES.count_available() >= min_good_proxies:
+                return
+
+            start = time()
+            try:
+                await asyncio.wait_for(probe(proxy_url, player_id_to_test), probe_timeout)
+
+                LOGGER.debug(f"proxy connection from {proxy_url} succeeded in {round(time() - start, 4)} seconds")
+                GOOD_PROXIES.add(proxy_url)
+                # The probe is the first latency sample the proxy gets
+                GOOD_PROXIES.record(proxy_url, True, time() - start)
+
+            except PROBE_BLOCKED_ERRORS as e:
+                # We don't know 100% that the proxy is actually blocked,
+                # but this is pretty much the only indication we have
+                LOGGER.debug(f"stats.nba.com didn't respond through {proxy_url} (Probably blocked): {e!r}")
+                BLOCKED_PROXIES.add(proxy_url)
+
+            except PROXY_ERRORS + (ValueError, KeyError) as e:
+                LOGGER.debug(f"proxy connection from {proxy_url} failed with error {e!r}")
+                BAD_PROXIES.add(proxy_url)
+
+    tasks = [asyncio.ensure_future(probe_candidate(proxy_url)) for proxy_url in proxy_urls]
+    pending = set(tasks)
+
+    try:
+        while len(pending) > 0 and GOOD_PROXIES.count_available() < min_good_proxies:
+            done, pending = await asyncio.wait(pending, return_when=FIRST_COMPLETED)
+
+    finally:
+        for task in pending:
+            task.cancel()
 
-async def get_random_good_proxy() -> str:
-        while True:
+        if len(pending) > 0:
+            LOGGER.debug(f"Cancelling {len(pending)} proxy probes, have {len(GOOD_PROXIES)} good proxies")
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    return len(tasks) - len(pending)
+
+
+async def get_good_proxy() -> str:
+    '''
+    Picks a good proxy, favoring the ones that have been fastest and most reliable. Finds more if there are none
+    :return: the proxy url
+    '''
+    while True:
+        proxy_url = GOOD_PROXIES.choose()
+
+        if proxy_url is not None:
+            return proxy_url
+
+        LOGGER.debug("Tried to get a good proxy but there were none.")
+
+        # Callers that run out at the same time all wait on the same search
+        await PROXY_FLIGHTS.do('populate', populate_good_proxies)
+
+
+async def check_proxy_health(probe: Callable[[str, int], Awaitable] = None, probe_timeout: float = None,
+                             idle_time: float = None, player_id_to_test: int = 2544) -> int:
+    '''
+    Health checks the good proxies that are idle or have a half-open breaker, concurrently. Proxies whose breaker
+    keeps opening are moved to BAD_PROXIES
+    :param probe: coroutine function making the probe request, defaults to probe_proxy
+    :param probe_timeout: seconds allowed for each probe, defaults to PROXY_PROBE_TIMEOUT
+    :param idle_time: seconds without a request before a proxy is checked, defaults to PROXY_HEALTH_CHECK_IDLE_TIME
+    :param player_id_to_test:
+    :return: the number of proxies checked
+    '''
+    semaphore = asyncio.Semaphore(PROXY_VALIDATION_CONCURRENCY)
+    probe = probe_proxy if probe is None else probe
+    probe_timeout = PROXY_PROBE_TIMEOUT if probe_timeout is None else probe_timeout
+    proxy_urls = GOOD_PROXIES.get_proxies_to_check(PROXY_HEALTH_CHECK_IDLE_TIME if idle_time is None else idle_time)
+
+    async def check_proxy(proxy_url: str):
+        async with semaphore:
+            start = time()
             try:
-                return random.choice(tuple(GOOD_PROXIES))
-            except IndexError:
-                LOGGER.debug("Tried to get a good proxy but there were none.")
+                await asyncio.wait_for(probe(proxy_url, player_id_to_test), probe_timeout)
+                GOOD_PROXIES.record(proxy_url, True, time() - start)
+
+            except PROXY_ERRORS + (ValueError, KeyError) as e:
+                LOGGER.debug(f"Health check of proxy {proxy_url} failed with error {e!r}")
+                GOOD_PROXIES.record(proxy_url, False)
+
+    await asyncio.gather(*[check_proxy(proxy_url) for proxy_url in proxy_urls])
+
+    for proxy_url in GOOD_PROXIES.get_exhausted():
+        LOGGER.debug(f"Proxy {proxy_url} kept failing its health checks, moving it to the bad proxies")
+        GOOD_PROXIES.discard(proxy_url)
+        BAD_PROXIES.add(proxy_url)
+
+    return len(proxy_urls)
+
+
+async def supervise_proxies(interval: float = None, low_water_mark: int = None, **health_check_kwargs):
+    '''
+    Runs forever, health checking the good proxies every interval seconds, probing the direct route when it's due, and
+    finding more proxies whenever the direct route is down and fewer than low_water_mark proxies can be used
+    :param interval: defaults to PROXY_HEALTH_CHECK_INTERVAL
+    :param low_water_mark: defaults to PROXY_LOW_WATER_MARK
+    :param health_check_kwargs: arguments for check_proxy_health
+    :return:
+    '''
+    interval = PROXY_HEALTH_CHECK_INTERVAL if interval is None else interval
+    low_water_mark = PROXY_LOW_WATER_MARK if low_water_mark is None else low_water_mark
+
+    while True:
+        try:
+            checked = await check_proxy_health(**health_check_kwargs)
+            LOGGER.debug(f"Health checked {checked} proxies, {GOOD_PROXIES.count_available()} of "
+                         f"{len(GOOD_PROXIES)} good proxies can be used")
+
+            # Also saves the stats the requests since the last round have added
+            request_proxy_state_save()
+
+            if ROUTER.needs_direct_probe():
+                await PROXY_FLIGHTS.do('probe_direct', probe_direct_route)
+
+            # Proxies are only needed while the direct route is down
+            if not ROUTER.direct.healthy and GOOD_PROXIES.count_available() < low_water_mark:
+                LOGGER.debug(f"Fewer than {low_water_mark} proxies can be used, finding more")
+                await PROXY_FLIGHTS.do('populate', populate_good_proxies, min_good_proxies=low_water_mark)
+
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Keep supervising whatever went wrong
+            LOGGER.exception("Proxy supervisor error")
+
+        await asyncio.sleep(interval)
+
+
+def start_proxy_supervisor(**kwargs) -> asyncio.Task:
+    '''
+    Starts supervise_proxies in the background, unless it's already running
+    :param kwargs: arguments for supervise_proxies
+    :return: the supervisor task
+    '''
+    global PROXY_SUPERVISOR
+
+    if PROXY_SUPERVISOR is None or PROXY_SUPERVISOR.done():
+        PROXY_SUPERVISOR = asyncio.ensure_future(supervise_proxies(**kwargs))
+
+    return PROXY_SUPERVISOR
+
+
+def stop_proxy_supervisor():
+    global PROXY_SUPERVISOR
+
+    if PROXY_SUPERVISOR is not None:
+        PROXY_SUPERVISOR.cancel()
+        PROXY_SUPERVISOR = None
+
+
+async def shutdown():
+    '''
+    Stops the background work and writes out anything that's still waiting to be saved, for when the bot is closing
+    :return:
+    '''
+    stop_proxy_supervisor()
+    await wait_for_persist_tasks()
+    await PERSISTENT_CACHE.close()
+    await PROXY_STATE.flush()
+    await async_transport.close_sessions()
+
+
+def configure_endpoint_executor(pool_size: Optional[int] = None, enabled: Optional[bool] = None):
+    '''
+    Changes how endpoint calls are run. Any calls already submitted to the old pool are allowed to finish
+    :param pool_size: the maximum number of endpoint calls that can run at the same time
+    :param enabled: whether or not endpoints are called in the thread pool instead of directly on the event loop
+    :return:
+    '''
+    global ENDPOINT_EXECUTOR, ENDPOINT_EXECUTOR_POOL_SIZE, USE_ENDPOINT_EXECUTOR
+
+    if enabled is not None:
+        USE_ENDPOINT_EXECUTOR = enabled
+
+    if pool_size is not None and pool_size != ENDPOINT_EXECUTOR_POOL_SIZE:
+        if pool_size < 1:
+            raise ValueError(f"Endpoint executor pool size must be at least 1, got {pool_size}")
+
+        ENDPOINT_EXECUTOR_POOL_SIZE = pool_size
+
+        # The next call will create a pool with the new size
+        if ENDPOINT_EXECUTOR is not None:
+            ENDPOINT_EXECUTOR.shutdown(wait=False)
+            ENDPOINT_EXECUTOR = None
+
+
+def set_async_transport(enabled: bool):
+    '''
+    Switches endpoint calls between nba_api's requests calls (run in the thread pool) and async_transport
+    :param enabled: True to use async_transport
+    :return:
+    '''
+    global USE_ASYNC_TRANSPORT
+
+    USE_ASYNC_TRANSPORT = enabled
+
+
+def get_endpoint_executor() -> ThreadPoolExecutor:
+    global ENDPOINT_EXECUTOR
+
+    if ENDPOINT_EXECUTOR is None:
+        LOGGER.debug(f"Starting endpoint executor with {ENDPOINT_EXECUTOR_POOL_SIZE} threads")
+        ENDPOINT_EXECUTOR = ThreadPoolExecutor(max_workers=ENDPOINT_EXECUTOR_POOL_SIZE,
+                                               thread_name_prefix='endpoint')
+
+    return ENDPOINT_EXECUTOR
+
+
+def get_endpoint_executor_stats() -> Dict[str, int]:
+    '''
+    Snapshot of the endpoint thread pool, used to size the pool under load
+    :return: dictionary with the queue depth (calls waiting on a thread), the number of calls in flight,
+             and the totals of completed and failed calls
+    '''
+    with _ENDPOINT_EXECUTOR_LOCK:
+        return {'queue_depth': ENDPOINT_EXECUTOR_STATS['queued'],
+                'in_flight': ENDPOINT_EXECUTOR_STATS['in_flight'],
+                'completed': ENDPOINT_EXECUTOR_STATS['completed'],
+                'failed': ENDPOINT_EXECUTOR_STATS['failed'],
+                'pool_size': ENDPOINT_EXECUTOR_POOL_SIZE}
 
-                # lock the good proxies list so we don't get race conditions
-                # with multiple calls trying to populate the proxy list
-                await populate_good_proxies()
-                pass
+
+def _run_endpoint_in_thread(endpoint_class, kwargs):
+    # Runs on one of the executor's threads
+    with _ENDPOINT_EXECUTOR_LOCK:
+        ENDPOINT_EXECUTOR_STATS['queued'] -= 1
+        ENDPOINT_EXECUTOR_STATS['in_flight'] += 1
+
+    succeeded = False
+    try:
+        response = endpoint_class(**kwargs)
+        succeeded = True
+        return response
+
+    finally:
+        with _ENDPOINT_EXECUTOR_LOCK:
+            ENDPOINT_EXECUTOR_STATS['in_flight'] -= 1
+            if succeeded:
+                ENDPOINT_EXECUTOR_STATS['completed'] += 1
+            else:
+                ENDPOINT_EXECUTOR_STATS['failed'] += 1
+
+
+def _executor_future_done(future):
+    # A call that was cancelled before a thread picked it up never reaches _run_endpoint_in_thread
+    if future.cancelled():
+        with _ENDPOINT_EXECUTOR_LOCK:
+            ENDPOINT_EXECUTOR_STATS['queued'] -= 1
+
+
+async def call_endpoint(endpoint_class, **kwargs):
+    '''
+    Calls an nba_api endpoint without blocking the event loop
+    :param endpoint_class: nba_api endpoint class to construct
+    :param kwargs: arguments passed straight to the endpoint
+    :return: the endpoint object, with its response already loaded
+    '''
+    if USE_ASYNC_TRANSPORT:
+        return await async_transport.fetch_endpoint(endpoint_class, **kwargs)
+
+    if not USE_ENDPOINT_EXECUTOR:
+        return endpoint_class(**kwargs)
+
+    with _ENDPOINT_EXECUTOR_LOCK:
+        ENDPOINT_EXECUTOR_STATS['queued'] += 1
+
+    future = get_endpoint_executor().submit(_run_endpoint_in_thread, endpoint_class, kwargs)
+    future.add_done_callback(_executor_future_done)
+
+    return await asyncio.wrap_future(future)
 
 
 # Code copied from https://github.com/swar/nba_api/blob/master/tests/stats/deferred_endpoints.py
@@ -213,33 +587,247 @@ class DeferredEndpoint:
 
 async def ProxiedEndpoint(endpoint_class, **kwargs):
     # Modified version of DeferredEndpoint to automatically get the current proxy and use it
+    # Responses are served from RESPONSE_CACHE while they're still fresh, and identical concurrent
+    # requests share one upstream call
+
+    cache_key = get_cache_key(endpoint_class, kwargs)
 
-        if (kwargs.get('use_proxy') is None and not is_direct_connect_allowed()) or \
-            (kwargs.get('use_proxy') is not None and kwargs['use_proxy']):
+    if USE_RESPONSE_CACHE:
+        cached_response = RESPONSE_CACHE.get(cache_key)
 
-            # If the use_proxy argument was specified, remove it
-            kwargs.pop('use_proxy', None)
+        if cached_response is not None:
+            LOGGER.debug(f"Using cached {endpoint_class.__name__} response")
+            return cached_response
 
-            while True:
-                proxy_url = await get_random_good_proxy()
+    if USE_SINGLE_FLIGHT:
+        return await ENDPOINT_FLIGHTS.do(cache_key, fetch_and_cache_endpoint, cache_key, endpoint_class, kwargs)
+    else:
+        return await fetch_and_cache_endpoint(cache_key, endpoint_class, kwargs)
 
-                # insert the proxy url into the arguments for the endpoint call
-                kwargs['proxy'] = proxy_url
 
-                try:
-                    # try to access the endpoint
-                    return endpoint_class(**kwargs)
+async def fetch_and_cache_endpoint(cache_key, endpoint_class, kwargs):
+    if USE_PERSISTENT_CACHE:
+        response = await load_persisted_endpoint(cache_key, endpoint_class, kwargs)
 
-                except (ReadTimeout, ProxyError, ConnectTimeout, SSLError, ConnectionError, JSONDecodeError) as e:
-                    LOGGER.debug(f"Previously good proxy {proxy_url} failed with error {e}")
-                    GOOD_PROXIES.remove(proxy_url)
+        if response is not None:
+            LOGGER.debug(f"Using {endpoint_class.__name__} response from disk")
+            return response
 
+    response = await call_proxied_endpoint(endpoint_class, **kwargs)
 
-        else:
+    if USE_RESPONSE_CACHE:
+        RESPONSE_CACHE.put(cache_key, response)
+
+    if USE_PERSISTENT_CACHE:
+        # Written in the background, the caller doesn't need to wait on the disk
+        task = asyncio.ensure_future(persist_endpoint(cache_key, response))
+        PERSIST_TASKS.add(task)
+        task.add_done_callback(finish_persist_task)
+
+    return response
+
+
+async def load_persisted_endpoint(cache_key, endpoint_class, kwargs):
+    '''
+    Rebuilds an endpoint from a response in PERSISTENT_CACHE, and puts it in RESPONSE_CACHE for the rest of its TTL, or
+    RESPONSE_CACHE's own TTL if that's shorter
+    :param cache_key:
+    :param endpoint_class:
+    :param kwargs: arguments for the endpoint
+    :return: the endpoint object, None if there's no stored response or it can't be loaded
+    '''
+    try:
+        persisted = await PERSISTENT_CACHE.get(cache_key)
+    except sqlite3.Error as e:
+        LOGGER.warning(f"Couldn't read from the persistent cache: {e}")
+        return None
+
+    if persisted is None:
+        return None
+
+    contents, status_code, url, expires = persisted
+    request_kwargs = {key: value for key, value in kwargs.items() if key not in TRANSPORT_KWARGS}
+
+    try:
+        endpoint = async_transport.load_endpoint_response(endpoint_class(get_request=False, **request_kwargs),
+                                                          contents, status_code, url)
+    except (TypeError, ValueError, KeyError) as e:
+        LOGGER.debug(f"Couldn't load stored {endpoint_class.__name__} response: {e!r}")
+        return None
+
+    if USE_RESPONSE_CACHE:
+        RESPONSE_CACHE.put(cache_key, endpoint, ttl=min(expires - time(), RESPONSE_CACHE.get_ttl(cache_key[0])))
+
+    return endpoint
+
+
+async def persist_endpoint(cache_key, endpoint):
+    # Only raw responses that loaded fine are worth keeping
+    nba_response = getattr(endpoint, 'nba_response', None)
+
+    if nba_response is None or getattr(nba_response, '_status_code', None) not in (None, 200):
+        return
+
+    try:
+        await PERSISTENT_CACHE.put(cache_key, nba_response.get_response(),
+                                   status_code=getattr(nba_response, '_status_code', None),
+                                   url=nba_response.get_url())
+    except sqlite3.Error as e:
+        LOGGER.warning(f"Couldn't write to the persistent cache: {e}")
+
+
+def finish_persist_task(task: asyncio.Future):
+    PERSIST_TASKS.discard(task)
+
+    if not task.cancelled() and task.exception() is not None:
+        LOGGER.error("Error persisting endpoint response", exc_info=task.exception())
+
+
+async def wait_for_persist_tasks():
+    # Lets the background writes to PERSISTENT_CACHE finish, their errors are already logged
+    if len(PERSIST_TASKS) > 0:
+        await asyncio.gather(*PERSIST_TASKS, return_exceptions=True)
+
+
+async def call_proxied_endpoint(endpoint_class, **kwargs):
+    # Calls the endpoint directly or through a proxy, without checking the cache. Unless use_proxy is given, the route
+    # is picked by ROUTER before every attempt, so failed calls are retried on whichever route is working
+    use_proxy = kwargs.pop('use_proxy', None)
+    fall_back = use_proxy is None
+
+    while True:
+        if fall_back:
+            await refresh_direct_route()
+            use_proxy = ROUTER.choose_route(GOOD_PROXIES.count_available() > 0) == routing.PROXY
+
+        if not use_proxy:
             LOGGER.debug("Directly calling endpoint")
-            # If the use_proxy argument was specified, remove it
-            kwargs.pop('use_proxy', None)
-            return endpoint_class(**kwargs)
+            start = time()
+            try:
+                response = await call_endpoint(endpoint_class, **kwargs)
+
+            except PROXY_ERRORS as e:
+                ROUTER.record(routing.DIRECT, False)
+
+                if not fall_back:
+                    raise
+
+                LOGGER.debug(f"Direct call failed with error {e!r}, retrying through a proxy")
+                continue
+
+            ROUTER.record(routing.DIRECT, True, time() - start)
+            return response
+
+        proxy_url = await get_good_proxy()
+
+        try:
+            if USE_HEDGED_REQUESTS:
+                return await call_hedged_endpoint(endpoint_class, proxy_url, kwargs)
+            else:
+                return await call_endpoint_through_proxy(endpoint_class, proxy_url, kwargs)
+
+        except PROXY_ERRORS as e:
+            # One failure only lowers its score, the proxy stops being used once its breaker opens
+            LOGGER.debug(f"Previously good proxy {proxy_url} failed with error {e}")
+
+
+async def call_endpoint_through_proxy(endpoint_class, proxy_url: str, kwargs: dict):
+    '''
+    Calls an endpoint through a proxy, recording how it went in the proxy's stats and the proxy route's
+    :param endpoint_class:
+    :param proxy_url:
+    :param kwargs: arguments for the endpoint, without the proxy
+    :return: the endpoint object
+    '''
+    start = GOOD_PROXIES.start_request(proxy_url)
+    try:
+        response = await call_endpoint(endpoint_class, proxy=proxy_url, **kwargs)
+
+    except PROXY_ERRORS:
+        GOOD_PROXIES.finish_request(proxy_url, start, False)
+        ROUTER.record(routing.PROXY, False)
+        raise
+
+    except BaseException:
+        GOOD_PROXIES.finish_request(proxy_url, start, None)
+        raise
+
+    GOOD_PROXIES.finish_request(proxy_url, start, True)
+    PROXY_LATENCIES.add(time() - start)
+    ROUTER.record(routing.PROXY, True, time() - start)
+
+    return response
+
+
+async def call_hedged_endpoint(endpoint_class, proxy_url: str, kwargs: dict):
+    '''
+    Calls an endpoint through a proxy and, if it hasn't answered within the hedge delay and the hedge budget allows,
+    through a second proxy as well. The first successful response is returned, and the other call is cancelled.
+    Endpoint calls running on the executor's threads can't be stopped, so a cancelled one finishes in the background
+    :param endpoint_class:
+    :param proxy_url: the first proxy
+    :param kwargs: arguments for the endpoint, without the proxy
+    :return: the endpoint object
+    '''
+    HEDGE_BUDGET.record_request()
+    primary = asyncio.ensure_future(call_endpoint_through_proxy(endpoint_class, proxy_url, kwargs))
+    tasks = {primary}
+
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedging.get_hedge_delay(PROXY_LATENCIES, HEDGE_PERCENTILE))
+
+        if len(done) < 1:
+            hedge_proxy_url = GOOD_PROXIES.choose(exclude=proxy_url)
+
+            if hedge_proxy_url is not None and HEDGE_BUDGET.try_spend():
+                LOGGER.debug(f"Hedging {endpoint_class.__name__} request through {hedge_proxy_url}")
+                tasks.add(asyncio.ensure_future(call_endpoint_through_proxy(endpoint_class, hedge_proxy_url,
+                                                                            kwargs)))
+
+        pending = tasks
+        while len(pending) > 0:
+            done, pending = await asyncio.wait(pending, return_when=FIRST_COMPLETED)
+
+            for task in done:
+                # exception() raises for a cancelled call, which didn't answer either way
+                if task.cancelled():
+                    continue
+
+                if task.exception() is None:
+                    if task is not primary:
+                        HEDGE_BUDGET.record_win()
+                    return task.result()
+
+                # Anything but a proxy failing isn't going to go better through another proxy
+                if not isinstance(task.exception(), PROXY_ERRORS):
+                    raise task.exception()
+
+        # Every call failed
+        return primary.result()
+
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+async def gather_endpoints(*coroutines):
+    '''
+    Runs independent endpoint calls concurrently, so the total time is the slowest call instead of the sum of them.
+    If any call fails, the others are cancelled and the error is raised
+    :param coroutines: the endpoint calls (e.g. ProxiedEndpoint(...) coroutines)
+    :return: list of results in the same order as the coroutines
+    '''
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+
+    try:
+        return await asyncio.gather(*tasks)
+
+    except BaseException:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        raise
 
 
 def clear_all_proxy_lists():
@@ -248,33 +836,66 @@ def clear_all_proxy_lists():
     BLOCKED_PROXIES.clear()
 
 
-def test_nba_noproxy() -> bool:
+async def probe_direct_route(player_id_to_test: int = 2544) -> bool:
+    '''
+    Makes one request straight to stats.nba.com, on the event loop, and records the result in ROUTER
+    :param player_id_to_test:
+    :return: whether or not the direct route works
+    '''
+    timeout = aiohttp.ClientTimeout(sock_connect=PROXY_PROBE_CONNECT_TIMEOUT, sock_read=PROXY_PROBE_READ_TIMEOUT)
+    start = time()
+
+    try:
+        await asyncio.wait_for(async_transport.fetch_endpoint(PROXY_PROBE_ENDPOINT, timeout=timeout,
+                                                              player_id=player_id_to_test), PROXY_PROBE_TIMEOUT)
+
+    except PROXY_ERRORS + (ValueError, KeyError) as e:
+        LOGGER.debug(f"Direct connection to NBA failed with error {e!r}")
+        ROUTER.record(routing.DIRECT, False)
+        return False
+
+    LOGGER.debug(f"Direct connection to NBA succeeded in {round(time() - start, 4)} seconds")
+    ROUTER.record(routing.DIRECT, True, time() - start)
+    return True
+
+
+async def refresh_direct_route():
     '''
-    Test to see if a proxy is even needed
+    Probes the direct route if it's due. The first probe is waited on, since there's nothing to pick a route with
+    before it, and later ones run in the background
     :return:
     '''
-    global DIRECT_CONNECT_ALLOWED
+    if not ROUTER.needs_direct_probe():
+        return
+
+    probe = asyncio.ensure_future(PROXY_FLIGHTS.do('probe_direct', probe_direct_route))
 
+    if ROUTER.direct.healthy is None:
+        await probe
+
+
+def test_nba_noproxy() -> bool:
+    '''
+    Test to see if a proxy is even needed. Blocks, so it's only for before the event loop is running
+    :return:
+    '''
     LOGGER.debug("Calling the NBA API to see if it responds")
+    start = time()
     try:
         CommonPlayerInfo(player_id=2544).get_response()
-    except ReadTimeout:
-        LOGGER.debug("Direct connection to NBA timed out")
-        DIRECT_CONNECT_ALLOWED = False
+    except PROXY_ERRORS:
+        LOGGER.debug("Direct connection to NBA failed")
+        ROUTER.record(routing.DIRECT, False)
         return False
 
     LOGGER.debug("Direct connection to NBA succeeded")
-    DIRECT_CONNECT_ALLOWED = True
+    ROUTER.record(routing.DIRECT, True, time() - start)
     return True
 
 
 def is_direct_connect_allowed() -> bool:
-    global DIRECT_CONNECT_ALLOWED
+    # Whether or not the direct route works, as of the last time it was tried
+    if ROUTER.direct.healthy is None:
+        return test_nba_noproxy()
 
-    if DIRECT_CONNECT_ALLOWED is None:
-        success = test_nba_noproxy()
-
-        return success
-
-    else:
-        return DIRECT_CONNECT_ALLOWED
+    return ROUTER.direct.healthy
@@ -0,0 +1,615 @@
+import logging
+import asyncio
+import json
+import random
+from collections import Counter
+from time import sleep
+from typing import Coroutine
+
+from nba_api.stats.endpoints.commonplayerinfo import CommonPlayerInfo
+from nba_api.stats.endpoints.playercareerstats import PlayerCareerStats
+from nba_api.stats.endpoints.teaminfocommon import TeamInfoCommon
+
+import hedging
+import persistent_cache
+import proxy_pool
+import proxy_store
+import routing
+import proxied_endpoint as src
+
+LOGGER = logging.getLogger(__name__)
+
+# Keep the tests away from the real on-disk cache
+src.USE_PERSISTENT_CACHE = False
+
+SLOW_ENDPOINT_TIME = 0.2
+
+
+class SlowEndpoint:
+    """
+    Stand-in for an nba_api endpoint that blocks like a slow requests call
+    """
+
+    def __init__(self, **kwargs):
+        sleep(SLOW_ENDPOINT_TIME)
+        self.kwargs = kwargs
+
+
+def run(function: Coroutine):
+    loop = asyncio.get_event_loop()
+    return loop.run_until_complete(function)
+
+
+def test_call_endpoint_executor_stats():
+    src.configure_endpoint_executor(pool_size=2, enabled=True)
+
+    async def call_many():
+        tasks = [asyncio.ensure_future(src.call_endpoint(SlowEndpoint, player_id=i)) for i in range(5)]
+        await asyncio.sleep(SLOW_ENDPOINT_TIME / 4)
+
+        stats = src.get_endpoint_executor_stats()
+        assert stats['in_flight'] == 2
+        assert stats['queue_depth'] == 3
+
+        return await asyncio.gather(*tasks)
+
+    responses = run(call_many())
+
+    assert [response.kwargs['player_id'] for response in responses] == list(range(5))
+    assert src.get_endpoint_executor_stats()['queue_depth'] == 0
+    assert src.get_endpoint_executor_stats()['in_flight'] == 0
+
+
+class CountingEndpoint:
+    """
+    Stand-in for an nba_api endpoint that counts how many requests were made
+    """
+    endpoint = 'countingendpoint'
+    requests_made = 0
+
+    def __init__(self, player_id, per_mode='Totals', proxy=None, timeout=30, get_request=True):
+        self.parameters = {'PlayerID': player_id, 'PerMode': per_mode}
+        if get_request:
+            CountingEndpoint.requests_made += 1
+
+
+def test_ProxiedEndpoint_cached():
+    src.RESPONSE_CACHE.clear()
+    CountingEndpoint.requests_made = 0
+
+    first = run(src.ProxiedEndpoint(CountingEndpoint, player_id=2544, use_proxy=False))
+    second = run(src.ProxiedEndpoint(CountingEndpoint, player_id='2544', per_mode='Totals', use_proxy=False))
+    run(src.ProxiedEndpoint(CountingEndpoint, player_id=201939, use_proxy=False))
+
+    assert first is second
+    assert CountingEndpoint.requests_made == 2
+    assert src.RESPONSE_CACHE.get_stats()['hits'] == 1
+
+
+def test_EndpointCache_lru_eviction():
+    cache = src.EndpointCache(max_entries=2)
+
+    for player_id in range(3):
+        cache.put(src.get_cache_key(CountingEndpoint, {'player_id': player_id}), player_id)
+
+    assert cache.get(src.get_cache_key(CountingEndpoint, {'player_id': 0})) is None
+    assert cache.get(src.get_cache_key(CountingEndpoint, {'player_id': 2})) == 2
+    assert cache.get_stats()['evictions'] == 1
+
+
+def test_ProxiedEndpoint_single_flight():
+    src.RESPONSE_CACHE.clear()
+    CountingEndpoint.requests_made = 0
+
+    async def call_many():
+        return await asyncio.gather(*[src.ProxiedEndpoint(CountingEndpoint, player_id=1629029, use_proxy=False)
+                                      for _ in range(10)])
+
+    responses = run(call_many())
+
+    assert all(response is responses[0] for response in responses)
+    assert CountingEndpoint.requests_made == 1
+    assert src.ENDPOINT_FLIGHTS.history[-1][1] == 9
+
+
+def test_validate_proxies_stops_at_min_good():
+    src.clear_all_proxy_lists()
+    running = []
+    max_running = []
+    cancelled = []
+
+    async def probe(proxy_url, player_id):
+        running.append(proxy_url)
+        max_running.append(len(running))
+        try:
+            if proxy_url.startswith('bad'):
+                raise src.ProxyError()
+            elif proxy_url.startswith('blocked'):
+                raise src.ReadTimeout()
+            elif proxy_url.startswith('slow'):
+                await asyncio.sleep(10)
+            else:
+                await asyncio.sleep(0.05 if proxy_url == 'good1' else 0.5)
+        except asyncio.CancelledError:
+            cancelled.append(proxy_url)
+            raise
+        finally:
+            running.remove(proxy_url)
+
+    proxy_urls = ['bad1', 'blocked1', 'slow1', 'slow2', 'good1', 'slow3', 'good2', 'slow4']
+    probed = run(src.validate_proxies(proxy_urls, 1, concurrency=6, probe_timeout=5, probe=probe))
+
+    assert src.GOOD_PROXIES == {'good1'}
+    assert src.BAD_PROXIES == {'bad1'}
+    assert src.BLOCKED_PROXIES == {'blocked1'}
+    assert max(max_running) <= 6
+    assert sorted(cancelled) == ['good2', 'slow1', 'slow2', 'slow3', 'slow4']
+    assert probed == 3
+
+    src.clear_all_proxy_lists()
+
+
+def test_validate_proxies_timeout():
+    src.clear_all_proxy_lists()
+
+    async def probe(proxy_url, player_id):
+        await asyncio.sleep(10)
+
+    run(src.validate_proxies(['dead1', 'dead2'], 1, probe_timeout=0.05, probe=probe))
+
+    assert src.BAD_PROXIES == {'dead1', 'dead2'}
+
+    src.clear_all_proxy_lists()
+
+
+def test_ProxyPool_prefers_fast_proxies():
+    pool = proxy_pool.ProxyPool(['fast', 'slow', 'flaky', 'new'])
+
+    for _ in range(5):
+        pool.record('fast', True, 0.2)
+        pool.record('slow', True, 4)
+        pool.record('flaky', True, 0.2)
+        pool.record('flaky', False)
+
+    rng = random.Random(1)
+    counts = Counter(pool.choose(rng) for _ in range(1000))
+
+    # The best proxy wins every sample it's in, the worst one never does
+    assert counts['fast'] == max(counts.values())
+    assert counts['slow'] == 0
+    assert counts['new'] > 0
+    assert pool.get_stats()['fast']['latency'] < pool.get_stats()['new']['latency']
+
+    assert 'fast' not in {pool.choose(rng, exclude='fast') for _ in range(100)}
+    assert proxy_pool.ProxyPool(['only']).choose(exclude='only') is None
+
+    pool.discard('fast')
+    assert set(pool) == {'slow', 'flaky', 'new'} and 'fast' not in pool.stats
+
+
+def test_ProxiedEndpoint_breaker_opens_on_failing_proxy():
+    src.clear_all_proxy_lists()
+    src.GOOD_PROXIES.add('dead')
+    calls = []
+
+    async def dead_proxy_call(endpoint_class, **kwargs):
+        calls.append(kwargs['proxy'])
+        if kwargs['proxy'] == 'dead':
+            raise src.ProxyError()
+        return kwargs['proxy']
+
+    async def populate_good_proxies(**kwargs):
+        src.GOOD_PROXIES.add('replacement')
+
+    call_endpoint = src.call_endpoint
+    populate = src.populate_good_proxies
+    src.call_endpoint = dead_proxy_call
+    src.populate_good_proxies = populate_good_proxies
+    try:
+        # The only proxy keeps failing until its breaker opens, and a replacement is found
+        assert run(src.call_proxied_endpoint(CountingEndpoint, player_id=2544, use_proxy=True)) == 'replacement'
+    finally:
+        src.call_endpoint = call_endpoint
+        src.populate_good_proxies = populate
+
+    assert calls.count('dead') == proxy_pool.BREAKER_FAILURE_THRESHOLD
+    assert src.GOOD_PROXIES.get_stats()['dead']['breaker'] == proxy_pool.OPEN
+    assert src.GOOD_PROXIES.stats['replacement'].in_flight == 0
+    assert src.GOOD_PROXIES.count_available() == 1
+
+    src.clear_all_proxy_lists()
+
+
+def test_CircuitBreaker_half_open():
+    breaker = proxy_pool.CircuitBreaker()
+
+    for _ in range(proxy_pool.BREAKER_FAILURE_THRESHOLD):
+        breaker.record_failure(0)
+    assert breaker.state == proxy_pool.OPEN
+    assert not breaker.try_half_open(proxy_pool.BREAKER_OPEN_TIME - 1)
+    assert breaker.try_half_open(proxy_pool.BREAKER_OPEN_TIME)
+
+    # A failed check while half-open opens it again, for longer
+    breaker.record_failure(100)
+    assert breaker.state == proxy_pool.OPEN
+    assert not breaker.try_half_open(100 + proxy_pool.BREAKER_OPEN_TIME)
+    assert breaker.try_half_open(100 + 2 * proxy_pool.BREAKER_OPEN_TIME)
+
+    breaker.record_success()
+    assert breaker.state == proxy_pool.CLOSED and breaker.trips == 0
+
+
+def test_check_proxy_health():
+    src.clear_all_proxy_lists()
+    for proxy_url in ('healthy', 'dead', 'busy'):
+        src.GOOD_PROXIES.add(proxy_url)
+    checked = []
+
+    async def probe(proxy_url, player_id):
+        checked.append(proxy_url)
+        if proxy_url == 'dead':
+            raise src.ProxyError()
+
+    async def check_health():
+        # Busy proxies aren't checked
+        src.GOOD_PROXIES.record('busy', True, 0.1)
+        return await src.check_proxy_health(probe=probe, idle_time=0.05)
+
+    for _ in range(proxy_pool.BREAKER_FAILURE_THRESHOLD):
+        sleep(0.1)
+        assert run(check_health()) == 2
+
+    assert sorted(set(checked)) == ['dead', 'healthy']
+    assert src.GOOD_PROXIES.get_stats()['dead']['breaker'] == proxy_pool.OPEN
+    assert src.GOOD_PROXIES.count_available() == 2
+
+    # A breaker that keeps opening gets the proxy moved to the bad proxies
+    src.GOOD_PROXIES.stats['dead'].breaker.trips = proxy_pool.BREAKER_MAX_TRIPS
+    run(src.check_proxy_health(probe=probe, idle_time=60))
+    assert 'dead' not in src.GOOD_PROXIES and 'dead' in src.BAD_PROXIES
+
+    src.clear_all_proxy_lists()
+
+
+def test_ProxyStateStore_debounced_save(tmp_path):
+    state_file = str(tmp_path / "proxy_state.json")
+    store = proxy_store.ProxyStateStore(state_file, save_delay=0.05)
+    good = proxy_pool.ProxyPool(['fast', 'tripped'])
+    bad = {'bad'}
+    blocked = {'blocked'}
+
+    good.record('fast', True, 0.2)
+    for _ in range(proxy_pool.BREAKER_FAILURE_THRESHOLD):
+        good.record('tripped', False)
+
+    async def change_and_save():
+        for _ in range(10):
+            good.record('fast', True, 0.2)
+            store.request_save(good, bad, blocked)
+        await asyncio.sleep(0.2)
+
+    run(change_and_save())
+
+    # Every change was written in one save
+    assert store.requested_saves == 10
+    assert store.saves == 1
+    assert not (tmp_path / "proxy_state.json.tmp").exists()
+
+    loaded_good = proxy_pool.ProxyPool()
+    loaded_bad, loaded_blocked = set(), set()
+    assert store.load(loaded_good, loaded_bad, loaded_blocked)
+
+    assert set(loaded_good) == {'fast', 'tripped'}
+    assert loaded_good.stats['fast'].successes == 11
+    assert abs(loaded_good.stats['fast'].latency - good.stats['fast'].latency) < 1e-9
+    assert loaded_good.get_stats()['tripped']['breaker'] == proxy_pool.OPEN
+    assert loaded_good.count_available() == 1
+    assert (loaded_bad, loaded_blocked) == (bad, blocked)
+
+    assert not proxy_store.ProxyStateStore(str(tmp_path / "missing.json")).load(loaded_good, loaded_bad, loaded_blocked)
+
+
+def test_ProxyStateStore_flush(tmp_path):
+    store = proxy_store.ProxyStateStore(str(tmp_path / "proxy_state.json"), save_delay=60)
+    good = proxy_pool.ProxyPool(['fast'])
+    writing = []
+    write_state_file = proxy_store.write_state_file
+
+    def slow_write(filename, state):
+        writing.append(filename)
+        assert len(writing) == 1, "two writes at once"
+        sleep(0.1)
+        write_state_file(filename, state)
+        writing.remove(filename)
+
+    async def flush_twice():
+        # A waiting save is written right away instead of after the delay
+        store.request_save(good, set(), set())
+        await store.flush()
+        assert store.saves == 1
+
+        # Flushing while a save is being written waits for it, then writes what changed since
+        store.request_save(good, set(), {'blocked'})
+        writer = asyncio.ensure_future(store.flush())
+        await asyncio.sleep(0.02)
+        store.request_save(good, {'bad'}, {'blocked'})
+        await store.flush()
+        await writer
+
+    proxy_store.write_state_file = slow_write
+    try:
+        run(flush_twice())
+    finally:
+        proxy_store.write_state_file = write_state_file
+
+    assert store.saves == 3
+    loaded_bad, loaded_blocked = set(), set()
+    assert store.load(proxy_pool.ProxyPool(), loaded_bad, loaded_blocked)
+    assert (loaded_bad, loaded_blocked) == ({'bad'}, {'blocked'})
+
+
+def test_call_hedged_endpoint():
+    src.clear_all_proxy_lists()
+    src.GOOD_PROXIES.add('slow')
+    src.GOOD_PROXIES.add('fast')
+    cancelled = []
+
+    async def proxy_call(endpoint_class, proxy, **kwargs):
+        try:
+            await asyncio.sleep(5 if proxy == 'slow' else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(proxy)
+            raise
+        return proxy
+
+    call_endpoint = src.call_endpoint
+    hedge_delay = src.hedging.DEFAULT_HEDGE_DELAY
+    budget = src.HEDGE_BUDGET
+    src.call_endpoint = proxy_call
+    src.hedging.DEFAULT_HEDGE_DELAY = 0.05
+    src.HEDGE_BUDGET = hedging.HedgeBudget(ratio=1, burst=1)
+    try:
+        # The slow proxy gets hedged through the other one, which wins
+        assert run(src.call_hedged_endpoint(CountingEndpoint, 'slow', {'player_id': 2544})) == 'fast'
+        assert cancelled == ['slow']
+        assert src.HEDGE_BUDGET.get_stats()['hedge_wins'] == 1
+
+        # Out of budget, so the request waits on the first proxy
+        src.HEDGE_BUDGET.ratio = 0
+        assert run(src.call_hedged_endpoint(CountingEndpoint, 'fast', {'player_id': 2544})) == 'fast'
+        assert src.HEDGE_BUDGET.hedges == 1
+        assert src.GOOD_PROXIES.stats['slow'].in_flight == 0
+    finally:
+        src.call_endpoint = call_endpoint
+        src.hedging.DEFAULT_HEDGE_DELAY = hedge_delay
+        src.HEDGE_BUDGET = budget
+
+    src.clear_all_proxy_lists()
+
+
+def test_HedgeBudget_caps_hedges():
+    budget = hedging.HedgeBudget(ratio=0.1, burst=5)
+    hedges = 0
+
+    for _ in range(1000):
+        budget.record_request()
+        hedges += budget.try_spend()
+
+    assert hedges == budget.hedges <= 100
+
+    latencies = hedging.LatencyWindow(window=100)
+    for latency in range(200):
+        latencies.add(latency / 100)
+
+    assert latencies.get_percentile(90) == 1.9
+    assert hedging.get_hedge_delay(latencies) == 1.9
+    assert hedging.get_hedge_delay(hedging.LatencyWindow()) == hedging.DEFAULT_HEDGE_DELAY
+
+
+def test_Router_choose_route():
+    router = routing.Router(direct_preference=1.5)
+
+    assert router.needs_direct_probe()
+    assert router.choose_route() == routing.PROXY
+
+    router.record(routing.DIRECT, True, 1.0)
+    assert not router.needs_direct_probe()
+    assert router.choose_route() == routing.DIRECT
+
+    # Proxies have to be a lot faster to win over the direct route
+    router.record(routing.PROXY, True, 0.8)
+    assert router.choose_route() == routing.DIRECT
+    router.record(routing.DIRECT, True, 5.0)
+    assert router.choose_route() == routing.PROXY
+    assert router.choose_route(proxies_available=False) == routing.DIRECT
+
+    router.record(routing.DIRECT, False)
+    assert router.choose_route(proxies_available=False) == routing.PROXY
+
+
+def test_call_proxied_endpoint_falls_back_to_proxy():
+    src.clear_all_proxy_lists()
+    src.GOOD_PROXIES.add('proxy')
+    router = src.ROUTER
+    calls = []
+
+    async def blocked_direct_call(endpoint_class, proxy=None, **kwargs):
+        calls.append(proxy)
+        if proxy is None:
+            raise src.ReadTimeout()
+        return proxy
+
+    call_endpoint = src.call_endpoint
+    src.call_endpoint = blocked_direct_call
+    src.ROUTER = routing.Router()
+    src.ROUTER.record(routing.DIRECT, True, 0.1)
+    try:
+        # The direct route fails, so the request is retried through a proxy, and later requests skip it
+        assert run(src.call_proxied_endpoint(CountingEndpoint, player_id=2544)) == 'proxy'
+        assert run(src.call_proxied_endpoint(CountingEndpoint, player_id=2544)) == 'proxy'
+        assert calls == [None, 'proxy', 'proxy']
+        assert src.ROUTER.direct.healthy is False
+
+        # Unless the route is forced
+        try:
+            run(src.call_proxied_endpoint(CountingEndpoint, player_id=2544, use_proxy=False))
+            assert False
+        except src.ReadTimeout:
+            pass
+    finally:
+        src.call_endpoint = call_endpoint
+        src.ROUTER = router
+
+    src.clear_all_proxy_lists()
+
+
+def test_call_proxied_endpoint_falls_back_to_direct():
+    src.clear_all_proxy_lists()
+    src.GOOD_PROXIES.add('proxy')
+    router = src.ROUTER
+    calls = []
+
+    async def failing_proxy_call(endpoint_class, proxy=None, **kwargs):
+        calls.append(proxy)
+        if proxy is not None:
+            # The direct route starts working again while the proxy is failing
+            src.ROUTER.record(routing.DIRECT, True, 0.1)
+            raise src.ProxyError()
+        return 'direct'
+
+    call_endpoint = src.call_endpoint
+    src.call_endpoint = failing_proxy_call
+    src.ROUTER = routing.Router()
+    src.ROUTER.record(routing.DIRECT, False)
+    try:
+        # The route is picked again after the proxy fails, instead of waiting for another proxy
+        assert run(src.call_proxied_endpoint(CountingEndpoint, player_id=2544)) == 'direct'
+        assert calls == ['proxy', None]
+        assert src.ROUTER.proxy.failures == 1
+    finally:
+        src.call_endpoint = call_endpoint
+        src.ROUTER = router
+
+    src.clear_all_proxy_lists()
+
+
+PLAYER_INFO_RESPONSE = json.dumps({'resultSets': [
+    {'name': 'CommonPlayerInfo', 'headers': ['PERSON_ID', 'DISPLAY_FIRST_LAST'], 'rowSet': [[2544, 'LeBron James']]},
+    {'name': 'PlayerHeadlineStats', 'headers': ['PTS'], 'rowSet': [[27.1]]},
+    {'name': 'AvailableSeasons', 'headers': ['SEASON_ID'], 'rowSet': []}]})
+
+
+def test_ProxiedEndpoint_persistent_cache(tmp_path):
+    cache_file = str(tmp_path / "endpoint_cache.sqlite")
+    fetched = []
+
+    async def fetch(endpoint_class, **kwargs):
+        fetched.append(kwargs)
+        return src.async_transport.load_endpoint_response(endpoint_class(get_request=False, **kwargs),
+                                                          PLAYER_INFO_RESPONSE, 200, 'url')
+
+    async def call_and_persist():
+        response = await src.ProxiedEndpoint(CommonPlayerInfo, player_id=2544)
+        assert len(src.PERSIST_TASKS) == 1
+        await src.wait_for_persist_tasks()
+        assert len(src.PERSIST_TASKS) == 0
+        return response
+
+    saved_cache = src.PERSISTENT_CACHE
+    call_proxied_endpoint = src.call_proxied_endpoint
+    src.call_proxied_endpoint = fetch
+    src.USE_PERSISTENT_CACHE = True
+    try:
+        src.RESPONSE_CACHE.clear()
+        src.PERSISTENT_CACHE = persistent_cache.PersistentEndpointCache(cache_file)
+        first = run(call_and_persist())
+        run(src.PERSISTENT_CACHE.close())
+
+        # A restart empties the memory cache, but the response is still on disk
+        src.RESPONSE_CACHE.clear()
+        src.PERSISTENT_CACHE = persistent_cache.PersistentEndpointCache(cache_file)
+        second = run(src.ProxiedEndpoint(CommonPlayerInfo, player_id='2544'))
+
+        assert len(fetched) == 1
+        assert src.PERSISTENT_CACHE.writes == 0
+        assert second.common_player_info.get_dict() == first.common_player_info.get_dict()
+        assert src.PERSISTENT_CACHE.get_stats()['hits'] == 1
+        assert src.RESPONSE_CACHE.get(src.get_cache_key(CommonPlayerInfo, {'player_id': 2544})) is second
+
+        run(src.PERSISTENT_CACHE.close())
+    finally:
+        src.call_proxied_endpoint = call_proxied_endpoint
+        src.PERSISTENT_CACHE = saved_cache
+        src.USE_PERSISTENT_CACHE = False
+        src.RESPONSE_CACHE.clear()
+
+
+def test_PersistentEndpointCache_compaction(tmp_path):
+    cache = persistent_cache.PersistentEndpointCache(str(tmp_path / "endpoint_cache.sqlite"), max_bytes=10 ** 6,
+                                                     compaction_interval=float('inf'))
+    expired = src.get_cache_key(CommonPlayerInfo, {'player_id': 201939})
+    fresh = src.get_cache_key(CommonPlayerInfo, {'player_id': 2544})
+
+    run(cache.put(expired, PLAYER_INFO_RESPONSE, -1))
+    run(cache.put(fresh, PLAYER_INFO_RESPONSE, 60, 200, 'url'))
+
+    assert run(cache.get(expired)) is None
+    assert run(cache.get(fresh))[:3] == (PLAYER_INFO_RESPONSE, 200, 'url')
+
+    # Expired responses are deleted, then the oldest ones while it's too big
+    assert run(cache.compact()) == 1
+    cache.max_bytes = 1
+    assert run(cache.compact()) == 1
+    assert run(cache.get(fresh)) is None
+
+    run(cache.close())
+
+
+def test_fetch_endpoint_error_status():
+    from aiohttp import web
+    from nba_api.stats.library.http import NBAStatsHTTP
+
+    async def forbidden(request):
+        return web.Response(status=403, text="Forbidden")
+
+    async def fetch_from_server():
+        app = web.Application()
+        app.router.add_get('/stats/{endpoint}', forbidden)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        base_url = NBAStatsHTTP.base_url
+        NBAStatsHTTP.base_url = f"http://127.0.0.1:{port}/stats/{{endpoint}}"
+        try:
+            await src.async_transport.fetch_endpoint(CommonPlayerInfo, player_id=2544)
+        except src.PROXY_ERRORS as e:
+            return e
+        finally:
+            NBAStatsHTTP.base_url = base_url
+            await src.async_transport.close_sessions()
+            await runner.cleanup()
+
+    # An error page is a failed route, not a response to load
+    error = run(fetch_from_server())
+    assert error is not None and error.status == 403
+
+
+def test_PersistentEndpointCache_ttls(tmp_path):
+    cache = persistent_cache.PersistentEndpointCache(str(tmp_path / "endpoint_cache.sqlite"), default_ttl=60,
+                                                     ttls={'PlayerCareerStats': 120})
+    past_season = src.get_cache_key(TeamInfoCommon, {'team_id': 1610612747, 'season_nullable': '2019-20'})
+
+    assert cache.get_ttl(src.get_cache_key(PlayerCareerStats, {'player_id': 2544})) == 120
+    assert cache.get_ttl(src.get_cache_key(TeamInfoCommon, {'team_id': 1610612747})) == 60
+    # Past seasons can't change anymore, a player's info can
+    assert cache.get_ttl(past_season) == persistent_cache.KEEP_FOREVER
+    assert persistent_cache.ENDPOINT_TTLS['CommonPlayerInfo'] < persistent_cache.KEEP_FOREVER
+
+    run(cache.put(past_season, PLAYER_INFO_RESPONSE))
+    assert run(cache.compact()) == 0
+    assert run(cache.get(past_season))[3] == persistent_cache.KEEP_FOREVER
+
+    run(cache.close())
@@ -0,0 +1,376 @@
+import logging
+import random
+from collections.abc import MutableSet
+from time import monotonic, time
+from typing import Dict, Iterable, Iterator, List, Optional
+
+# Set of good proxies that also keeps track of how well each one has been doing, so requests go to the fast, reliable
+# proxies instead of being spread evenly over all of them. Every proxy has an exponentially weighted moving average
+# (EWMA) of its latency and of its success rate, and a proxy is picked by sampling two at random and taking the one
+# with the better score (power of two choices). That sends most of the traffic to the best proxies while still giving
+# the others, and new proxies, some requests to learn from.
+#
+# Stats decay back towards the prior when a proxy hasn't been used for a while, so a proxy that was slow an hour ago
+# gets another chance, and a proxy that was fast an hour ago has to prove it again.
+#
+# Every proxy also has a circuit breaker. After a few failures in a row it opens and the proxy stops being picked.
+# Once it has been open for a while it goes half-open, which lets one health check through: if that succeeds the
+# breaker closes and the proxy is back in use, and if it fails the breaker opens again for longer. A proxy whose
+# breaker keeps opening is exhausted, and should be dropped from the pool.
+
+# Weight of the newest sample in the moving averages
+LATENCY_ALPHA = 0.3
+SUCCESS_ALPHA = 0.2
+# Seconds for a proxy's stats to decay halfway back to the prior
+STATS_HALF_LIFE = 10 * 60
+# What's assumed about a proxy nothing is known about
+PRIOR_LATENCY = 1.0
+PRIOR_SUCCESS_RATE = 1.0
+# Keeps a proxy that has been failing from getting an infinite score
+MIN_SUCCESS_RATE = 0.05
+
+# Circuit breaker states
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Failures in a row that open a proxy's breaker
+BREAKER_FAILURE_THRESHOLD = 3
+# Seconds a breaker stays open before the proxy is checked again, doubling every time it opens again without closing
+BREAKER_OPEN_TIME = 60
+BREAKER_MAX_OPEN_TIME = 15 * 60
+# Times a breaker can open without closing in between before the proxy is exhausted
+BREAKER_MAX_TRIPS = 4
+
+LOGGER = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Closed, open or half-open state of one proxy
+    """
+
+    def __init__(self):
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        # Times the breaker has opened since it was last closed
+        self.trips = 0
+        self.opened = 0.0
+
+    def get_open_time(self) -> float:
+        return min(BREAKER_OPEN_TIME * 2 ** max(self.trips - 1, 0), BREAKER_MAX_OPEN_TIME)
+
+    def to_state(self, clock_offset: float) -> dict:
+        return {'state': self.state, 'consecutive_failures': self.consecutive_failures, 'trips': self.trips,
+                'opened': self.opened + clock_offset}
+
+    def load_state(self, state: dict, clock_offset: float):
+        self.state = state.get('state', CLOSED)
+        self.consecutive_failures = state.get('consecutive_failures', 0)
+        self.trips = state.get('trips', 0)
+        self.opened = state.get('opened', 0.0) - clock_offset
+
+    def is_exhausted(self) -> bool:
+        return self.trips >= BREAKER_MAX_TRIPS
+
+    def record_success(self):
+        self.consecutive_failures = 0
+
+        if self.state != CLOSED:
+            self.state = CLOSED
+            self.trips = 0
+
+    def record_failure(self, now: float):
+        self.consecutive_failures += 1
+
+        if self.state == HALF_OPEN or (self.state == CLOSED and
+                                       self.consecutive_failures >= BREAKER_FAILURE_THRESHOLD):
+            self.state = OPEN
+            self.trips += 1
+            self.opened = now
+
+    def try_half_open(self, now: float) -> bool:
+        '''
+        Moves an open breaker to half-open once it has been open long enough
+        :param now: monotonic time
+        :return: whether or not the breaker is now half-open
+        '''
+        if self.state == OPEN and now - self.opened >= self.get_open_time():
+            self.state = HALF_OPEN
+
+        return self.state == HALF_OPEN
+
+
+class ProxyStats:
+    """
+    Moving averages of one proxy's latency and success rate
+    """
+
+    def __init__(self, latency: float = PRIOR_LATENCY, success_rate: float = PRIOR_SUCCESS_RATE,
+                 updated: Optional[float] = None):
+        self.latency = latency
+        self.success_rate = success_rate
+        self.updated = monotonic() if updated is None else updated
+        self.successes = 0
+        self.failures = 0
+        self.in_flight = 0
+        self.breaker = CircuitBreaker()
+
+    def get_decay(self, now: float) -> float:
+        # Weight left on the measured stats, from 1 when they were just updated down to 0 when they're long stale
+        return 0.5 ** (max(now - self.updated, 0) / STATS_HALF_LIFE)
+
+    def get_latency(self, now: float) -> float:
+        return PRIOR_LATENCY + (self.latency - PRIOR_LATENCY) * self.get_decay(now)
+
+    def get_success_rate(self, now: float) -> float:
+        return PRIOR_SUCCESS_RATE + (self.success_rate - PRIOR_SUCCESS_RATE) * self.get_decay(now)
+
+    def get_score(self, now: float) -> float:
+        '''
+        Expected time for a request to succeed through the proxy, counting retries after failures and the requests
+        already waiting on it. Lower is better
+        :param now: monotonic time
+        :return:
+        '''
+        return self.get_latency(now) * (1 + self.in_flight) / max(self.get_success_rate(now), MIN_SUCCESS_RATE)
+
+    def record(self, succeeded: bool, latency: Optional[float] = None, now: Optional[float] = None):
+        now = monotonic() if now is None else now
+
+        # Decay first, so a sample after a long gap isn't averaged with stale numbers
+        self.latency = self.get_latency(now)
+        self.success_rate = self.get_success_rate(now)
+        self.updated = now
+
+        self.success_rate += SUCCESS_ALPHA * ((1.0 if succeeded else 0.0) - self.success_rate)
+
+        if succeeded:
+            self.successes += 1
+            self.breaker.record_success()
+            if latency is not None:
+                self.latency += LATENCY_ALPHA * (latency - self.latency)
+        else:
+            self.failures += 1
+            self.breaker.record_failure(now)
+
+    def to_state(self, clock_offset: float) -> dict:
+        '''
+        Gets the stats to save
+        :param clock_offset: wall clock time minus monotonic time, since monotonic times mean nothing after a restart
+        :return:
+        '''
+        return {'latency': self.latency, 'success_rate': self.success_rate, 'updated': self.updated + clock_offset,
+                'successes': self.successes, 'failures': self.failures,
+                'breaker': self.breaker.to_state(clock_offset)}
+
+    @classmethod
+    def from_state(cls, state: dict, clock_offset: float) -> 'ProxyStats':
+        stats = cls(state.get('latency', PRIOR_LATENCY), state.get('success_rate', PRIOR_SUCCESS_RATE),
+                    state['updated'] - clock_offset if 'updated' in state else None)
+        stats.successes = state.get('successes', 0)
+        stats.failures = state.get('failures', 0)
+        stats.breaker.load_state(state.get('breaker', {}), clock_offset)
+
+        return stats
+
+    def to_dict(self, now: Optional[float] = None) -> dict:
+        now = monotonic() if now is None else now
+
+        return {'latency': self.get_latency(now), 'success_rate': self.get_success_rate(now),
+                'score': self.get_score(now), 'successes': self.successes, 'failures': self.failures,
+                'in_flight': self.in_flight, 'breaker': self.breaker.state}
+
+
+class ProxyPool(MutableSet):
+    """
+    Set of proxy urls with per-proxy stats and latency-weighted selection. Proxies with an open breaker stay in the set
+    but aren't picked
+    """
+
+    def __init__(self, proxy_urls: Iterable[str] = ()):
+        self.stats: Dict[str, ProxyStats] = {}
+        # The proxies with a closed breaker are also kept in a list, so picking random proxies doesn't copy the whole
+        # set
+        self._available: List[str] = []
+        self._positions: Dict[str, int] = {}
+
+        for proxy_url in proxy_urls:
+            self.add(proxy_url)
+
+    def __contains__(self, proxy_url) -> bool:
+        return proxy_url in self.stats
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self.stats))
+
+    def __len__(self) -> int:
+        return len(self.stats)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({list(self.stats)!r})"
+
+    def add(self, proxy_url: str):
+        if proxy_url in self.stats:
+            return
+
+        self.stats[proxy_url] = ProxyStats()
+        self._make_available(proxy_url)
+
+    def discard(self, proxy_url: str):
+        if self.stats.pop(proxy_url, None) is not None:
+            self._make_unavailable(proxy_url)
+
+    def clear(self):
+        self.stats.clear()
+        self._available.clear()
+        self._positions.clear()
+
+    def count_available(self) -> int:
+        # Proxies that can be picked, i.e. with a closed breaker
+        return len(self._available)
+
+    def choose(self, rng: random.Random = random, exclude: Optional[str] = None) -> Optional[str]:
+        '''
+        Picks a proxy with a closed breaker by sampling two and taking the one with the better score
+        :param rng: source of randomness
+        :param exclude: proxy not to pick, e.g. one a request is already going through
+        :return: the proxy url, None if no proxies are available
+        '''
+        excluded = self._positions.get(exclude, len(self._available))
+        count = len(self._available) - (1 if excluded < len(self._available) else 0)
+
+        if count < 1:
+            return None
+
+        # Positions from the available proxies minus the excluded one, shifted back to positions in the whole list
+        proxy_urls = [self._available[position if position < excluded else position + 1]
+                      for position in rng.sample(range(count), min(count, 2))]
+
+        if len(proxy_urls) < 2:
+            return proxy_urls[0]
+
+        now = monotonic()
+
+        if self.stats[proxy_urls[1]].get_score(now) < self.stats[proxy_urls[0]].get_score(now):
+            return proxy_urls[1]
+
+        return proxy_urls[0]
+
+    def start_request(self, proxy_url: str) -> float:
+        '''
+        Counts a request as in flight through a proxy
+        :param proxy_url:
+        :return: the start time to pass to finish_request
+        '''
+        stats = self.stats.get(proxy_url)
+
+        if stats is not None:
+            stats.in_flight += 1
+
+        return monotonic()
+
+    def finish_request(self, proxy_url: str, start: float, succeeded: Optional[bool]):
+        '''
+        Records how a request through a proxy went
+        :param proxy_url:
+        :param start: what start_request returned
+        :param succeeded: None if the request was cancelled, which says nothing about the proxy
+        :return:
+        '''
+        stats = self.stats.get(proxy_url)
+
+        # The proxy may have been discarded while the request was running
+        if stats is None:
+            return
+
+        stats.in_flight = max(stats.in_flight - 1, 0)
+
+        if succeeded is not None:
+            self.record(proxy_url, succeeded, monotonic() - start)
+
+    def record(self, proxy_url: str, succeeded: bool, latency: Optional[float] = None):
+        '''
+        Records a request through a proxy, opening or closing its breaker if needed
+        :param proxy_url:
+        :param succeeded:
+        :param latency: seconds the request took
+        :return:
+        '''
+        stats = self.stats.get(proxy_url)
+
+        if stats is None:
+            return
+
+        stats.record(succeeded, latency)
+
+        if stats.breaker.state == CLOSED:
+            self._make_available(proxy_url)
+        else:
+            if proxy_url in self._positions:
+                LOGGER.debug(f"Breaker opened for proxy {proxy_url} after {stats.breaker.consecutive_failures} "
+                             f"failures")
+            self._make_unavailable(proxy_url)
+
+    def get_proxies_to_check(self, idle_time: float) -> List[str]:
+        '''
+        Gets the proxies due a health check: the ones with a closed breaker that haven't been used in a while, and the
+        ones with an open breaker that has been open long enough to go half-open
+        :param idle_time: seconds without a request before a proxy is checked
+        :return:
+        '''
+        now = monotonic()
+
+        return [proxy_url for proxy_url, stats in self.stats.items()
+                if stats.breaker.try_half_open(now) or
+                (stats.breaker.state == CLOSED and now - stats.updated >= idle_time)]
+
+    def get_exhausted(self) -> List[str]:
+        return [proxy_url for proxy_url, stats in self.stats.items() if stats.breaker.is_exhausted()]
+
+    def get_stats(self) -> Dict[str, dict]:
+        now = monotonic()
+
+        return {proxy_url: stats.to_dict(now) for proxy_url, stats in self.stats.items()}
+
+    def get_state(self) -> Dict[str, dict]:
+        '''
+        Gets every proxy's stats, in a form that can be saved as JSON and loaded after a restart
+        :return: proxy url -> stats
+        '''
+        clock_offset = time() - monotonic()
+
+        return {proxy_url: stats.to_state(clock_offset) for proxy_url, stats in self.stats.items()}
+
+    def load_state(self, state: Dict[str, dict]):
+        '''
+        Adds proxies with the stats they had when get_state was called, replacing any stats they have now
+        :param state: what get_state returned
+        :return:
+        '''
+        clock_offset = time() - monotonic()
+
+        for proxy_url, proxy_state in state.items():
+            self.stats[proxy_url] = ProxyStats.from_state(proxy_state, clock_offset)
+
+            if self.stats[proxy_url].breaker.state == CLOSED:
+                self._make_available(proxy_url)
+            else:
+                self._make_unavailable(proxy_url)
+
+    def _make_available(self, proxy_url: str):
+        if proxy_url not in self._positions:
+            self._positions[proxy_url] = len(self._available)
+            self._available.append(proxy_url)
+
+    def _make_unavailable(self, proxy_url: str):
+        position = self._positions.pop(proxy_url, None)
+
+        if position is None:
+            return
+
+        # Move the last proxy into the gap instead of shifting everything after it
+        last = self._available.pop()
+        if last != proxy_url:
+            self._available[position] = last
+            self._positions[last] = position
@@ -0,0 +1,152 @@
+import asyncio
+import json
+import logging
+import os
+from time import time
+from typing import Iterable, Optional, Set
+
+from proxy_pool import ProxyPool
+
+# Saves the proxy lists, and the stats of every good proxy, to one JSON file, so a restart picks up with the proxies
+# already ranked. Saves are debounced: asking for a save starts a timer, and everything that changes before it runs is
+# written in that one save. The file is written to a temporary file first and then renamed over the old one, so an
+# interrupted save never leaves a half-written file behind.
+
+STATE_VERSION = 1
+# Seconds between asking for a save and writing the file
+SAVE_DELAY = 5
+
+LOGGER = logging.getLogger(__name__)
+
+
+def write_state_file(filename: str, state: dict):
+    temporary_file = f"{filename}.tmp"
+
+    with open(temporary_file, 'w') as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(temporary_file, filename)
+
+
+class ProxyStateStore:
+    """
+    Debounced, atomic saving of the proxy lists and the good proxies' stats
+    """
+
+    def __init__(self, filename: str, save_delay: float = SAVE_DELAY):
+        self.filename = filename
+        self.save_delay = save_delay
+
+        self._save_task: Optional[asyncio.Task] = None
+        # Whether the save task is waiting out the delay, as opposed to writing
+        self._sleeping = False
+        # The write in progress, only one runs at a time
+        self._writing: Optional[asyncio.Future] = None
+        # The lists to save once the delay is up, None if no save is waiting
+        self._pending_lists: Optional[tuple] = None
+        self.saves = 0
+        self.requested_saves = 0
+
+    def get_state(self, good_proxies: ProxyPool, bad_proxies: Iterable[str], blocked_proxies: Iterable[str]) -> dict:
+        return {'version': STATE_VERSION, 'saved': time(), 'good': good_proxies.get_state(),
+                'bad': sorted(bad_proxies), 'blocked': sorted(blocked_proxies)}
+
+    def load(self, good_proxies: ProxyPool, bad_proxies: Set[str], blocked_proxies: Set[str]) -> bool:
+        '''
+        Adds the saved proxies to the lists
+        :param good_proxies:
+        :param bad_proxies:
+        :param blocked_proxies:
+        :return: whether or not there was a state file to load
+        '''
+        try:
+            with open(self.filename, 'r') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return False
+        except ValueError as e:
+            LOGGER.warning(f"Ignoring unreadable proxy state file {self.filename}: {e}")
+            return False
+
+        if state.get('version') != STATE_VERSION:
+            LOGGER.warning(f"Ignoring proxy state file {self.filename} with version {state.get('version')}")
+            return False
+
+        good_proxies.load_state(state.get('good', {}))
+        bad_proxies.update(state.get('bad', []))
+        blocked_proxies.update(state.get('blocked', []))
+
+        LOGGER.debug(f"Loaded {len(state.get('good', {}))} good, {len(state.get('bad', []))} bad and "
+                     f"{len(state.get('blocked', []))} blocked proxies from {self.filename}")
+
+        return True
+
+    def save(self, good_proxies: ProxyPool, bad_proxies: Iterable[str], blocked_proxies: Iterable[str]):
+        # Saves right away, blocking until the file is written
+        write_state_file(self.filename, self.get_state(good_proxies, bad_proxies, blocked_proxies))
+        self.saves += 1
+
+    def request_save(self, good_proxies: ProxyPool, bad_proxies: Set[str], blocked_proxies: Set[str]):
+        '''
+        Saves after save_delay seconds, unless a save is already waiting to run, in which case that save will include
+        whatever changed
+        :param good_proxies:
+        :param bad_proxies:
+        :param blocked_proxies:
+        :return:
+        '''
+        self.requested_saves += 1
+        self._pending_lists = (good_proxies, bad_proxies, blocked_proxies)
+
+        if self._save_task is None or self._save_task.done():
+            self._save_task = asyncio.ensure_future(self._save_later())
+
+    async def flush(self):
+        '''
+        Writes a waiting save right away instead of after the delay, e.g. before shutting down. A save that's already
+        being written is finished first rather than written twice at once
+        :return:
+        '''
+        # Only a save that's still waiting is cancelled, one that's writing is left to finish its write
+        if self._sleeping:
+            self._save_task.cancel()
+            self._save_task = None
+            self._sleeping = False
+
+        await self._write_pending()
+
+    async def _save_later(self):
+        # Saves requested while the last one was being written get a save of their own
+        while self._pending_lists is not None:
+            # flush cancels the sleep, and takes care of _sleeping when it does
+            self._sleeping = True
+            await asyncio.sleep(self.save_delay)
+            self._sleeping = False
+
+            await self._write_pending()
+
+    async def _write_pending(self):
+        # Waits for the write in progress, then writes whatever is still waiting to be saved
+        while self._writing is not None and not self._writing.done():
+            await asyncio.shield(self._writing)
+
+        if self._pending_lists is None:
+            return
+
+        lists, self._pending_lists = self._pending_lists, None
+        self._writing = asyncio.ensure_future(self._write(lists))
+        await asyncio.shield(self._writing)
+
+    async def _write(self, lists: tuple):
+        # The state is taken on the event loop, where the lists are changed, and only the writing is done on a thread
+        state = self.get_state(*lists)
+
+        try:
+            await asyncio.get_event_loop().run_in_executor(None, write_state_file, self.filename, state)
+            self.saves += 1
+            LOGGER.debug(f"Saved {len(state['good'])} good proxies to {self.filename}")
+
+        except OSError as e:
+            LOGGER.warning(f"Couldn't save proxy state to {self.filename}: {e}")
@@ -0,0 +1,112 @@
+import logging
+from time import monotonic
+from typing import Dict, Optional
+
+# Picks how each request gets to stats.nba.com: directly, or through a proxy. Both routes keep a moving average of their
+# latency, and the direct route also keeps whether or not it's working. Requests go direct while it's healthy and not
+# much slower than the proxies, and through a proxy otherwise. The direct route is probed again every so often, so
+# getting blocked or unblocked by stats.nba.com is noticed without a restart.
+
+DIRECT = 'direct'
+PROXY = 'proxy'
+
+# Weight of the newest sample in the latency averages
+LATENCY_ALPHA = 0.3
+# Seconds between probes of the direct route, while it's healthy and while it isn't
+DIRECT_PROBE_INTERVAL = 5 * 60
+BLOCKED_PROBE_INTERVAL = 2 * 60
+# The direct route is used unless it's this many times slower than the proxies, since it doesn't use up proxies
+DIRECT_PREFERENCE = 1.5
+
+LOGGER = logging.getLogger(__name__)
+
+
+class RouteStats:
+    """
+    Latency and health of one route
+    """
+
+    def __init__(self):
+        self.latency: Optional[float] = None
+        # None until the route has been tried
+        self.healthy: Optional[bool] = None
+        self.updated: Optional[float] = None
+        self.successes = 0
+        self.failures = 0
+
+    def record(self, succeeded: bool, latency: Optional[float] = None):
+        self.updated = monotonic()
+
+        if succeeded:
+            self.successes += 1
+            self.healthy = True
+            if latency is not None:
+                self.latency = latency if self.latency is None else \
+                    self.latency + LATENCY_ALPHA * (latency - self.latency)
+        else:
+            self.failures += 1
+            self.healthy = False
+
+    def to_dict(self) -> dict:
+        return {'latency': self.latency, 'healthy': self.healthy, 'successes': self.successes,
+                'failures': self.failures,
+                'age': None if self.updated is None else monotonic() - self.updated}
+
+
+class Router:
+    """
+    Direct and proxy route stats, and the choice between them
+    """
+
+    def __init__(self, direct_preference: float = DIRECT_PREFERENCE):
+        self.direct_preference = direct_preference
+        self.routes: Dict[str, RouteStats] = {DIRECT: RouteStats(), PROXY: RouteStats()}
+
+    @property
+    def direct(self) -> RouteStats:
+        return self.routes[DIRECT]
+
+    @property
+    def proxy(self) -> RouteStats:
+        return self.routes[PROXY]
+
+    def record(self, route: str, succeeded: bool, latency: Optional[float] = None):
+        was_healthy = self.routes[route].healthy
+        self.routes[route].record(succeeded, latency)
+
+        if route == DIRECT and was_healthy is not None and was_healthy != succeeded:
+            LOGGER.info(f"Direct connection to stats.nba.com is {'working' if succeeded else 'failing'} again")
+
+    def needs_direct_probe(self) -> bool:
+        '''
+        Whether or not it's time to probe the direct route, because it's never been tried or its stats are stale
+        :return:
+        '''
+        direct = self.direct
+
+        if direct.updated is None:
+            return True
+
+        interval = DIRECT_PROBE_INTERVAL if direct.healthy else BLOCKED_PROBE_INTERVAL
+
+        return monotonic() - direct.updated >= interval
+
+    def choose_route(self, proxies_available: bool = True) -> str:
+        '''
+        Picks the route for a request
+        :param proxies_available: whether or not there are proxies to use right now
+        :return: DIRECT or PROXY
+        '''
+        direct = self.direct
+        proxy = self.proxy
+
+        if not direct.healthy:
+            return PROXY
+
+        if not proxies_available or direct.latency is None or proxy.latency is None or not proxy.healthy:
+            return DIRECT
+
+        return DIRECT if direct.latency <= proxy.latency * self.direct_preference else PROXY
+
+    def get_stats(self) -> Dict[str, dict]:
+        return {route: stats.to_dict() for route, stats in self.routes.items()}
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, Hashable, Any, Callable, Awaitable, Deque, Tuple
+
+# Collapses concurrent identical calls into one. The first caller for a key starts the call, and everyone who asks for
+# the same key while it's still running waits on that call instead of making their own. The result (or exception) is
+# shared by every waiter.
+
+# Number of finished flights to keep in the history
+FLIGHT_HISTORY_LENGTH = 100
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Flight:
+    """
+    One in-progress call and the number of callers waiting on it
+    """
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.callers = 1
+
+
+class SingleFlight:
+    """
+    Group of in-flight calls indexed by key
+    """
+
+    def __init__(self, history_length: int = FLIGHT_HISTORY_LENGTH):
+        self._flights: Dict[Hashable, Flight] = {}
+
+        self.flights = 0
+        self.coalesced = 0
+        self.max_absorbed = 0
+        # (key, callers absorbed) for the most recently finished flights
+        self.history: Deque[Tuple[Hashable, int]] = deque(maxlen=history_length)
+
+    def __len__(self):
+        return len(self._flights)
+
+    async def do(self, key: Hashable, function: Callable[..., Awaitable[Any]], *args, **kwargs):
+        '''
+        Calls function(*args, **kwargs), unless a call with the same key is already running, in which case the
+        result of that call is returned instead
+        :param key: identifies calls that are interchangeable
+        :param function: coroutine function to call
+        :return: the result of the (possibly shared) call
+        '''
+        flight = self._flights.get(key)
+
+        if flight is None:
+            task = asyncio.ensure_future(function(*args, **kwargs))
+            flight = Flight(task)
+            self._flights[key] = flight
+            self.flights += 1
+            task.add_done_callback(lambda finished: self._finish(key, flight))
+
+        else:
+            flight.callers += 1
+            self.coalesced += 1
+
+        # Shield the shared call so one waiter getting cancelled doesn't cancel it for everyone else
+        return await asyncio.shield(flight.task)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {'in_flight': len(self._flights), 'flights': self.flights, 'coalesced': self.coalesced,
+                'max_absorbed': self.max_absorbed}
+
+    def _finish(self, key: Hashable, flight: Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+        absorbed = flight.callers - 1
+        self.max_absorbed = max(self.max_absorbed, absorbed)
+        self.history.append((key, absorbed))
+
+        if absorbed > 0:
+            LOGGER.debug(f"Flight for {key} absorbed {absorbed} other callers")
+
+        # Mark the exception as retrieved in case every waiter was cancelled
+        if not flight.task.cancelled():
+            flight.task.exception()
@@ -0,0 +1,203 @@
+import importlib
+import logging
+import unicodedata
+from typing import Optional, Dict, List, Callable
+
+import nba_api.stats.library.data as nba_data
+
+# Hash indexes over nba_api's static player and team lists. nba_api's own find_*_by_id functions are linear regex
+# scans, so everything in here is built once at startup (and again whenever the roster is reloaded) and every lookup
+# is constant time. The dictionaries returned are the same shape nba_api returns.
+# The lists and dictionaries are updated in place when reloading, so other modules can safely hold references to them.
+
+# The raw nba_api rows, in nba_api's order
+PLAYERS: List[list] = []
+ACTIVE_PLAYERS: List[list] = []
+TEAMS: List[list] = []
+
+PLAYERS_BY_ID: Dict[int, dict] = {}
+# Lowercased full name -> ids of every player with that name
+PLAYER_IDS_BY_FULL_NAME: Dict[str, List[int]] = {}
+TEAMS_BY_ID: Dict[int, dict] = {}
+TEAMS_BY_FULL_NAME: Dict[str, dict] = {}
+# Lowercased abbreviation -> team
+TEAMS_BY_ABBREVIATION: Dict[str, dict] = {}
+# Full names in normalize_name's form, in the same order as PLAYERS and TEAMS
+NORMALIZED_PLAYER_NAMES: List[str] = []
+NORMALIZED_TEAM_NAMES: List[str] = []
+
+# Incremented every time the registry is rebuilt
+REGISTRY_VERSION = 0
+RELOAD_LISTENERS: List[Callable[[], None]] = []
+
+LOGGER = logging.getLogger(__name__)
+
+
+def normalize_name(name: str) -> str:
+    '''
+    Canonical form of a name for matching: accents removed, case folded, punctuation dropped and whitespace collapsed,
+    so "Nikola Jokić", "nikola  jokic" and "NIKOLA JOKIC!" are all "nikola jokic"
+    :param name:
+    :return:
+    '''
+    stripped = ''.join(character for character in fold_accents(name)
+                       if not unicodedata.category(character).startswith('P'))
+
+    return ' '.join(stripped.casefold().split())
+
+
+def fold_accents(name: str) -> str:
+    '''
+    Removes the accents from a name, "Jokić" becomes "Jokic"
+    :param name:
+    :return:
+    '''
+    if name.isascii():
+        return name
+
+    return ''.join(character for character in unicodedata.normalize('NFKD', name)
+                   if not unicodedata.combining(character))
+
+
+def get_player_dict(player_row: list) -> dict:
+    return {
+        'id': player_row[nba_data.player_index_id],
+        'full_name': player_row[nba_data.player_index_full_name],
+        'first_name': player_row[nba_data.player_index_first_name],
+        'last_name': player_row[nba_data.player_index_last_name],
+        'is_active': player_row[nba_data.player_index_is_active],
+    }
+
+
+def get_team_dict(team_row: list) -> dict:
+    return {
+        'id': team_row[nba_data.team_index_id],
+        'full_name': team_row[nba_data.team_index_full_name],
+        'abbreviation': team_row[nba_data.team_index_abbreviation],
+        'nickname': team_row[nba_data.team_index_nickname],
+        'city': team_row[nba_data.team_index_city],
+        'state': team_row[nba_data.team_index_state],
+        'year_founded': team_row[nba_data.team_index_year_founded],
+    }
+
+
+def build_registry(player_rows: Optional[List[list]] = None, team_rows: Optional[List[list]] = None):
+    '''
+    (Re)builds every index
+    :param player_rows: rows in nba_api's player format, defaults to nba_api's static data
+    :param team_rows: rows in nba_api's team format, defaults to nba_api's static data
+    :return:
+    '''
+    global REGISTRY_VERSION
+
+    if player_rows is None:
+        player_rows = nba_data.players
+
+    if team_rows is None:
+        team_rows = nba_data.teams
+
+    PLAYERS[:] = player_rows
+    ACTIVE_PLAYERS[:] = [player for player in player_rows if player[nba_data.player_index_is_active]]
+    TEAMS[:] = team_rows
+
+    NORMALIZED_PLAYER_NAMES[:] = [normalize_name(player[nba_data.player_index_full_name]) for player in player_rows]
+    NORMALIZED_TEAM_NAMES[:] = [normalize_name(team[nba_data.team_index_full_name]) for team in team_rows]
+
+    PLAYERS_BY_ID.clear()
+    PLAYER_IDS_BY_FULL_NAME.clear()
+    for player in player_rows:
+        player_dict = get_player_dict(player)
+        PLAYERS_BY_ID[player_dict['id']] = player_dict
+        PLAYER_IDS_BY_FULL_NAME.setdefault(player_dict['full_name'].lower(), []).append(player_dict['id'])
+
+    TEAMS_BY_ID.clear()
+    TEAMS_BY_FULL_NAME.clear()
+    TEAMS_BY_ABBREVIATION.clear()
+    for team in team_rows:
+        team_dict = get_team_dict(team)
+        TEAMS_BY_ID[team_dict['id']] = team_dict
+        TEAMS_BY_FULL_NAME[team_dict['full_name'].lower()] = team_dict
+        TEAMS_BY_ABBREVIATION[team_dict['abbreviation'].lower()] = team_dict
+
+    REGISTRY_VERSION += 1
+
+    LOGGER.debug(f"Built registry with {len(PLAYERS)} players ({len(ACTIVE_PLAYERS)} active) and {len(TEAMS)} teams")
+
+
+def reload_registry(player_rows: Optional[List[list]] = None, team_rows: Optional[List[list]] = None):
+    '''
+    Rebuilds the registry (re-reading nba_api's static data unless rows are given) and lets anything built on top of
+    it know it needs to be rebuilt
+    :param player_rows: rows in nba_api's player format
+    :param team_rows: rows in nba_api's team format
+    :return:
+    '''
+    if player_rows is None and team_rows is None:
+        importlib.reload(nba_data)
+
+    build_registry(player_rows, team_rows)
+
+    for listener in RELOAD_LISTENERS:
+        listener()
+
+
+def add_reload_listener(listener: Callable[[], None]):
+    '''
+    Registers a function to call after the registry is reloaded (e.g. to rebuild an index or clear a cache)
+    :param listener: function with no arguments
+    :return:
+    '''
+    RELOAD_LISTENERS.append(listener)
+
+
+def find_player_by_id(player_id: int) -> Optional[dict]:
+    return PLAYERS_BY_ID.get(player_id)
+
+
+def find_player_ids_by_full_name(full_name: str) -> List[int]:
+    return PLAYER_IDS_BY_FULL_NAME.get(full_name.strip().lower(), [])
+
+
+def find_players_by_name(name: str) -> List[dict]:
+    '''
+    Finds every player whose full name contains the given name, ignoring case, accents and punctuation
+    :param name:
+    :return: list of player dictionaries, in nba_api's order
+    '''
+    normalized = normalize_name(name)
+
+    if normalized == "":
+        return []
+
+    return [PLAYERS_BY_ID[player[nba_data.player_index_id]]
+            for player, full_name in zip(PLAYERS, NORMALIZED_PLAYER_NAMES) if normalized in full_name]
+
+
+def find_team_by_id(team_id: int) -> Optional[dict]:
+    return TEAMS_BY_ID.get(team_id)
+
+
+def find_team_by_full_name(full_name: str) -> Optional[dict]:
+    return TEAMS_BY_FULL_NAME.get(full_name.strip().lower())
+
+
+def find_teams_by_name(name: str) -> List[dict]:
+    '''
+    Finds every team whose full name contains the given name, ignoring case, accents and punctuation
+    :param name:
+    :return: list of team dictionaries, in nba_api's order
+    '''
+    normalized = normalize_name(name)
+
+    if normalized == "":
+        return []
+
+    return [TEAMS_BY_ID[team[nba_data.team_index_id]]
+            for team, full_name in zip(TEAMS, NORMALIZED_TEAM_NAMES) if normalized in full_name]
+
+
+def find_team_by_abbreviation(abbreviation: str) -> Optional[dict]:
+    return TEAMS_BY_ABBREVIATION.get(abbreviation.strip().lower())
+
+
+build_registry()
@@ -0,0 +1,251 @@
+"""
+Latency benchmark for fuzzyids.getFuzzyPlayerIdsByName and getFuzzyTeamIdsByName
+
+Runs every misspelling in nba_name_misspellings.csv and nba_team_misspellings.csv through the fuzzy matcher, grouped by
+the name mode the matcher uses for it (single name, first and last name, full name) and, for players, with and without
+only_active. Reports p50/p95/p99 latency over each query's median time, throughput, and peak memory allocated per query
+for each group. Optionally writes them to a JSON file, and optionally compares them against a JSON file from an earlier
+run, exiting with status 1 if any group got slower than the tolerance allows.
+
+    python tools/fuzzy_benchmark.py --output bench.json
+    python tools/fuzzy_benchmark.py --baseline bench.json
+"""
+import argparse
+import csv
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from os.path import abspath, dirname, join
+from typing import Callable, Dict, List, Optional, Tuple
+
+TOOLS_DIR = dirname(abspath(__file__))
+sys.path.insert(0, dirname(TOOLS_DIR))
+
+import fuzzyids
+
+PLAYER_MISSPELLINGS_FILE = join(TOOLS_DIR, "nba_name_misspellings.csv")
+TEAM_MISSPELLINGS_FILE = join(TOOLS_DIR, "nba_team_misspellings.csv")
+MISSPELLED_INDEX = 0
+
+DEFAULT_REPEATS = 20
+DEFAULT_WARMUP = 1
+# A case fails the baseline comparison if a percentile is more than this fraction slower...
+DEFAULT_TOLERANCE = 0.5
+# ...and also more than this many milliseconds slower, so sub-millisecond noise doesn't fail a run
+DEFAULT_MIN_REGRESSION_MS = 0.1
+
+COMPARED_STATS = ('p50_ms', 'p95_ms', 'p99_ms')
+
+
+def read_misspellings(filename: str) -> List[str]:
+    with open(filename, 'r', newline='') as f:
+        return [row[MISSPELLED_INDEX] for row in csv.reader(f) if len(row) > 0 and row[MISSPELLED_INDEX].strip()]
+
+
+def get_player_mode(name: str) -> str:
+    # Same split as fuzzyids.getPlayerQuery
+    word_count = len(name.split())
+
+    if word_count == 1:
+        return "single"
+    elif word_count == 2:
+        return "first_last"
+    else:
+        return "full"
+
+
+def get_team_mode(name: str) -> str:
+    return "single" if len(name.split()) == 1 else "full"
+
+
+def get_cases(player_names: List[str], team_names: List[str]) -> Dict[str, Tuple[Callable, List[str]]]:
+    '''
+    Groups the queries into benchmark cases
+    :param player_names:
+    :param team_names:
+    :return: case name -> (function taking a query, queries)
+    '''
+    cases = {}
+
+    for only_active in (False, True):
+        for mode in ("single", "first_last", "full"):
+            names = [name for name in player_names if get_player_mode(name) == mode]
+            case_name = f"players_{mode}" + ("_active" if only_active else "")
+
+            cases[case_name] = (lambda name, only_active=only_active:
+                                fuzzyids.getFuzzyPlayerIdsByName(name, only_active=only_active), names)
+
+    for mode in ("single", "full"):
+        cases[f"teams_{mode}"] = (fuzzyids.getFuzzyTeamIdsByName,
+                                  [name for name in team_names if get_team_mode(name) == mode])
+
+    return {case_name: case for case_name, case in cases.items() if len(case[1]) > 0}
+
+
+def get_percentile(sorted_values: List[float], percentile: float) -> float:
+    '''
+    Percentile by linear interpolation between the closest ranks
+    :param sorted_values: in ascending order
+    :param percentile: between 0 and 100
+    :return:
+    '''
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+
+    rank = (len(sorted_values) - 1) * percentile / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(sorted_values) - 1)
+
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (rank - lower)
+
+
+def run_case(function: Callable, names: List[str], repeats: int, warmup: int) -> dict:
+    '''
+    Times every query repeats times, then measures the memory each one allocates. The percentiles are over the
+    queries' median times
+    :param function:
+    :param names:
+    :param repeats:
+    :param warmup: untimed runs of every query first
+    :return: the case's stats
+    '''
+    for _ in range(warmup):
+        for name in names:
+            function(name)
+
+    # Every query's timings, taking the median of each so one noisy run doesn't move the percentiles
+    timings = [[] for _ in names]
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for name, query_timings in zip(names, timings):
+            query_start = time.perf_counter()
+            function(name)
+            query_timings.append((time.perf_counter() - query_start) * 1000)
+    total_time = time.perf_counter() - start
+
+    latencies = sorted(statistics.median(query_timings) for query_timings in timings)
+
+    # Tracing slows everything down, so memory gets a pass of its own
+    peaks = []
+    for name in names:
+        tracemalloc.start()
+        try:
+            function(name)
+            peaks.append(tracemalloc.get_traced_memory()[1] / 1024)
+        finally:
+            tracemalloc.stop()
+
+    return {
+        'queries': len(names),
+        'repeats': repeats,
+        'p50_ms': get_percentile(latencies, 50),
+        'p95_ms': get_percentile(latencies, 95),
+        'p99_ms': get_percentile(latencies, 99),
+        'mean_ms': sum(latencies) / len(latencies),
+        'max_ms': latencies[-1],
+        'throughput_qps': len(names) * repeats / total_time if total_time > 0 else None,
+        'peak_kb_mean': sum(peaks) / len(peaks),
+        'peak_kb_max': max(peaks),
+    }
+
+
+def compare_results(results: dict, baseline: dict, tolerance: float, min_regression_ms: float) -> List[str]:
+    '''
+    Compares a run's latency percentiles to a baseline run
+    :param results:
+    :param baseline:
+    :param tolerance: fraction a percentile can grow by before it counts as a regression
+    :param min_regression_ms: smallest growth in milliseconds that counts as a regression
+    :return: list of descriptions of the regressions, empty if there are none
+    '''
+    regressions = []
+
+    for case_name, stats in results['cases'].items():
+        baseline_stats = baseline['cases'].get(case_name)
+
+        if baseline_stats is None:
+            print(f"{case_name}: not in the baseline")
+            continue
+
+        for stat in COMPARED_STATS:
+            value = stats[stat]
+            baseline_value = baseline_stats[stat]
+
+            if value > baseline_value * (1 + tolerance) and value - baseline_value > min_regression_ms:
+                growth = (value / baseline_value - 1) * 100 if baseline_value > 0 else float('inf')
+                regressions.append(f"{case_name} {stat}: {baseline_value:.3f}ms -> {value:.3f}ms (+{growth:.0f}%)")
+
+    return regressions
+
+
+def print_results(results: dict, baseline: Optional[dict] = None):
+    print(f"{'case':<26}{'queries':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'qps':>10}{'peak KB':>10}")
+
+    for case_name, stats in results['cases'].items():
+        line = (f"{case_name:<26}{stats['queries']:>8}{stats['p50_ms']:>10.3f}{stats['p95_ms']:>10.3f}"
+                f"{stats['p99_ms']:>10.3f}{stats['throughput_qps'] or 0:>10.0f}{stats['peak_kb_max']:>10.1f}")
+
+        baseline_stats = None if baseline is None else baseline['cases'].get(case_name)
+        if baseline_stats is not None and baseline_stats['p50_ms'] > 0:
+            line += f"  p50 {(stats['p50_ms'] / baseline_stats['p50_ms'] - 1) * 100:+.0f}%"
+
+        print(line)
+
+
+def main(args: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark fuzzy player and team name matching")
+    parser.add_argument('--repeats', type=int, default=DEFAULT_REPEATS, help="timed runs of every query")
+    parser.add_argument('--warmup', type=int, default=DEFAULT_WARMUP, help="untimed runs of every query first")
+    parser.add_argument('--cases', nargs='*', help="only run these cases")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--baseline', help="compare against the results in this JSON file, exit with 1 on a regression")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="fraction a percentile can grow by before it's a regression")
+    parser.add_argument('--min-regression-ms', type=float, default=DEFAULT_MIN_REGRESSION_MS,
+                        help="smallest growth in milliseconds that's a regression")
+    parsed = parser.parse_args(args)
+
+    cases = get_cases(read_misspellings(PLAYER_MISSPELLINGS_FILE), read_misspellings(TEAM_MISSPELLINGS_FILE))
+    if parsed.cases:
+        cases = {case_name: case for case_name, case in cases.items() if case_name in parsed.cases}
+
+    results = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeats': parsed.repeats,
+        'fuzzy_settings': [repr(setting) for setting in fuzzyids.getFuzzySettings()],
+        'cases': {case_name: run_case(function, names, parsed.repeats, parsed.warmup)
+                  for case_name, (function, names) in cases.items()},
+    }
+
+    baseline = None
+    if parsed.baseline is not None:
+        with open(parsed.baseline, 'r') as f:
+            baseline = json.load(f)
+
+    print_results(results, baseline)
+
+    if parsed.output is not None:
+        with open(parsed.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if baseline is not None:
+        regressions = compare_results(results, baseline, parsed.tolerance, parsed.min_regression_ms)
+
+        if len(regressions) > 0:
+            print(f"\n{len(regressions)} REGRESSIONS against {parsed.baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+
+            return 1
+
+        print(f"\nNo regressions against {parsed.baseline}")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,313 @@
+"""
+Shared code for fuzzy_players_profiler.py and fuzzy_teams_profiler.py
+
+Every (algorithm, misspelling) pair is run through the fuzzy matcher once and its best match, distance and time are
+cached on disk, so a rerun only computes the pairs for new misspellings or algorithms, and an interrupted run picks up
+where it left off. Uncached pairs are split between fuzzyids' process pool, a batch at a time, and the cache is saved
+after every batch.
+
+The stats CSVs and the suggested *_MIN_DISTANCE/*_MAX_DISTANCE constants are derived from the cache alone, so with
+--thresholds-only they take seconds.
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+import time
+from functools import partial
+from os.path import abspath, dirname
+from typing import Callable, Dict, List, Optional, Tuple
+
+TOOLS_DIR = dirname(abspath(__file__))
+sys.path.insert(0, dirname(TOOLS_DIR))
+
+import textdistance.algorithms as tdist_algorithms
+
+import fuzzyids
+import static_registry
+
+MISSPELLED_INDEX = 0
+CORRECT_INDEX = 1
+
+CACHE_VERSION = 1
+DEFAULT_BATCH_SIZE = 64
+
+#Algorithms that throw errors: Gotoh, ArithNCD
+#Algorithms that are way too slow: Editex, MongeElkan, SmithWaterman, NeedlemanWunsch, LCSSeq
+#Algorithms that are really bad at matches for this data (<70% success): RLENCD, Tanimoto, BWTRLENCD, MongeElkan, MLIPNS,
+#                                              Overlap (because it will return a ratio of 0.0 when it's wrong sometimes)
+#Compression algorithms are experimental, so not testing them
+
+ALGORITHM_NAMES = ['Hamming', 'Levenshtein', 'DamerauLevenshtein', 'JaroWinkler', 'StrCmp95', 'Jaccard', 'Sorensen',
+                   'Tversky', 'Cosine', 'Bag', 'LCSStr', 'RatcliffObershelp', 'SqrtNCD', 'EntropyNCD', 'MRA']
+
+STATS_COLUMNS = ['algorithm', 'total', 'correct', 'incorrect', 'correct_percent', 'total_time', 'avg_time',
+                 'max_correct_ratio', 'min_correct_ratio', 'avg_correct_ratio', 'max_incorrect_ratio',
+                 'min_incorrect_ratio', 'avg_incorrect_ratio']
+
+
+class ProfilerConfig:
+    """
+    What differs between the player and team profilers
+    """
+
+    def __init__(self, find_ids_name: str, misspellings_file: str, cache_file: str,
+                 find_expected_ids: Callable[[str], List[int]], get_mode: Callable[[str], str],
+                 stats_files: Dict[str, str], constant_prefixes: Dict[str, str], default_algorithms: Dict[str, type]):
+        '''
+        :param find_ids_name: getFuzzyPlayerIdsByName or getFuzzyTeamIdsByName
+        :param misspellings_file: CSV of misspelling, correct name or id
+        :param cache_file: where to cache the results
+        :param find_expected_ids: the correct column of the misspellings file -> ids it names
+        :param get_mode: misspelling -> the name mode fuzzyids uses for it
+        :param stats_files: name mode -> stats CSV to write
+        :param constant_prefixes: name mode -> prefix of the fuzzyids constants for it, e.g. PLAYER_SINGLENAME
+        :param default_algorithms: name mode -> the algorithm fuzzyids uses for it
+        '''
+        self.find_ids_name = find_ids_name
+        self.misspellings_file = misspellings_file
+        self.cache_file = cache_file
+        self.find_expected_ids = find_expected_ids
+        self.get_mode = get_mode
+        self.stats_files = stats_files
+        self.constant_prefixes = constant_prefixes
+        self.default_algorithms = default_algorithms
+
+
+def get_roster_fingerprint() -> str:
+    # Cached results are only good for the roster they were computed against
+    ids = ','.join(str(player[0]) for player in static_registry.PLAYERS) + ';' + \
+        ','.join(str(team[0]) for team in static_registry.TEAMS)
+
+    return hashlib.sha1(ids.encode()).hexdigest()
+
+
+def load_cache(cache_file: str) -> Dict[str, Dict[str, list]]:
+    '''
+    Loads the cached results, throwing them away if they were made against a different roster
+    :param cache_file:
+    :return: algorithm name -> misspelling -> [best id or None, distance or None, seconds]
+    '''
+    try:
+        with open(cache_file, 'r') as f:
+            cache = json.load(f)
+    except FileNotFoundError:
+        return {}
+
+    if cache.get('version') != CACHE_VERSION or cache.get('roster') != get_roster_fingerprint():
+        print(f"Ignoring {cache_file}, it was made with a different roster or profiler version")
+        return {}
+
+    return cache['results']
+
+
+def save_cache(cache_file: str, results: Dict[str, Dict[str, list]]):
+    # Write to a temporary file first, so an interrupted save doesn't lose the whole cache
+    temporary_file = f"{cache_file}.tmp"
+
+    with open(temporary_file, 'w') as f:
+        json.dump({'version': CACHE_VERSION, 'roster': get_roster_fingerprint(), 'results': results}, f)
+
+    os.replace(temporary_file, cache_file)
+
+
+def find_ids_timed(name: str, find_ids_name: str, **kwargs) -> Tuple[Optional[dict], float]:
+    # Module level so the process pool can pickle it
+    start = time.perf_counter()
+    best = getattr(fuzzyids, find_ids_name)(name, **kwargs)
+
+    return best, time.perf_counter() - start
+
+
+def read_misspellings(config: ProfilerConfig) -> List[Tuple[str, int]]:
+    '''
+    Reads the misspellings file, skipping the rows whose correct answer can't be found
+    :param config:
+    :return: list of (misspelling, expected id)
+    '''
+    rows = []
+
+    with open(config.misspellings_file, 'r', newline='') as f:
+        for row in csv.reader(f):
+            if len(row) <= CORRECT_INDEX:
+                continue
+
+            expected_ids = config.find_expected_ids(row[CORRECT_INDEX])
+
+            # Don't run the test if we don't know what the solution should be
+            if len(expected_ids) != 1:
+                print(f"Couldn't find a match for {row[CORRECT_INDEX]}")
+            else:
+                rows.append((row[MISSPELLED_INDEX], expected_ids[0]))
+
+    return rows
+
+
+def profile(config: ProfilerConfig, algorithm_names: List[str], misspellings: List[str],
+            results: Dict[str, Dict[str, list]], batch_size: int):
+    '''
+    Runs every uncached (algorithm, misspelling) pair, adding to results and saving the cache after every batch
+    :param config:
+    :param algorithm_names:
+    :param misspellings:
+    :param results: the cached results, updated in place
+    :param batch_size:
+    :return:
+    '''
+    find_ids = partial(find_ids_timed, find_ids_name=config.find_ids_name)
+
+    for algorithm_name in algorithm_names:
+        algorithm_results = results.setdefault(algorithm_name, {})
+        uncached = [name for name in dict.fromkeys(misspellings) if name not in algorithm_results]
+
+        if len(uncached) < 1:
+            print(f"{algorithm_name}: all {len(algorithm_results)} cached")
+            continue
+
+        print(f"{algorithm_name}: {len(uncached)} to run, {len(algorithm_results)} cached")
+        algorithm = getattr(tdist_algorithms, algorithm_name)()
+
+        for i in range(0, len(uncached), batch_size):
+            batch = uncached[i:i + batch_size]
+
+            try:
+                # Same bulk path as getFuzzyPlayerIdsByNames, with each name timed
+                timed_results = fuzzyids.getFuzzyIdsByNames(find_ids, batch, {
+                    'max_distance': 1, 'dist_algorithm': algorithm, 'return_ratio': True, 'only_return_best': True})
+            except Exception as e:
+                print(f"{algorithm_name} failed, skipping the rest of it: {e!r}")
+                break
+
+            for name, (best, seconds) in zip(batch, timed_results):
+                if best is None:
+                    algorithm_results[name] = [None, None, seconds]
+                else:
+                    # The best match comes first, then its ratio, which the team matcher keys by -1
+                    best_id, ratio = list(best.items())[0][0], list(best.values())[1]
+                    algorithm_results[name] = [best_id, ratio, seconds]
+
+            save_cache(config.cache_file, results)
+
+
+def get_stats(config: ProfilerConfig, rows: List[Tuple[str, int]], algorithm_names: List[str],
+              results: Dict[str, Dict[str, list]]) -> Dict[str, Dict[str, dict]]:
+    '''
+    Tallies accuracy, time and distances for each name mode and algorithm from the cached results
+    :return: name mode -> algorithm name -> stats
+    '''
+    stats = {mode: {} for mode in config.stats_files}
+
+    for algorithm_name in algorithm_names:
+        for mode in stats:
+            stats[mode][algorithm_name] = {'total': 0, 'correct': 0, 'incorrect': 0, 'total_time': 0,
+                                           'total_correct_ratio': 0, 'total_incorrect_ratio': 0,
+                                           'max_correct_ratio': 0, 'min_correct_ratio': 1,
+                                           'max_incorrect_ratio': 0, 'min_incorrect_ratio': 1}
+
+        for name, expected_id in rows:
+            result = results.get(algorithm_name, {}).get(name)
+
+            if result is None:
+                continue
+
+            best_id, ratio, seconds = result
+            this_stats = stats[config.get_mode(name)][algorithm_name]
+            this_stats['total'] += 1
+            this_stats['total_time'] += seconds
+
+            if best_id is None:
+                this_stats['incorrect'] += 1
+            elif best_id != expected_id:
+                this_stats['incorrect'] += 1
+                this_stats['total_incorrect_ratio'] += ratio
+                this_stats['max_incorrect_ratio'] = max(this_stats['max_incorrect_ratio'], ratio)
+
+                # If the match was incorrect but the ratio was 0, the test is probably bad
+                if ratio > 0.0:
+                    this_stats['min_incorrect_ratio'] = min(this_stats['min_incorrect_ratio'], ratio)
+                else:
+                    print(f"WARNING: {algorithm_name} matched \"{name}\" to the wrong id with a ratio of 0")
+            else:
+                this_stats['correct'] += 1
+                this_stats['total_correct_ratio'] += ratio
+                this_stats['max_correct_ratio'] = max(this_stats['max_correct_ratio'], ratio)
+                this_stats['min_correct_ratio'] = min(this_stats['min_correct_ratio'], ratio)
+
+    return stats
+
+
+def write_stats(config: ProfilerConfig, stats: Dict[str, Dict[str, dict]]):
+    for mode, stats_file in config.stats_files.items():
+        with open(stats_file, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(STATS_COLUMNS)
+
+            for algorithm_name, value in stats[mode].items():
+                if value['total'] < 1:
+                    continue
+
+                correct_ratio = value['total_correct_ratio'] / value['correct'] if value['correct'] else 0
+                incorrect_ratio = value['total_incorrect_ratio'] / value['incorrect'] if value['incorrect'] else 0
+
+                writer.writerow([algorithm_name, value['total'], value['correct'], value['incorrect'],
+                                 value['correct'] / value['total'], value['total_time'],
+                                 value['total_time'] / value['total'], value['max_correct_ratio'],
+                                 value['min_correct_ratio'], correct_ratio, value['max_incorrect_ratio'],
+                                 value['min_incorrect_ratio'], incorrect_ratio])
+
+
+def print_thresholds(config: ProfilerConfig, stats: Dict[str, Dict[str, dict]]):
+    '''
+    Prints the fuzzyids constants the results suggest for each name mode's algorithm: the max distance lets every
+    correct best match through, and the min distance is the closest any incorrect best match got
+    :param config:
+    :param stats:
+    :return:
+    '''
+    for mode, prefix in config.constant_prefixes.items():
+        algorithm_name = config.default_algorithms[mode].__name__
+        value = stats[mode].get(algorithm_name)
+
+        if value is None or value['total'] < 1:
+            print(f"# No {algorithm_name} results for {prefix}")
+            continue
+
+        print(f"# {prefix}: {algorithm_name}, {value['correct']}/{value['total']} correct")
+        if value['correct'] > 0:
+            print(f"{prefix}_MAX_DISTANCE = {value['max_correct_ratio']:.10g}")
+        if value['incorrect'] > 0:
+            print(f"{prefix}_MIN_DISTANCE = {value['min_incorrect_ratio']:.10g}")
+
+
+def main(config: ProfilerConfig, args: List[str] = None):
+    parser = argparse.ArgumentParser(description="Profile fuzzy matching accuracy and speed per textdistance algorithm")
+    parser.add_argument('--algorithms', nargs='*', default=ALGORITHM_NAMES, help="textdistance algorithm class names")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help="process pool size, 1 to run everything in this process")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help="misspellings run between cache saves")
+    parser.add_argument('--cache', default=config.cache_file, help="cache file")
+    parser.add_argument('--clear-cache', action='store_true', help="recompute everything")
+    parser.add_argument('--thresholds-only', action='store_true',
+                        help="don't run anything, just derive the stats and thresholds from the cache")
+    parsed = parser.parse_args(args)
+
+    config.cache_file = parsed.cache
+    results = {} if parsed.clear_cache else load_cache(config.cache_file)
+    rows = read_misspellings(config)
+
+    if not parsed.thresholds_only:
+        if parsed.workers > 1:
+            fuzzyids.configureProcessPool(parsed.workers)
+
+        try:
+            profile(config, parsed.algorithms, [name for name, expected_id in rows], results, parsed.batch_size)
+        finally:
+            fuzzyids.configureProcessPool(enabled=False)
+
+    stats = get_stats(config, rows, parsed.algorithms, results)
+    write_stats(config, stats)
+    print_thresholds(config, stats)
+